@@ -0,0 +1,331 @@
+"""
+End-to-end benchmark for the planner -> tools -> answer pipeline.
+
+Runs N concurrent sessions of scripted turns against the local fake Ollama
+server (chatbot/utils/fake_ollama.py), so results are deterministic and
+need no GPU. Reports per mode:
+- time to first answer chunk (TTFT) and total turn latency percentiles
+- LLM calls and request bytes per turn
+- turns/sec across all sessions
+
+Usage:
+    python -m benchmarks.bench_pipeline --sessions 8 --turns 10 --output bench.json
+    python -m benchmarks.bench_pipeline --baseline bench.json --max-regression 0.2
+
+With --baseline the run exits non-zero if p50/p95 latency or TTFT got worse
+than the baseline by more than --max-regression (fraction), for CI.
+"""
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot.utils.fake_ollama import FakeOllamaConfig, start_fake_ollama
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient
+from chatbot.utils.backend_pool import BackendPool
+from chatbot.nodes.planner_node import PlannerNode
+from chatbot.nodes.answer_node import AnswerNode
+from chatbot.nodes.react_node import ReactNode
+from chatbot.pipeline import ChatPipeline
+from chatbot.tools.fake_tools import with_latency
+from chatbot.utils.tracing import configure_tracing
+from chatbot.tools import registry
+
+# scripted conversation, cycled per session
+SCRIPT = [
+    "hi how are you",
+    "what time is it?",
+    "what is the weather in Tokyo?",
+    "give me a random number and the time",
+    "what's the weather in Paris, the time and a random number?",
+    "thanks, that's all",
+]
+
+ANSWER_TEXT = (
+    "Here is what I found for you. It is sunny in the city you asked about, "
+    "the current time is a quarter past three, and your lucky number is 42."
+)
+
+
+def _intent_steps(message: str) -> list:
+    """ Deterministic stand-in for the model's planning """
+    steps = []
+    if re.search(r"weather", message, re.I):
+        location = re.search(r"in ([A-Z]\w+)", message)
+        steps.append({"tool": "fake_weather", "args": {"location": location.group(1) if location else "Tokyo"}})
+    if re.search(r"\btime\b", message, re.I):
+        steps.append({"tool": "get_time", "args": {}})
+    if re.search(r"random", message, re.I):
+        steps.append({"tool": "random_number", "args": {}})
+    return steps
+
+
+def bench_responder(payload: dict) -> str:
+    messages = payload.get("messages") or []
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    steps = _intent_steps(last_user)
+
+    # ReAct decision: ask for every tool at once, finish once something was
+    # observed or when only "finish" is allowed
+    if "ReAct agent" in system:
+        allowed = ((payload.get("format") or {}).get("properties", {}).get("action", {}).get("enum")) or []
+        observed = any(m["role"] == "system" and m["content"].startswith("Observations:") for m in messages[1:])
+        if steps and not observed and allowed != ["finish"]:
+            if len(steps) == 1:
+                return json.dumps({"action": "use_tool", **steps[0]})
+            return json.dumps({"action": "use_tools", "steps": steps})
+        return json.dumps({"action": "finish", "answer": ANSWER_TEXT})
+
+    # planner (structured output) or unified node choosing tools
+    if payload.get("format") is not None or "If you NEED a tool" in system:
+        is_unified_followup = messages[-1]["role"] != "user"
+        if not steps or is_unified_followup:
+            return ANSWER_TEXT if payload.get("format") is None else '{"action": "answer_direct"}'
+        if len(steps) == 1:
+            return json.dumps({"action": "use_tool", **steps[0]})
+        return json.dumps({"action": "use_tools", "steps": steps})
+
+    return ANSWER_TEXT
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list, wall_s: float, llm_stats: dict) -> dict:
+    turns = len(samples)
+    totals = [s["total_ms"] for s in samples]
+    ttfts = [s["ttft_ms"] for s in samples]
+    return {
+        "turns": turns,
+        "turns_per_sec": round(turns / wall_s, 2) if wall_s else 0.0,
+        "ttft_ms": {"p50": percentile(ttfts, 50), "p95": percentile(ttfts, 95), "p99": percentile(ttfts, 99)},
+        "latency_ms": {
+            "p50": percentile(totals, 50),
+            "p95": percentile(totals, 95),
+            "p99": percentile(totals, 99),
+            "mean": round(statistics.mean(totals), 2) if totals else 0.0,
+        },
+        "llm_calls_per_turn": round(llm_stats["requests"] / turns, 3) if turns else 0.0,
+        "request_bytes_per_turn": round(llm_stats["request_bytes"] / turns, 1) if turns else 0.0,
+        "llm_errors": llm_stats["errors"],
+    }
+
+
+def _merge_stats(*clients) -> dict:
+    merged = {"requests": 0, "request_bytes": 0, "errors": 0}
+    for client in clients:
+        stats = client.latency_stats()
+        for key in merged:
+            merged[key] += stats[key]
+    return merged
+
+
+def _time_stream(chunks) -> dict:
+    started = time.perf_counter()
+    ttft = None
+    for _ in chunks:
+        if ttft is None:
+            ttft = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return {"ttft_ms": round((ttft or total) * 1000, 2), "total_ms": round(total * 1000, 2)}
+
+
+async def _atime_stream(chunks) -> dict:
+    started = time.perf_counter()
+    ttft = None
+    async for _ in chunks:
+        if ttft is None:
+            ttft = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return {"ttft_ms": round((ttft or total) * 1000, 2), "total_ms": round(total * 1000, 2)}
+
+
+def _session_script(session: int, turns: int) -> list:
+    return [SCRIPT[(session + t) % len(SCRIPT)] for t in range(turns)]
+
+
+def run_sync(mode: str, pool: BackendPool, sessions: int, turns: int) -> dict:
+    """ One thread per session, blocking pipeline like the CLI """
+    client = LLMClient(pool=pool, pool_size=max(10, sessions))
+    planner = PlannerNode(client=client)
+    answerer = AnswerNode(client=client)
+    pipeline = ChatPipeline(planner=planner, answerer=answerer, unified=(mode == "unified"))
+    react = ReactNode(client=client)
+
+    def session_worker(session: int) -> list:
+        history, samples = [], []
+        for message in _session_script(session, turns):
+            history.append({"role": "user", "content": message})
+            if mode == "react":
+                started = time.perf_counter()
+                answer = react.process(message, history)["answer"]
+                elapsed = round((time.perf_counter() - started) * 1000, 2)
+                sample = {"ttft_ms": elapsed, "total_ms": elapsed}
+            else:
+                chunks = []
+                turn = pipeline.run_turn(message, history, session_id=f"session-{session}")
+                sample = _time_stream(c for c in turn if chunks.append(c) is None)
+                answer = "".join(chunks)
+            history.append({"role": "assistant", "content": answer})
+            samples.append(sample)
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(session_worker, range(sessions)))
+    wall = time.perf_counter() - started
+
+    client.close()
+    result = summarize([s for session in results for s in session], wall, _merge_stats(client))
+    if mode == "react":
+        result["react"] = react.stats()
+    return result
+
+
+def run_async(mode: str, pool: BackendPool, sessions: int, turns: int) -> dict:
+    """ All sessions share one event loop via arun_turn / aprocess """
+
+    async def main():
+        client = LLMClient(pool=pool)
+        async_client = AsyncLLMClient(pool=pool, pool_size=max(10, sessions))
+        planner = PlannerNode(client=client, async_client=async_client)
+        answerer = AnswerNode(client=client, async_client=async_client)
+        pipeline = ChatPipeline(planner=planner, answerer=answerer, unified=(mode == "unified"))
+        react = ReactNode(client=client, async_client=async_client)
+
+        async def session_worker(session: int) -> list:
+            history, samples = [], []
+            for message in _session_script(session, turns):
+                history.append({"role": "user", "content": message})
+                if mode == "react":
+                    started = time.perf_counter()
+                    answer = (await react.aprocess(message, history))["answer"]
+                    elapsed = round((time.perf_counter() - started) * 1000, 2)
+                    sample = {"ttft_ms": elapsed, "total_ms": elapsed}
+                else:
+                    chunks = []
+
+                    async def collect():
+                        async for chunk in pipeline.arun_turn(message, history, session_id=f"session-{session}"):
+                            chunks.append(chunk)
+                            yield chunk
+
+                    sample = await _atime_stream(collect())
+                    answer = "".join(chunks)
+                history.append({"role": "assistant", "content": answer})
+                samples.append(sample)
+            return samples
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(session_worker(i) for i in range(sessions)))
+        wall = time.perf_counter() - started
+
+        await async_client.close()
+        client.close()
+        result = summarize([s for session in results for s in session], wall, _merge_stats(client, async_client))
+        if mode == "react":
+            result["react"] = react.stats()
+        return result
+
+    return asyncio.run(main())
+
+
+def apply_tool_latency(seconds: float):
+    """ Make every tool behave like a network call taking `seconds` """
+    for tool in registry:
+        tool.function = with_latency(tool.function, seconds)
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list:
+    """ Returns human-readable regressions of current vs baseline """
+    regressions = []
+    for mode, result in current["results"].items():
+        base = baseline.get("results", {}).get(mode)
+        if not base:
+            continue
+        for metric in ("latency_ms", "ttft_ms"):
+            for pct in ("p50", "p95"):
+                old, new = base[metric][pct], result[metric][pct]
+                if old and new > old * (1 + max_regression):
+                    regressions.append(f"{mode} {metric} {pct}: {old} -> {new} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot pipeline against a fake Ollama")
+    parser.add_argument("--modes", default="pipeline,unified,react", help="comma list of pipeline, unified, react")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=6, help="turns per session")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="drive sessions on one event loop")
+    parser.add_argument("--ttft", type=float, default=0.05, help="fake server seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake server seconds per token")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="fake server parallel requests")
+    parser.add_argument("--backends", type=int, default=1, help="fake Ollama servers behind one BackendPool")
+    parser.add_argument("--tool-delay", type=float, default=0.0, help="extra seconds per tool call")
+    parser.add_argument("--trace", default="", help="trace exporters to enable (measures tracing overhead)")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown vs baseline (fraction)")
+    args = parser.parse_args()
+
+    configure_tracing(args.trace)
+
+    if args.tool_delay:
+        apply_tool_latency(args.tool_delay)
+
+    config = FakeOllamaConfig(
+        ttft=args.ttft,
+        token_delay=args.token_delay,
+        responder=bench_responder,
+        max_concurrency=args.max_concurrency,
+    )
+    servers = [start_fake_ollama(config) for _ in range(args.backends)]
+    pool = BackendPool([server.url for server in servers])
+
+    run = run_async if args.use_async else run_sync
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": {},
+    }
+
+    for mode in args.modes.split(","):
+        mode = mode.strip()
+        report["results"][mode] = run(mode, pool, args.sessions, args.turns)
+        print(f"[{mode}] {json.dumps(report['results'][mode])}")
+
+    pool.stop_health_checks()
+    for server in servers:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print("Regressions vs baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions vs baseline.")
+
+
+if __name__ == "__main__":
+    main()
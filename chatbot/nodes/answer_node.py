@@ -1,6 +1,51 @@
 import json
 from .base_node import BaseNode
-from chatbot.utils.call_llm import call_llm_stream
+from chatbot.utils.call_llm import call_llm_stream, acall_llm_stream
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient, get_default_client
+from chatbot.utils.node_config import get_node_config
+from chatbot.utils.prompt_builder import ChatMessage, PromptLayout
+from chatbot.utils.response_cache import ResponseCache
+from chatbot.utils.tracing import traced
+
+# built once at import so the prompt prefix is byte-identical on every call
+ANSWER_SYSTEM_PROMPT = (
+    "You are a helpful assistant for a simple chatbot.\n"
+    "You receive outputs from tools that execute to get information.\n"
+    "\n"
+    "CRITICAL INSTRUCTION:\n"
+    "When you see tool results with ✓ (checkmark), those tools SUCCEEDED.\n"
+    "When you see tool results with ✗ (X mark), those tools FAILED.\n"
+    "\n"
+    "YOUR JOB:\n"
+    "1. Look at ALL the results in the summary\n"
+    "2. Find the ones marked with ✓ - these have the ACTUAL DATA\n"
+    "3. Use that data to answer the user's question\n"
+    "4. Ignore the ✗ failures unless they prevent answering completely\n"
+    "5. Results marked with … are still running: answer with what you have\n"
+    "   and say briefly that the rest is still on its way\n"
+    "\n"
+    "EXAMPLE:\n"
+    "If summary shows:\n"
+    "✓ Step 1 (get_time): {'time': '2025-12-05T15:15:31+08:00'}\n"
+    "✗ Step 2 (failing_tool): ERROR\n"
+    "\n"
+    "You should answer: 'The current time is 3:15 PM, your other request failed'\n"
+    "NOT: 'The tool failed to execute.'\n"
+    "\n"
+    "Do not mention 'tools', 'steps', or technical details.\n"
+    "Be concise and friendly.\n"
+)
+
+ANSWER_LAYOUT = PromptLayout(ANSWER_SYSTEM_PROMPT)
+
+# executor timings vary every turn and mean nothing to the answer model
+TIMING_FIELDS = ("duration_ms", "elapsed_ms")
+
+FOLLOWUP_INSTRUCTION = (
+    "The results that were still running have now finished:\n"
+    "{late}\n\n"
+    "Continue your answer with just what they add. Do not repeat what you already said."
+)
 
 
 class AnswerNode(BaseNode):
@@ -13,65 +58,86 @@ class AnswerNode(BaseNode):
 
     Output:
     - final string answer for the user
+
+    process_followup() / aprocess_followup() continue an answer that was
+    written while some tools were still pending, once their results are in.
+
+    With a response_cache, turns that used no tools and have no earlier
+    history (greetings, FAQs) are answered from the cache, and identical
+    ones running at the same time share one LLM stream.
     """
 
+    def __init__(self, client: LLMClient = None, async_client: AsyncLLMClient = None, response_cache: ResponseCache = None):
+        self.client = client or get_default_client()       # shared pooled LLM client
+        self.async_client = async_client                   # None -> per-loop default in aprocess
+        self.response_cache = response_cache               # opt-in, see _cache_for
+        self.config = get_node_config("answer")            # keep_alive / num_ctx
+
+    @traced("node.answer")
     def process(self, user_message: str, tool_output: dict | None = None, conversation_history: list = None) -> str:
+        messages = self._build_messages(user_message, tool_output, conversation_history)
+        cache = self._cache_for(tool_output, conversation_history)
+
+        # 3. Call the LLM to compose the answer
+        for chunk in call_llm_stream(messages=messages, client=self.client, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority, cache=cache):
+            yield chunk
+
+    @traced("node.answer")
+    async def aprocess(self, user_message: str, tool_output: dict | None = None, conversation_history: list = None):
+        """ Async generator twin of process() """
+        messages = self._build_messages(user_message, tool_output, conversation_history)
+        cache = self._cache_for(tool_output, conversation_history)
+        async for chunk in acall_llm_stream(messages=messages, client=self.async_client, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority, cache=cache):
+            yield chunk
+
+    @traced("node.answer.followup")
+    def process_followup(self, user_message: str, tool_output: dict, answer: str, late_output: dict, conversation_history: list = None):
+        messages = self._followup_messages(user_message, tool_output, answer, late_output, conversation_history)
+        for chunk in call_llm_stream(messages=messages, client=self.client, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority):
+            yield chunk
+
+    @traced("node.answer.followup")
+    async def aprocess_followup(self, user_message: str, tool_output: dict, answer: str, late_output: dict, conversation_history: list = None):
+        """ Async generator twin of process_followup() """
+        messages = self._followup_messages(user_message, tool_output, answer, late_output, conversation_history)
+        async for chunk in acall_llm_stream(messages=messages, client=self.async_client, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority):
+            yield chunk
+
+    def _cache_for(self, tool_output: dict | None, conversation_history: list):
+        # only answers that depend on nothing but the question are worth sharing
+        # (history ends with the current user message)
+        if self.response_cache is None or tool_output is not None:
+            return None
+        if conversation_history and len(conversation_history) > 1:
+            return None
+        return self.response_cache
+
+    def _followup_messages(self, user_message: str, tool_output: dict, answer: str, late_output: dict, conversation_history: list) -> list:
+        # same prefix as the first answer call, so only the new tail is prefilled
+        messages = self._build_messages(user_message, tool_output, conversation_history)
+        messages.append(ChatMessage("assistant", answer))
+        messages.append(ChatMessage("system", FOLLOWUP_INSTRUCTION.format(late=late_output["summary"])))
+        return messages
+
+    def _build_messages(self, user_message: str, tool_output: dict | None, conversation_history: list) -> list:
         # 1. Prepare a safe representation of tool_output for the prompt
         if tool_output is None:
             tool_block = "No tools were used."
         else:
             # Pretty-print as JSON so LLM can read it clearly
-            tool_block = json.dumps(tool_output, indent=2)
-
-        # 2. Build system-style instructions
-        system_instructions = (
-            "You are a helpful assistant for a simple chatbot.\n"
-            "You receive outputs from tools that execute to get information.\n"
-            "\n"
-            "CRITICAL INSTRUCTION:\n"
-            "When you see tool results with ✓ (checkmark), those tools SUCCEEDED.\n"
-            "When you see tool results with ✗ (X mark), those tools FAILED.\n"
-            "\n"
-            "YOUR JOB:\n"
-            "1. Look at ALL the results in the summary\n"
-            "2. Find the ones marked with ✓ - these have the ACTUAL DATA\n"
-            "3. Use that data to answer the user's question\n"
-            "4. Ignore the ✗ failures unless they prevent answering completely\n"
-            "\n"
-            "EXAMPLE:\n"
-            "If summary shows:\n"
-            "✓ Step 1 (get_time): {'time': '2025-12-05T15:15:31+08:00'}\n"
-            "✗ Step 2 (failing_tool): ERROR\n"
-            "\n"
-                "You should answer: 'The current time is 3:15 PM, your other request failed'\n"
-                "NOT: 'The tool failed to execute.'\n"
-            "\n"
-            "Do not mention 'tools', 'steps', or technical details.\n"
-            "Be concise and friendly.\n"
-        )
-
-        # build messages w convo history
-        messages =  []
-
-        # add system instructions
-        messages.append({
-            "role": "system",
-            "content": system_instructions
-        })
-
-        # add convo history if present
-        if conversation_history:
-            # add all previous messages except last user message
-            for msg in conversation_history[:-1]:
-                messages.append(msg)
-
-        # add current user message with tool output
-        user_content = f"User question: {user_message}\n\nTool output (if any):\n{tool_block}\n\nNow write the final answer for the user:"
-        messages.append({
-            "role": "user",
-            "content": user_content
-            })
+            tool_block = json.dumps(self._without_timings(tool_output), indent=2)
 
-        # 3. Call the LLM to compose the answer
-        for chunk in call_llm_stream(messages=messages):
-            yield chunk
+        # 2. Volatile tool block goes after the verbatim user message so the
+        # system prompt + history prefix stays cacheable across turns
+        tail = f"Tool output (if any):\n{tool_block}\n\nNow write the final answer for the user:"
+        return ANSWER_LAYOUT.build(user_message, conversation_history, tail=tail)
+
+    @staticmethod
+    def _without_timings(tool_output: dict) -> dict:
+        view = {key: value for key, value in tool_output.items() if key not in TIMING_FIELDS}
+        if isinstance(view.get("results"), list):
+            view["results"] = [
+                {key: value for key, value in result.items() if key not in TIMING_FIELDS} if isinstance(result, dict) else result
+                for result in view["results"]
+            ]
+        return view
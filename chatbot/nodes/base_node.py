@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 class BaseNode(ABC):
@@ -26,4 +27,14 @@ class BaseNode(ABC):
         
         
         """
-        pass
\ No newline at end of file
+        pass
+
+    async def aprocess(self, user_message, *args, **kwargs):
+        """
+        Async variant of process().
+
+        Default runs the sync process() in a worker thread so the event loop
+        is never blocked. Nodes that call the LLM override this with a native
+        async implementation.
+        """
+        return await asyncio.to_thread(self.process, user_message, *args, **kwargs)
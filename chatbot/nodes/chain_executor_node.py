@@ -1,26 +1,257 @@
+import json
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
 from .base_node import BaseNode
 from .tool_runner_node import ToolRunnerNode
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any
+from chatbot.tools import registry
+from chatbot.utils.resilience import current_deadline
+from chatbot.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# seconds a step may run before it is reported as timed out (Tool.timeout overrides)
+DEFAULT_STEP_TIMEOUT = 15.0
+
+
+def step_key(step: Dict) -> tuple:
+    """ Identity of a tool call: same tool + same args (key order ignored) """
+    return step.get("tool"), json.dumps(step.get("args") or {}, sort_keys=True, default=str)
+
+
+class StepPrefetcher:
+    """
+    Tool calls started before the plan is final, for one turn.
+
+    The streaming planner submit()s each step as soon as its JSON object
+    closes, and optionally speculative guesses for side_effect_free tools
+    before the model has answered at all. The executor take()s a matching
+    call instead of running the tool again; whatever nobody claimed is
+    discard()ed once the turn's tools are done (cancelled if it hasn't
+    started, result ignored otherwise).
+
+    Steps with depends_on, unknown tools and invalid args are never
+    prefetched; they simply run when the executor gets to them.
+    """
+
+    def __init__(self, executor: "ChainExecutorNode"):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._calls = {}            # step_key -> [[future, speculative], ...]
+        self._closed = False
+
+    def submit(self, step: Dict, speculative: bool = False) -> bool:
+        """ Start step in the background, returns whether it was started (or already running) """
+        if not isinstance(step, dict) or step.get("depends_on"):
+            return False
+        tool = registry.get(step.get("tool"))
+        args = step.get("args") or {}
+        if tool is None or not isinstance(args, dict) or tool.validate(args):
+            return False
+        if speculative and not tool.side_effect_free:
+            return False
+
+        key = step_key(step)
+        with self._lock:
+            if self._closed:
+                return False
+            calls = self._calls.setdefault(key, [])
+            if not speculative:
+                # the model asked for what we guessed: keep the running call
+                for call in calls:
+                    if call[1]:
+                        call[1] = False
+                        self._executor._count_prefetch("confirmed")
+                        return True
+            elif calls:
+                return True
+            future = self._executor._spawn(self._executor._call_tool, step)
+            calls.append([future, speculative])
+        self._executor._count_prefetch("speculative" if speculative else "streamed")
+        return True
+
+    def take(self, step: Dict):
+        """ Future of a prefetched call matching step, or None """
+        with self._lock:
+            calls = self._calls.get(step_key(step))
+            if not calls:
+                return None
+            future, _ = calls.pop(0)
+        return future
+
+    def discard(self):
+        """ Drop every unclaimed call; safe to call more than once """
+        with self._lock:
+            self._closed = True
+            leftovers = [future for calls in self._calls.values() for future, _ in calls]
+            self._calls = {}
+        for future in leftovers:
+            future.cancel()
+            self._executor._count_prefetch("wasted")
+
+
+class ToolRun:
+    """
+    A plan's tool calls running in the background, for progressive answering.
+
+    wait(timeout) blocks until every step finished or the timeout passed,
+    wait_first(timeout) until at least one did; output() is the executor
+    output so far, with unfinished steps as {"pending": True, ...};
+    late_output(earlier) has only the steps that were still pending in an
+    earlier output().
+    """
+
+    def __init__(self, executor: "ChainExecutorNode", plan: Dict[str, Any], prefetch: StepPrefetcher = None):
+        self.plan = plan
+        self.steps = [plan] if plan.get("action") == "use_tool" else list(plan.get("steps") or [])
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._results = [None] * len(self.steps)
+        self._final = None
+        self._first = threading.Event()
+        self._done = threading.Event()
+        self._started = time.perf_counter()
+
+        context = contextvars.copy_context()        # turn deadline + trace parent
+        threading.Thread(target=context.run, args=(self._run, prefetch), name="tool-run", daemon=True).start()
+
+    def _run(self, prefetch: StepPrefetcher):
+        try:
+            self._final = self._executor.process(self.plan, prefetch, on_result=self._on_result)
+        finally:
+            self._done.set()
+            self._first.set()
+
+    def _on_result(self, index: int, result: Dict):
+        with self._lock:
+            self._results[index] = result
+        self._first.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def wait_first(self, timeout: float = None) -> bool:
+        return self._first.wait(timeout)
+
+    @staticmethod
+    def pending(output: Dict[str, Any]) -> List[int]:
+        """ Indexes of the steps still running when `output` was taken """
+        return [i for i, result in enumerate(output.get("results", [])) if result.get("pending")]
+
+    def output(self) -> Dict[str, Any]:
+        if self._done.is_set() and self._final is not None:
+            return self._final
+        with self._lock:
+            results = [
+                result if result is not None else {"pending": True, "tool": step.get("tool")}
+                for step, result in zip(self.steps, self._results)
+            ]
+        return self._executor._output(self.plan, self.steps, results, self._started)
+
+    def late_output(self, earlier: Dict[str, Any]):
+        """ Output for the steps that were pending in `earlier`, or None if there were none """
+        pending = self.pending(earlier)
+        if not pending:
+            return None
+        results = self.output()["results"]
+        steps = [self.steps[i] for i in pending]
+        late = [results[i] for i in pending]
+        return {
+            "results": late,
+            "summary": "\n".join(self._executor._summary_line(i, step, result) for i, step, result in zip(pending, steps, late)),
+        }
 
 
 class ChainExecutorNode(BaseNode):
     """
-    Executes a chain of tool calls in sequence.
+    Executes a chain of tool calls.
     
-    Takes a plan with multiple steps and executes them one by one,
-    collecting all results.
+    Takes a plan with multiple steps and executes them, collecting all
+    results. In parallel mode (default) independent steps run concurrently,
+    at most max_workers at a time per plan; a step only waits for the steps
+    listed in its optional "depends_on". Results always come back in the
+    original step order.
     
     Input: 
         plan: List of action dicts or single action dict
+        Steps may carry an "id" (defaults to the 1-based step number) and
+        "depends_on": id or list of ids of earlier steps.
     
     Output:
         {"results": [result1, result2, ...], "final_result": combined_output}
+
+    A StepPrefetcher (see prefetcher()) passed to process() supplies calls
+    that were already started while the plan was still streaming; start()
+    runs a plan in the background for progressive answering.
+
+    Every step has a timeout (Tool.timeout, else step_timeout, capped by the
+    turn deadline); a step that overruns is reported as an error and its
+    thread is abandoned, so one hung tool can't hold up the answer. Timed
+    steps and prefetched calls run on their own daemon threads rather than
+    a pool: an abandoned call strands only its thread, never a worker later
+    steps or turns need.
     """
     
-    def __init__(self):
+    def __init__(self, parallel: bool = True, max_workers: int = 4, step_timeout: float = DEFAULT_STEP_TIMEOUT):
         self.tool_runner = ToolRunnerNode()
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.step_timeout = step_timeout
+        self._stats_lock = threading.Lock()
+        self._stats = {"streamed": 0, "speculative": 0, "confirmed": 0, "used": 0, "wasted": 0, "timeouts": 0}
+
+    def prefetcher(self) -> StepPrefetcher:
+        """ New per-turn prefetcher feeding this executor """
+        return StepPrefetcher(self)
+
+    def start(self, plan: Dict[str, Any], prefetch: StepPrefetcher = None) -> ToolRun:
+        """ Run plan in the background, see ToolRun """
+        return ToolRun(self, plan, prefetch)
+
+    @staticmethod
+    def _spawn(fn: Callable, *args) -> Future:
+        """ fn(*args) on a new daemon thread in the caller's context (turn deadline, trace parent) """
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(context.run(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="tool-call", daemon=True).start()
+        return future
+
+    def _count_prefetch(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        """ Prefetch counters (started from the stream / speculatively, reused, thrown away) and timeouts """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _timeout_for(self, step: Dict):
+        """ Seconds step may run: the tool's own timeout or step_timeout, capped by the turn deadline """
+        tool = registry.get(step.get("tool"))
+        timeout = tool.timeout if tool is not None and tool.timeout is not None else self.step_timeout
+        deadline = current_deadline()
+        if deadline is not None:
+            timeout = deadline.remaining() if timeout is None else deadline.cap(timeout)
+        return timeout
+
+    def _timed_out(self, step: Dict, timeout: float) -> Dict:
+        self._count_prefetch("timeouts")
+        return {"error": f"Timed out after {timeout:.1f}s", "tool": step.get("tool"), "duration_ms": round(timeout * 1000, 2)}
     
-    def process(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+    @traced("node.chain_executor")
+    def process(self, plan: Dict[str, Any], prefetch: StepPrefetcher = None, on_result: Callable[[int, Dict], None] = None) -> Dict[str, Any]:
         """
         Execute plan (single step or multi-step).
         
@@ -28,6 +259,8 @@ class ChainExecutorNode(BaseNode):
             plan: Either:
                 - Single step: {"action": "use_tool", "tool": "...", "args": {...}}
                 - Multi-step: {"action": "use_tools", "steps": [{...}, {...}]}
+            prefetch: optional StepPrefetcher with calls already started
+            on_result: optional callback(step index, result) as each step finishes
         
         Returns:
             {"results": [...], "summary": "..."}
@@ -36,7 +269,9 @@ class ChainExecutorNode(BaseNode):
         
         # Single tool execution (backward compatible)
         if action == "use_tool":
-            result = self.tool_runner.process(plan)
+            result, _ = self._run_step_timed(plan, prefetch)
+            if on_result is not None:
+                on_result(0, result)
             return {
                 "results": [result],
                 "summary": self._format_single_result(plan, result)     # Format single result from steps
@@ -52,7 +287,7 @@ class ChainExecutorNode(BaseNode):
         # Multi-step execution (new!)
         elif action == "use_tools":
             steps = plan.get("steps", [])
-            return self._execute_chain(steps)
+            return self._execute_chain(steps, prefetch, on_result)
         
         else:
             return {
@@ -60,57 +295,212 @@ class ChainExecutorNode(BaseNode):
                 "summary": f"Unknown action: {action}"
             }
     
-    def _execute_chain(self, steps: List[Dict]) -> Dict[str, Any]:
+    def _execute_chain(self, steps: List[Dict], prefetch: StepPrefetcher = None, on_result: Callable = None) -> Dict[str, Any]:
         """
-        Execute multiple tool calls in sequence.
+        Execute multiple tool calls, concurrently where the plan allows.
         
         Args:
-            steps: List of step dicts: [{"tool": "...", "args": {...}}, ...]
+            steps: List of step dicts: [{"tool": "...", "args": {...}, "depends_on": [...]}, ...]
         
         Returns:
-            {"results": [...], "summary": "..."}
+            {"results": [...], "summary": "...", "elapsed_ms": ...}
         """
-        all_results = []
-        success_count = 0
-        has_errors = False
-        summary_parts = []
-        
-        for i, step in enumerate(steps):
-            print(f"[ChainExecutor] Executing step {i+1}/{len(steps)}: {step.get('tool')}")
-            
-            # Execute this step
-            try:
-                result = self.tool_runner.process({
-                    "action": "use_tool",
-                    "tool": step.get("tool"),
-                    "args": step.get("args", {})
-                })
-            except Exception as e:
-                has_errors = True
-                result = {
-                    "error": str(e),
-                    "tool": step.get("tool")}
+        started = time.perf_counter()
+
+        if self.parallel and len(steps) > 1:
+            all_results, has_errors = self._execute_parallel(steps, prefetch, on_result)
+        else:
+            all_results, has_errors = self._execute_sequential(steps, prefetch, on_result)
 
+        return self._chain_output(steps, all_results, has_errors, started)
 
-            all_results.append(result)
-            
-            # Format result for summary
-            if "result" in result:
-                success_count += 1
-                summary_parts.append(
-                    f"✓ Step {i+1} ({step.get('tool')}): {result['result']} successfully executed."
-                )
-            elif "error" in result:
-                summary_parts.append(
-                    f"✗ Step {i+1} ({step.get('tool')}): ERROR - {result['error']} unable to execute."
-                )
+
+    def _chain_output(self, steps: List[Dict], all_results: List[Dict], has_errors: bool, started: float) -> Dict[str, Any]:
+        success_count = sum(1 for result in all_results if "result" in result)
+        summary_parts = [
+            self._summary_line(i, step, result)
+            for i, (step, result) in enumerate(zip(steps, all_results))
+        ]
         
         return {
             "results": all_results,
-            "summary": "\n".join(summary_parts),
+            "summary": "\n".join(part for part in summary_parts if part),
             "successful_steps": f"{success_count} / {len(steps)}",
-            "has_errors": has_errors
+            "has_errors": has_errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
         }
+
+
+    @staticmethod
+    def _summary_line(i: int, step: Dict, result: Dict) -> str:
+        # Format result for summary
+        if "result" in result:
+            return f"✓ Step {i+1} ({step.get('tool')}): {result['result']} successfully executed."
+        if "error" in result:
+            return f"✗ Step {i+1} ({step.get('tool')}): ERROR - {result['error']} unable to execute."
+        if result.get("pending"):
+            return f"… Step {i+1} ({step.get('tool')}): PENDING - still running, no result yet."
+        return ""
+
+
+    def _output(self, plan: Dict[str, Any], steps: List[Dict], results: List[Dict], started: float) -> Dict[str, Any]:
+        """ Output in the same shape process() returns, for results collected so far """
+        if plan.get("action") == "use_tool":
+            return {"results": results, "summary": self._format_single_result(plan, results[0])}
+        return self._chain_output(steps, results, any("error" in r for r in results), started)
+
+
+    def _execute_sequential(self, steps: List[Dict], prefetch: StepPrefetcher = None, on_result: Callable = None):
+        """ Run steps one after another in plan order """
+        all_results = []
+        has_errors = False
+
+        for i, step in enumerate(steps):
+            logger.info("executing step %d/%d: %s", i + 1, len(steps), step.get("tool"))
+            result, failed = self._run_step_timed(step, prefetch)
+            has_errors = has_errors or failed
+            all_results.append(result)
+            if on_result is not None:
+                on_result(i, result)
+
+        return all_results, has_errors
+
+
+    def _execute_parallel(self, steps: List[Dict], prefetch: StepPrefetcher = None, on_result: Callable = None):
+        """
+        Run steps as a DAG, each on its own thread.
+
+        A step starts as soon as everything in its depends_on has finished
+        (and fewer than max_workers steps are running), so wall-clock time
+        tracks the slowest dependency chain rather than the sum of all
+        steps. A step still running after its timeout is recorded as timed
+        out and left behind; it no longer counts against max_workers.
+        """
+        ids = [step.get("id", i + 1) for i, step in enumerate(steps)]
+        index_of = {step_id: i for i, step_id in enumerate(ids)}
+
+        results = [None] * len(steps)
+        has_errors = False
+
+        def finish(i: int, result: Dict):
+            results[i] = result
+            if on_result is not None:
+                on_result(i, result)
+
+        # resolve dependencies up front, bad references fail only that step
+        deps = {}
+        for i, step in enumerate(steps):
+            wanted = step.get("depends_on") or []
+            if not isinstance(wanted, list):
+                wanted = [wanted]
+            missing = [d for d in wanted if d not in index_of or index_of[d] == i]
+            if missing:
+                finish(i, {"error": f"Unknown dependency: {missing}", "tool": step.get("tool")})
+            else:
+                deps[i] = {index_of[d] for d in wanted}
+
+        pending = set(deps)
+        running = {}
+        expires = {}        # future -> (perf_counter deadline, timeout)
+
+        while pending or running:
+            # submit every step whose dependencies are done (skips can unlock more steps)
+            progressed = True
+            while progressed:
+                progressed = False
+                for i in sorted(pending):
+                    if any(results[j] is None for j in deps[i]):
+                        continue
+
+                    failed_deps = [ids[j] for j in deps[i] if "error" in results[j]]
+                    if failed_deps:
+                        pending.discard(i)
+                        progressed = True
+                        finish(i, {"error": f"Skipped: dependency {failed_deps} failed", "tool": steps[i].get("tool")})
+                        continue
+
+                    if len(running) >= self.max_workers:
+                        continue            # ready, starts when a running step finishes
+                    pending.discard(i)
+                    progressed = True
+
+                    logger.info("executing step %d/%d: %s", i + 1, len(steps), steps[i].get("tool"))
+                    future = self._spawn(self._run_step, steps[i], prefetch)
+                    running[future] = i
+                    timeout = self._timeout_for(steps[i])
+                    if timeout is not None:
+                        expires[future] = (time.perf_counter() + timeout, timeout)
+
+            if not running:
+                # what is left waits on a cycle, nothing can ever start
+                for i in pending:
+                    finish(i, {"error": "Dependency cycle detected", "tool": steps[i].get("tool")})
+                break
+
+            waiting = [expires[f][0] for f in running if f in expires]
+            wait_for = max(0.0, min(waiting) - time.perf_counter()) if waiting else None
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                expires.pop(future, None)
+                result, failed = future.result()
+                finish(i, result)
+                has_errors = has_errors or failed
+
+            now = time.perf_counter()
+            for future in [f for f in running if f in expires and expires[f][0] <= now]:
+                i = running.pop(future)
+                finish(i, self._timed_out(steps[i], expires.pop(future)[1]))
+                has_errors = True
+
+        return results, has_errors
+
+
+    def _call_tool(self, step: Dict) -> Dict:
+        return self.tool_runner.process({
+            "action": "use_tool",
+            "tool": step.get("tool"),
+            "args": step.get("args", {})
+        })
+
+
+    def _prefetched(self, step: Dict, prefetch: StepPrefetcher):
+        """ Result of a matching prefetched call, or None if there is none (or it hadn't started yet) """
+        future = prefetch.take(step) if prefetch is not None else None
+        if future is None or future.cancel():
+            return None         # not started yet: cheaper to run it right here
+        self._count_prefetch("used")
+        return future.result()
+
+
+    def _run_step_timed(self, step: Dict, prefetch: StepPrefetcher = None):
+        """ _run_step() bounded by the step's timeout (on its own thread, left behind if it overruns) """
+        timeout = self._timeout_for(step)
+        if timeout is None:
+            return self._run_step(step, prefetch)
+        future = self._spawn(self._run_step, step, prefetch)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            return self._timed_out(step, timeout), True
+
+
+    def _run_step(self, step: Dict, prefetch: StepPrefetcher = None):
+        """ Execute one step, returns (result_with_timing, raised_exception) """
+        started = time.perf_counter()
+        failed = False
+        try:
+            result = self._prefetched(step, prefetch)
+            if result is None:
+                result = self._call_tool(step)
+        except Exception as e:
+            failed = True
+            result = {
+                "error": str(e),
+                "tool": step.get("tool")}
+
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result, failed
         
     
     def _format_single_result(self, plan: Dict, result: Dict) -> str:
@@ -121,5 +511,7 @@ class ChainExecutorNode(BaseNode):
             return f"{tool_name}: {result['result']}"
         elif "error" in result:
             return f"{tool_name}: ERROR - {result['error']}"
+        elif result.get("pending"):
+            return f"{tool_name}: PENDING - still running, no result yet"
         else:
             return f"{tool_name}: No result"
\ No newline at end of file
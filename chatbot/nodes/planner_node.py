@@ -1,13 +1,163 @@
 import json
+import time
+import logging
+import threading
 from .base_node import BaseNode
-from chatbot.utils.call_llm import call_llm
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient, get_default_client, get_default_async_client
+from chatbot.utils.plan_stream import PlanStreamParser
+from chatbot.utils.json_schema import schema_errors
+from chatbot.utils.node_config import get_node_config
+from chatbot.utils.prompt_builder import PromptLayout
+from chatbot.utils.tracing import traced, current_span
+from chatbot.tools import registry
 
-AVAILABLE_TOOLS = {
-    "get_time": "Returns the current system time.  Parameters: NONE (use empty args: {})",
-    "random_number": "Returns a random integer between 1 and 100.  Parameters: NONE (use empty args: {})",
-    "fake_weather": "Returns a fake weather report for a given location.  Parameters: NONE (use empty args: {})",
-    "failing_tool": "A tool that always fails to demonstrate error handling,  Parameters: NONE (use empty args: {})"
-}
+logger = logging.getLogger(__name__)
+
+
+def build_plan_schema(call_schemas: list) -> dict:
+    """
+    JSON schema for planner output, sent to Ollama as `format` so the model
+    can only emit a well-formed plan naming real tools with their own args.
+
+    Args:
+        call_schemas: one {"tool", "args"} schema per tool (registry.call_schemas())
+    """
+    step_schemas = [
+        {
+            **call,
+            "properties": {
+                **call["properties"],
+                "depends_on": {"type": "array", "items": {"type": "integer"}},     # 1-based step numbers
+            },
+        }
+        for call in call_schemas
+    ]
+    return {
+        "anyOf": [
+            {
+                "type": "object",
+                "properties": {"action": {"type": "string", "enum": ["answer_direct"]}},
+                "required": ["action"],
+            },
+            *(
+                {
+                    "type": "object",
+                    "properties": {"action": {"type": "string", "enum": ["use_tool"]}, **call["properties"]},
+                    "required": ["action", "tool"],
+                }
+                for call in call_schemas
+            ),
+            {
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "enum": ["use_tools"]},
+                    "steps": {"type": "array", "items": {"anyOf": step_schemas}},
+                },
+                "required": ["action", "steps"],
+            },
+        ],
+    }
+
+
+def build_planner_prompt(tool_block: str) -> str:
+    return (
+        "You are a planning assistant for a chatbot.\n"
+        "Your job is to decide what tools to use to answer the user\n"
+        "Available tools:\n"
+        + tool_block
+        + "\n"
+        "\n"
+        "You must respond with a JSON object. Examples:\n"
+        "\n"
+        "For simple questions (no tools needed):\n"
+        '{"action": "answer_direct"}\n'
+        "\n"
+        "For questions needing ONE tool:\n"
+        '{"action": "use_tool", "tool": "get_time", "args": {}}\n'
+        "\n"
+        "For questions needing MULTIPLE tools:\n"
+        '{"action": "use_tools", "steps": [\n'
+        '  {"tool": "fake_weather", "args": {"location": "Tokyo"}},\n'
+        '  {"tool": "get_time", "args": {}},\n'
+        '  {"tool": "random_number", "args": {}}, \n'
+        '  {"tool": "failing_tool", "args": {}} \n'
+        ']}\n'
+        "\n"
+        "Rules:\n"
+        "- If the question needs multiple pieces of information, use 'use_tools' with steps array\n"
+        "- If the question needs only one tool, use 'use_tool'\n"
+        "- If the question is simple chit-chat, use 'answer_direct'\n"
+        "- Analyze the user's question carefully to identify how many tools are needed\n"
+        "- Reply to the latest user message with the planner JSON only\n"
+    )
+
+
+# read at call time: rebuilt only when a tool is (un)registered, so the
+# prompt prefix stays byte-identical between turns but new tools show up
+def plan_schema() -> dict:
+    return registry.derived("plan_schema", lambda reg: build_plan_schema(reg.call_schemas()))
+
+
+def planner_layout() -> PromptLayout:
+    return registry.derived("planner_layout", lambda reg: PromptLayout(build_planner_prompt(reg.prompt_block())))
+
+
+def _strip_code_fence(raw: str) -> str:
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.split("\n", 1)[1] if "\n" in raw else ""
+        raw = raw.rsplit("```", 1)[0]
+    return raw.strip()
+
+
+def parse_plan_strict(raw: str, schema: dict = None) -> dict:
+    """
+    Parse raw planner LLM output into a plan dict and validate it against
+    the plan schema (default: the current plan_schema()).
+
+    Raises:
+        json.JSONDecodeError if the output isn't JSON
+        ValueError if it is JSON but not a valid plan
+    """
+    plan = json.loads(_strip_code_fence(raw))
+
+    errors = schema_errors(plan, schema if schema is not None else plan_schema())
+    if errors:
+        raise ValueError(f"Planner response failed validation: {errors}")
+
+    action = plan["action"]
+
+    if action == "answer_direct":
+        plan["tool"] = None
+        plan.setdefault("args", {})
+
+    elif action == "use_tool":
+        if not plan.get("tool"):
+            raise ValueError("Missing 'tool' in planner response.")
+        plan.setdefault("args", {})
+
+    elif action == "use_tools":
+        if not plan.get("steps"):
+            raise ValueError("Invalid or missing 'steps' in planner response.")
+
+    return plan
+
+
+def parse_plan(raw: str) -> dict:
+    """
+    Parse raw planner LLM output into a plan dict.
+
+    Falls back to {"action": "answer_direct"} if the output is not a usable plan.
+    """
+    try:
+        return parse_plan_strict(raw)
+    except Exception:
+        # if anything goes wrong, fall back: answer directly
+        return {
+            "action": "answer_direct",
+            "tool": None,
+            "args": {}
+        }
 
 
 class PlannerNode(BaseNode):
@@ -21,120 +171,226 @@ class PlannerNode(BaseNode):
     Returns small 'plan' dict with keys:
     - {}"action": "answer_direct"}
     - {"action": "use_tool", "tool": "get_time", "args": {}}
+
+    process_streaming() / aprocess_streaming() stream the plan instead and
+    hand every step to a StepPrefetcher the moment its JSON closes, so tools
+    run while the model is still writing the rest of the plan. With a
+    speculator (e.g. a RouterNode), its guesses for side-effect-free tools
+    start even before the first token.
     """
 
+    def __init__(self, client: LLMClient = None, async_client: AsyncLLMClient = None, router=None, plan_cache=None, speculator=None):
+        self.client = client or get_default_client()       # shared pooled LLM client
+        self.async_client = async_client                   # None -> per-loop default in aprocess
+        self.router = router                               # optional RouterNode fast path
+        self.plan_cache = plan_cache                       # optional PlanCache
+        self.speculator = speculator                       # optional .guess(message) -> steps, for prefetch
+        self.config = get_node_config("planner")           # keep_alive / num_ctx / num_predict
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"llm_calls": 0, "llm_errors": 0, "parse_failures": 0, "validation_failures": 0, "fallbacks": 0, "escalations": 0}
+
+    @traced("node.planner")
     def process(self, user_message: str, conversation_history: list) -> dict:
-        
-        # 1. Build a description of tools for the prompt
-        tools_lines = []
-
-        for name, desc in AVAILABLE_TOOLS.items():
-            tools_lines.append(f"- {name}: {desc}")
-        tools_block = "\n".join(tools_lines)
-
-        # 2. System-style instructions for planner
-        system_instructions = (
-            "You are a planning assistant for a chatbot.\n"
-            "Your job is to decide what tools to use to answer the user\n"
-            f"Available tools:\n{tools_block}\n"
-            "\n"
-            "You must respond with a JSON object. Examples:\n"
-            "\n"
-            "For simple questions (no tools needed):\n"
-            '{"action": "answer_direct"}\n'
-            "\n"
-            "For questions needing ONE tool:\n"
-            '{"action": "use_tool", "tool": "get_time", "args": {}}\n'
-            "\n"
-            "For questions needing MULTIPLE tools:\n"
-            '{"action": "use_tools", "steps": [\n'
-            '  {"tool": "fake_weather", "args": {"location": "Tokyo"}},\n'
-            '  {"tool": "get_time", "args": {}},\n'
-            '  {"tool": "random_number", "args": {}}, \n'
-            '  {"tool": "failing_tool", "args": {}} \n'
-            ']}\n'
-            "\n"
-            "Rules:\n"
-            "- If the question needs multiple pieces of information, use 'use_tools' with steps array\n"
-            "- If the question needs only one tool, use 'use_tool'\n"
-            "- If the question is simple chit-chat, use 'answer_direct'\n"
-            "- Analyze the user's question carefully to identify how many tools are needed\n"
-        )
-
-        # build messages with convo history
-        messages = []
-
-        # add system instructions
-        messages.append({
-            "role": "system",
-            "content": system_instructions
-        })
-
-        # add convo history if present
-        if conversation_history:
-            # add all previous messages except last user message
-            for msg in conversation_history[:-1]:
-                messages.append(msg)
-
-        # add current user message
-        messages.append({
-            "role": "user",
-            "content": f"{user_message}\n\nPlanner JSON Response:"
-        })
-
-        raw = call_llm(messages = messages).strip()
-        print("[DEBUG planner ra]:", repr(raw))
-
-        # 3. Parse LLM output as JSON
+        # fast path: router rule or cached plan skips the LLM entirely
+        plan = self._lookup(user_message, conversation_history)
+        if plan is not None:
+            return plan
+
+        messages = self._build_messages(user_message, conversation_history)
+        started = time.perf_counter()
+        raw = self._ask(messages)
+        self._record_latency(started)
+        logger.debug("planner raw plan: %r", raw)
+        plan = self._parse(raw)
+
+        # small model produced an unusable plan -> one more try on the bigger model
+        if self._should_escalate(raw, plan):
+            plan = self._parse(self._ask(messages, self.config.escalate_model))
+
+        return self._finish(plan, user_message, conversation_history)
+
+    @traced("node.planner")
+    async def aprocess(self, user_message: str, conversation_history: list) -> dict:
+        plan = self._lookup(user_message, conversation_history)
+        if plan is not None:
+            return plan
+
+        messages = self._build_messages(user_message, conversation_history)
+        started = time.perf_counter()
+        raw = await self._aask(messages)
+        self._record_latency(started)
+        logger.debug("planner raw plan: %r", raw)
+        plan = self._parse(raw)
+
+        if self._should_escalate(raw, plan):
+            plan = self._parse(await self._aask(messages, self.config.escalate_model))
+
+        return self._finish(plan, user_message, conversation_history)
+
+    @traced("node.planner")
+    def process_streaming(self, user_message: str, conversation_history: list, prefetch) -> dict:
+        """ process(), dispatching steps to prefetch (a StepPrefetcher) while the plan streams """
+        plan = self._lookup(user_message, conversation_history)
+        if plan is not None:
+            return plan
+
+        self._speculate(user_message, prefetch)
+        messages = self._build_messages(user_message, conversation_history)
+        parser = PlanStreamParser()
+        dispatched = set()
+        started = time.perf_counter()
         try:
-            start = raw.find("{")
-            end = raw.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                json_str = raw[start:end+1]
-            else:
-                json_str = raw
-
-            plan = json.loads(json_str)
-
-            action = plan.get("action")
-
-            if action is None:
-                raise ValueError("Missing 'action' in planner response.")
-            
-            if action == "answer_direct":
-                plan["action"] = "answer_direct"
-                plan["tool"] = None
-                plan.setdefault("args", {})
-
-            elif action == "use_tool":
-                tool_name = plan.get("tool")
-                if not tool_name or tool_name not in AVAILABLE_TOOLS:
-                    raise ValueError(f"Invalid or missing 'tool' in planner response: {tool_name}")
-                plan["action"] = "use_tool"
-                plan["tool"] = tool_name
-                plan.setdefault("args", {})
-
-            elif action == "use_tools":
-                steps = plan.get("steps")
-                if not steps or not isinstance(steps, list):
-                    raise ValueError("Invalid or missing 'steps' in planner response.")
-                plan["action"] = "use_tools"
-                plan["steps"] = steps
-
-            else:
-                tool_name = action
-                plan = {
-                    "action": "use_tool",
-                    "tool": tool_name,
-                    "args": plan.get("args", {})
-                }
+            for chunk in self.client.chat_stream(messages, format=plan_schema(), options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority):
+                for event in parser.feed(chunk):
+                    self._dispatch(event, parser, prefetch, dispatched)
+            raw = parser.raw.strip()
+        except Exception as e:
+            # a cut-off stream isn't a bad plan: no parse, no escalation
+            self._llm_failed(e)
+            raw = None
+        self._record_latency(started)
+        logger.debug("planner raw plan: %r", raw)
+        plan = self._parse(raw)
+
+        if self._should_escalate(raw, plan):
+            plan = self._parse(self._ask(messages, self.config.escalate_model))
+
+        return self._finish(plan, user_message, conversation_history)
 
+    @traced("node.planner")
+    async def aprocess_streaming(self, user_message: str, conversation_history: list, prefetch) -> dict:
+        """ Async twin of process_streaming() """
+        plan = self._lookup(user_message, conversation_history)
+        if plan is not None:
             return plan
-        
-        except Exception:
-            # if anything goes wrong, fall back: answer directly
-            return {
-                "action": "answer_direct",
-                "tool": None,
-                "args": {}
-            }
\ No newline at end of file
+
+        self._speculate(user_message, prefetch)
+        messages = self._build_messages(user_message, conversation_history)
+        parser = PlanStreamParser()
+        dispatched = set()
+        started = time.perf_counter()
+        try:
+            client = self.async_client or get_default_async_client()
+            async for chunk in client.chat_stream(messages, format=plan_schema(), options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority):
+                for event in parser.feed(chunk):
+                    self._dispatch(event, parser, prefetch, dispatched)
+            raw = parser.raw.strip()
+        except Exception as e:
+            self._llm_failed(e)
+            raw = None
+        self._record_latency(started)
+        plan = self._parse(raw)
+
+        if self._should_escalate(raw, plan):
+            plan = self._parse(await self._aask(messages, self.config.escalate_model))
+
+        return self._finish(plan, user_message, conversation_history)
+
+    def _speculate(self, user_message: str, prefetch):
+        # the prefetcher itself refuses tools that aren't side_effect_free
+        if self.speculator is not None:
+            for step in self.speculator.guess(user_message):
+                prefetch.submit(step, speculative=True)
+
+    @staticmethod
+    def _dispatch(event: tuple, parser: PlanStreamParser, prefetch, dispatched: set):
+        """ Start a step as soon as the stream says enough about it """
+        kind, key, value = event
+        if kind == "step":
+            if parser.fields.get("action", "use_tools") == "use_tools":
+                prefetch.submit(value)
+            return
+        fields = parser.fields
+        if fields.get("action") == "use_tool" and "tool" in fields and "args" in fields and "use_tool" not in dispatched:
+            dispatched.add("use_tool")
+            prefetch.submit({"tool": fields["tool"], "args": fields["args"]})
+
+    def _lookup(self, user_message: str, conversation_history: list) -> dict | None:
+        if self.router is not None:
+            plan = self.router.process(user_message)
+            if plan is not None:
+                return plan
+
+        if self.plan_cache is not None:
+            return self.plan_cache.get(user_message, conversation_history)
+        return None
+
+    def _ask(self, messages: list, model: str = None) -> str | None:
+        """ Raw planner reply, or None if the call itself failed (outage, overload, deadline) """
+        try:
+            return self.client.chat(messages, format=plan_schema(), options=self.config.options, keep_alive=self.config.keep_alive, model=model or self.config.model, priority=self.config.priority).strip()
+        except Exception as e:
+            self._llm_failed(e)
+            return None
+
+    async def _aask(self, messages: list, model: str = None) -> str | None:
+        client = self.async_client or get_default_async_client()
+        try:
+            return (await client.chat(messages, format=plan_schema(), options=self.config.options, keep_alive=self.config.keep_alive, model=model or self.config.model, priority=self.config.priority)).strip()
+        except Exception as e:
+            self._llm_failed(e)
+            return None
+
+    def _llm_failed(self, exc: Exception):
+        # not the model's fault: counted apart from parse / validation failures
+        self._count("llm_errors")
+        logger.warning("planner LLM call failed: %s: %s", type(exc).__name__, exc)
+        span = current_span()
+        if span is not None:
+            span.set(llm_error=type(exc).__name__)
+
+    def _should_escalate(self, raw: str | None, plan: dict | None) -> bool:
+        """ Retry on the bigger model only when the small one answered with an unusable plan """
+        if plan is not None or raw is None or not self.config.escalate_model:
+            return False
+        self._count("escalations")
+        logger.info("planner escalating to %s after unusable plan: %r", self.config.escalate_model, raw)
+        span = current_span()
+        if span is not None:
+            span.set(escalated_to=self.config.escalate_model)
+        return True
+
+    def _parse(self, raw: str | None) -> dict | None:
+        """ Strictly parsed plan, or None (counted) if the output is unusable """
+        if raw is None:
+            return None
+        try:
+            return parse_plan_strict(raw)
+        except json.JSONDecodeError:
+            self._count("parse_failures")
+        except ValueError:
+            self._count("validation_failures")
+        return None
+
+    def _finish(self, plan: dict | None, user_message: str, conversation_history: list) -> dict:
+        if plan is None:
+            return self._fallback()
+
+        # only plans the model actually produced get cached, never fallbacks
+        if self.plan_cache is not None:
+            self.plan_cache.put(user_message, plan, conversation_history)
+        return plan
+
+    def _fallback(self) -> dict:
+        # output unusable -> answer directly rather than guess
+        self._count("fallbacks")
+        return {"action": "answer_direct", "tool": None, "args": {}}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        """ LLM planning calls and how many of them had to fall back """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _record_latency(self, started: float):
+        self._count("llm_calls")
+        if self.router is not None:
+            self.router.record_planner_latency(time.perf_counter() - started)
+
+    def _build_messages(self, user_message: str, conversation_history: list) -> list:
+        # stable prefix: system prompt + older history, user message verbatim at the end
+        return planner_layout().build(user_message, conversation_history)
@@ -1,107 +1,301 @@
-from chatbot.tools.simple_tools import get_time, random_number, fake_weather, failing_tool
+import asyncio
+import threading
 import json
 from .base_node import BaseNode
-from chatbot.utils.call_llm import call_llm
+from .chain_executor_node import ChainExecutorNode, step_key
+from chatbot.utils.call_llm import call_llm, acall_llm
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient, get_default_client
+from chatbot.utils.json_schema import schema_errors
+from chatbot.utils.memory import message_tokens
+from chatbot.utils.node_config import get_node_config
+from chatbot.utils.prompt_builder import ChatMessage, PromptLayout
+from chatbot.utils.resilience import current_deadline, deadline_scope
+from chatbot.utils.tracing import traced
+from chatbot.tools import registry
 
-TOOL_MAP = {
-    "get_time": get_time,
-    "random_number": random_number,
-    "fake_weather": fake_weather,
-    "failing_tool": failing_tool
+# last allowed decision (out of iterations / tokens, or repeating itself): answer now
+FINISH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["finish"]},
+        "answer": {"type": "string"},
+    },
+    "required": ["action", "answer"],
 }
 
-AVAILABLE_TOOLS = {
-    "get_time": "Returns the current system time. Parameters: NONE (use empty args: {})",
-    "random_number": "Returns a random integer between 1 and 100. Parameters: NONE (use empty args: {})",
-    "fake_weather": "Returns a fake weather report for a given location. Parameters: NONE (use empty args: {})",
-    "failing_tool": "A tool that always fails to demonstrate error handling. Parameters: NONE (use empty args: {})"
-}
+
+def build_decision_schema(call_schemas: list) -> dict:
+    """
+    Structured output schema for one ReAct decision (sent as Ollama `format`).
+
+    Args:
+        call_schemas: one {"tool", "args"} schema per tool (registry.call_schemas())
+    """
+    return {
+        "anyOf": [
+            *(
+                {
+                    "type": "object",
+                    "properties": {"action": {"type": "string", "enum": ["use_tool"]}, **call["properties"]},
+                    "required": ["action", "tool"],
+                }
+                for call in call_schemas
+            ),
+            {
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "enum": ["use_tools"]},
+                    "steps": {"type": "array", "items": {"anyOf": call_schemas}},
+                },
+                "required": ["action", "steps"],
+            },
+            FINISH_SCHEMA,
+        ],
+    }
+
+
+def build_react_prompt(tool_block: str) -> str:
+    return (
+        "You are a ReAct agent. Your job is to decide what to do next. \n"
+        "Available tools:\n"
+        + tool_block
+        + "\n"
+        "\n"
+        "You must respond with JSON in one of three formats:\n"
+        "1. To use a tool (when you need more information):\n"
+        '{"action": "use_tool", "tool": "get_time", "args": {}}\n'
+        "2. To use several independent tools at once:\n"
+        '{"action": "use_tools", "steps": [{"tool": "get_time", "args": {}}, {"tool": "fake_weather", "args": {"location": "Tokyo"}}]}\n'
+        "3. To finish (when you have enough information to answer):\n"
+        '{"action": "finish", "answer": "The time is 3PM"}'
+        "\n"
+        "Think step by step:\n"
+        "- What information do I need?\n"
+        "- Do I already have it from previous observations?\n"
+        "- If not, which tools should I use? Ask for all independent ones together.\n"
+        "- If yes, provide the final answer.\n"
+        "Never repeat a tool call you already made, its observation will not change.\n"
+    )
+
+
+# read at call time, rebuilt only when a tool is (un)registered
+def decision_schema() -> dict:
+    return registry.derived("react_decision_schema", lambda reg: build_decision_schema(reg.call_schemas()))
+
+
+def react_layout() -> PromptLayout:
+    return registry.derived("react_layout", lambda reg: PromptLayout(build_react_prompt(reg.prompt_block())))
+
+
+NEXT_CUE = "What should I do next?"
+FINISH_CUE = "You must give your final answer now."
+
+
+class ReactTurn:
+    """
+    State of one ReAct turn.
+
+    Attr:
+    - messages: the conversation sent to the model; only ever appended to,
+      so every call's prompt extends the previous call's prompt + reply and
+      Ollama reuses the cached prefix
+    - observations: tool outcomes so far (for the give-up answer)
+    - seen: step_key()s of the tool calls already made
+    - tokens: estimated tokens the loop has added to messages
+    - must_finish: next decision may only be "finish"
+    """
+
+    __slots__ = ("messages", "observations", "seen", "tokens", "must_finish")
+
+    def __init__(self, user_message: str):
+        self.messages = react_layout().build(user_message, tail=NEXT_CUE)
+        self.observations = []
+        self.seen = set()
+        self.tokens = 0
+        self.must_finish = False
+
+    def append(self, role: str, content: str):
+        message = ChatMessage(role, content)
+        self.messages.append(message)
+        self.tokens += message_tokens(message)
 
 
 class ReactNode(BaseNode):
+    """
+    ReAct loop: decide, run tools, observe, until the model finishes.
+
+    Every turn is bounded three ways: max_iter decisions, time_budget
+    seconds (shared with the tool calls through the turn deadline) and
+    token_budget estimated tokens of decisions + observations. The last
+    decision a budget allows is forced to "finish", as is the one after
+    the model asks again for calls it already made, so a turn never burns
+    its iterations without an answer. Several calls from one "use_tools"
+    decision run concurrently on the chain executor.
+    """
+
+    max_iter = 5
+
+    def __init__(
+            self,
+            client: LLMClient = None,
+            async_client: AsyncLLMClient = None,
+            chain_executor: ChainExecutorNode = None,
+            time_budget: float = 60.0,
+            token_budget: int = 2048,
+    ):
+        self.client = client or get_default_client()       # shared pooled LLM client
+        self.async_client = async_client                   # None -> per-loop default in aprocess
+        self.chain_executor = chain_executor or ChainExecutorNode()
+        self.time_budget = time_budget
+        self.token_budget = token_budget
+        self.config = get_node_config("react")             # keep_alive / num_ctx / num_predict
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "turns": 0, "llm_calls": 0, "tool_calls": 0, "parse_failures": 0, "validation_failures": 0,
+            "fallbacks": 0, "repeats": 0, "forced_finish": 0, "out_of_time": 0,
+        }
+
+    @traced("node.react")
     def process(self, user_message: str, conversation_history: list) -> dict:
-        # build sys instructions
-        tools_desc = "\n".join([f"- {name}: {desc}" for name, desc in AVAILABLE_TOOLS.items()])
-
-        system_instructions = (
-            "You are a ReAct agent. Your job is to decide what to do next. \n"
-            f"Available tools:\n{tools_desc}\n"
-            "\n"
-            "You must respond with JSON in one of two formats:\n"
-            "1. To use a tool (when you need more information):\n"
-            '{action": "use_tool", "tool": "get_time", "args": {}}\n'
-            "2. To finish (when you have enough information to answer):\n"
-            '{"action": "finish", "answer": Example: "The time is 3PM"}'
-            "\n"
-            "Think step by step:\n"
-            "- What information do I need?\n"
-            "- Do I already have it from previous observations?\n"
-            "- If not, which tool should I use?\n"
-            "- If yes, provide the final answer.\n"
-        )
-
-
-        # initialise tracking
-        observations = []
-        max_iter = 5
-
-        # ReAct loop
-        for iteration in range(max_iter):
-            # build observation history for LLM
-            obs_text = "\n".join([f"Observation {i+1}: {obs}" for i, obs in enumerate(observations)])
-
-            # build prompt for LLM decision
-            if obs_text:
-                user_prompt = f"User question: {user_message}\n\nPrevious observations:\n{obs_text}\n\nWhat should I do next?"
-            else:
-                user_prompt = f"User question: {user_message}\n\nWhat should I do next?"
+        turn = ReactTurn(user_message)
+        self._count("turns")
+
+        with deadline_scope(self.time_budget):
+            # ReAct loop
+            for iteration in range(self.max_iter):
+                schema = self._schema_for(turn, iteration)
+                if schema is None:
+                    break
+
+                # Ask LLM for decision
+                raw_response = call_llm(messages=turn.messages, client=self.client, format=schema, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority)
+
+                decision = self._parse_decision(raw_response, schema)
+                finished = self._handle_decision(decision, raw_response, turn)
+                if finished is not None:
+                    return finished
+
+        return self._give_up(turn.observations)
 
-            messages = [
-                {"role": "system", "content": system_instructions},
-                {"role": "user", "content": user_prompt}
-            ]
+    @traced("node.react")
+    async def aprocess(self, user_message: str, conversation_history: list) -> dict:
+        turn = ReactTurn(user_message)
+        self._count("turns")
 
+        with deadline_scope(self.time_budget):
+            for iteration in range(self.max_iter):
+                schema = self._schema_for(turn, iteration)
+                if schema is None:
+                    break
+                raw_response = await acall_llm(messages=turn.messages, client=self.async_client, format=schema, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority)
 
-            # Ask LLM for decision
-            raw_response = call_llm(messages=messages)
+                # tools are sync functions, keep them off the event loop
+                decision = self._parse_decision(raw_response, schema)
+                finished = await asyncio.to_thread(self._handle_decision, decision, raw_response, turn)
+                if finished is not None:
+                    return finished
 
-            try:
-                start = raw_response.find("{")
-                end = raw_response.find("}")
-                if start != -1 and end != -1:
-                    json_str = raw_response[start:end+1]
-                    decision = json.loads(json_str)
-                else:
-                    decision = {"action": "finish", "answer": "I couldn't process that request."}
+        return self._give_up(turn.observations)
 
-            except:
-                decision = {"action": "finish", "answer": "I encountered an error processing your request."}
+    def _schema_for(self, turn: ReactTurn, iteration: int):
+        """ Format for the next decision, or None if there is no time left to ask """
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired():
+            self._count("out_of_time")
+            return None
+        if turn.must_finish or iteration == self.max_iter - 1 or turn.tokens >= self.token_budget:
+            self._count("forced_finish")
+            return FINISH_SCHEMA
+        return decision_schema()
 
-            print(f"[DEBUG] Decision: {decision}")
+    def _parse_decision(self, raw_response: str, schema: dict = None) -> dict:
+        self._count("llm_calls")
+        try:
+            decision = json.loads(raw_response)
+            errors = schema_errors(decision, schema if schema is not None else decision_schema())
+            if errors:
+                self._count("validation_failures")
+                decision = self._fallback("I couldn't process that request.")
+        except json.JSONDecodeError:
+            self._count("parse_failures")
+            decision = self._fallback("I encountered an error processing your request.")
 
+        print(f"[DEBUG] Decision: {decision}")
+        return decision
 
-            # Handle decision
-            if decision.get("action" == "use_tool"):
-                tool_name = decision.get("tool")
-                args = decision.get("args", {})
+    def _fallback(self, answer: str) -> dict:
+        self._count("fallbacks")
+        return {"action": "finish", "answer": answer}
 
-            # execute tool
-                if tool_name in TOOL_MAP:
-                    try:
-                        result = TOOL_MAP[tool_name](**args)
-                        observations.append(f"Tool {tool_name} returned {result}")
-                    except Exception as e:
-                        observations.append(f"Tool {tool_name} failed: {str(e)}")
-                
-                else:
-                    observations.append(f"Unknown tool: {tool_name}")
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
 
+    def stats(self) -> dict:
+        """ Turns, LLM decision calls (llm_calls / turns = calls per turn), tool calls and early stops """
+        with self._stats_lock:
+            return dict(self._stats)
 
-            elif decision.get("action") == "finish":
-                return {"action": "finish", "answer": decision.get("answer", "No answer provided")}
+    def _handle_decision(self, decision: dict, raw_response: str, turn: ReactTurn) -> dict | None:
+        """ Run the decided tools (appending to the turn) or return the finish dict """
+        action = decision.get("action")
+        if action == "finish":
+            return {"action": "finish", "answer": decision.get("answer", "No answer provided")}
 
+        if action == "use_tool":
+            calls = [{"tool": decision.get("tool"), "args": decision.get("args") or {}}]
+        elif action == "use_tools":
+            calls = [{"tool": step.get("tool"), "args": step.get("args") or {}} for step in decision.get("steps") or []]
+        else:
+            return None
+
+        # the reply verbatim, so the next prompt extends this one exactly
+        turn.append("assistant", raw_response)
+
+        new_calls, repeated = [], []
+        for call in calls:
+            key = step_key(call)
+            if key in turn.seen:
+                repeated.append(call)
+            else:
+                turn.seen.add(key)
+                new_calls.append(call)
+
+        lines = self._run_calls(new_calls)
+        if repeated:
+            self._count("repeats", len(repeated))
+            lines.extend(f"Tool {call['tool']} with {call['args']} was already called, see above." for call in repeated)
+        if not new_calls:
+            # asking again won't produce anything new
+            turn.must_finish = True
+
+        turn.observations.extend(lines)
+        cue = FINISH_CUE if turn.must_finish else NEXT_CUE
+        turn.append("system", "Observations:\n" + "\n".join(lines) + f"\n\n{cue}")
+        return None
+
+    def _run_calls(self, calls: list) -> list:
+        """ Run calls (concurrently when there are several), one observation line each """
+        if not calls:
+            return []
+        self._count("tool_calls", len(calls))
+        if len(calls) == 1:
+            plan = {"action": "use_tool", **calls[0]}
+        else:
+            plan = {"action": "use_tools", "steps": calls}
+        results = self.chain_executor.process(plan)["results"]
+
+        lines = []
+        for call, outcome in zip(calls, results):
+            if "result" in outcome:
+                lines.append(f"Tool {call['tool']} returned {outcome['result']}")
+            else:
+                lines.append(f"Tool {call['tool']} failed: {outcome.get('error')}")
+        return lines
 
+    def _give_up(self, observations: list) -> dict:
         return {
             "action": "finish",
             "answer": f"I gathered information but couldn't form a complete answer. Observations: {observations}"
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,219 @@
+import re
+import math
+import time
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+from .base_node import BaseNode
+from chatbot.tools import registry
+from chatbot.utils.tracing import traced
+
+
+class RouteRule:
+    """
+    Keyword / regex rule mapping a user message to one tool.
+
+    Attr:
+    - tool: tool name from the tool registry
+    - pattern: compiled regex searched in the lowercased message
+    - args_fn: optional callable(message) -> args dict, or None when the
+      required args can't be extracted (rule then doesn't match)
+    """
+
+    def __init__(self, tool: str, pattern: str, args_fn: Callable[[str], Optional[dict]] = None):
+        self.tool = tool
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.args_fn = args_fn
+
+    def match(self, message: str) -> Optional[dict]:
+        """ Returns args dict on match, otherwise None """
+        if not self.pattern.search(message):
+            return None
+        if self.args_fn is None:
+            return {}
+        return self.args_fn(message)
+
+
+def _extract_location(message: str) -> Optional[dict]:
+    match = re.search(r"\b(?:in|for|at)\s+([A-Za-z][A-Za-z .'-]*?)\s*(?:\?|!|\.|,|$|\band\b|\bnow\b|\btoday\b)", message, re.IGNORECASE)
+    if not match:
+        return None
+    return {"location": match.group(1).strip().title()}
+
+
+# whole message is small talk -> no tools
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|good (morning|afternoon|evening)|how are you|bye)"
+    r"[\s,!.?]*(there|friend|bot)?[\s,!.?]*(how are you( doing)?( today)?)?[\s!.?]*$",
+    re.IGNORECASE,
+)
+
+DEFAULT_RULES = [
+    RouteRule("get_time", r"\b(what time|what's the time|current time|time is it|the time now|time right now)\b"),
+    RouteRule("random_number", r"\brandom (number|integer)\b"),
+    RouteRule("fake_weather", r"\b(weather|forecast|temperature)\b", _extract_location),
+]
+
+DEFAULT_EXAMPLES = {
+    "answer_direct": ["hi how are you", "hello there", "thanks a lot", "who are you", "tell me a joke"],
+    "get_time": ["what time is it", "tell me the current time", "what is the time now", "do you know the time"],
+    "random_number": ["give me a random number", "pick a number between 1 and 100", "roll a random number for me"],
+    "fake_weather": ["what is the weather in tokyo", "how is the weather in paris", "weather forecast for london"],
+}
+
+
+def trigram_embedding(text: str) -> Counter:
+    """ Cheap local embedding: character trigram counts of the normalized text """
+    text = f"  {re.sub(r'[^a-z0-9 ]', '', text.lower()).strip()}  "
+    return Counter(text[i:i+3] for i in range(len(text) - 2))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class SimilarityIndex:
+    """
+    Nearest-example lookup over example utterances per tool.
+
+    embed_fn is pluggable (any callable returning a Counter-like sparse
+    vector); the default character trigram embedding needs no model.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]] = None, embed_fn: Callable = trigram_embedding):
+        self.embed_fn = embed_fn
+        self._entries = []
+
+        for label, utterances in (examples or DEFAULT_EXAMPLES).items():
+            # only index tools the planner actually knows about
+            if label != "answer_direct" and label not in registry:
+                continue
+            for utterance in utterances:
+                self._entries.append((label, self.embed_fn(utterance)))
+
+    def best_match(self, message: str):
+        """ Returns (label, score) of the closest example, or (None, 0.0) """
+        query = self.embed_fn(message)
+        best_label, best_score = None, 0.0
+        for label, vector in self._entries:
+            score = _cosine(query, vector)
+            if score > best_score:
+                best_label, best_score = label, score
+        return best_label, best_score
+
+
+class RouterNode(BaseNode):
+    """
+    Fast-path pre-router in front of PlannerNode.
+
+    Tries, in order:
+    1. greeting regex -> {"action": "answer_direct"}
+    2. keyword/regex rules -> use_tool / use_tools
+    3. optional similarity index over example utterances (score >= threshold)
+
+    Returns a plan dict when confident, otherwise None so the caller falls
+    through to the LLM planner. Tracks hit rate and estimated latency saved
+    (hits x average LLM planner latency reported by the planner).
+    """
+
+    def __init__(self, rules: List[RouteRule] = None, similarity_index: SimilarityIndex = None, threshold: float = 0.75, guess_threshold: float = 0.5):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.similarity_index = similarity_index
+        self.threshold = threshold
+        self.guess_threshold = guess_threshold      # lower bar for guess(): a wrong guess only costs a discarded call
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "rule_hits": 0,
+            "similarity_hits": 0,
+            "planner_calls": 0,
+            "planner_latency_s": 0.0,
+        }
+
+    @traced("node.router")
+    def process(self, user_message: str, *args, **kwargs) -> Optional[dict]:
+        plan, source = self._route(user_message)
+
+        with self._lock:
+            if plan is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+                self._stats[f"{source}_hits"] += 1
+        return plan
+
+    def _route(self, user_message: str):
+        if GREETING_PATTERN.match(user_message):
+            return {"action": "answer_direct", "tool": None, "args": {}}, "rule"
+
+        # collect every rule that fires, in rule order
+        steps = []
+        for rule in self.rules:
+            if rule.tool not in registry or not rule.pattern.search(user_message):
+                continue
+            args = rule.match(user_message)
+            if args is None:
+                # tool recognised but args missing -> let the LLM planner handle it
+                return None, None
+            steps.append({"tool": rule.tool, "args": args})
+
+        if len(steps) == 1:
+            return {"action": "use_tool", **steps[0]}, "rule"
+        if steps:
+            return {"action": "use_tools", "steps": steps}, "rule"
+
+        if self.similarity_index is not None:
+            label, score = self.similarity_index.best_match(user_message)
+            if label is not None and score >= self.threshold:
+                if label == "answer_direct":
+                    return {"action": "answer_direct", "tool": None, "args": {}}, "similarity"
+                rule_args = self._similar_args(label, user_message)
+                if rule_args is not None:
+                    return {"action": "use_tool", "tool": label, "args": rule_args}, "similarity"
+
+        return None, None
+
+    def _similar_args(self, label: str, user_message: str) -> Optional[dict]:
+        """ Args for a similarity match: the rule's extractor only (its keyword pattern already missed) """
+        args_fn = next((r.args_fn for r in self.rules if r.tool == label and r.args_fn), None)
+        return {} if args_fn is None else args_fn(user_message)
+
+    def guess(self, user_message: str) -> List[dict]:
+        """
+        Likely tool steps for speculative prefetch, also when not confident
+        enough to skip the planner. Doesn't touch the hit/miss stats.
+        """
+        plan, _ = self._route(user_message)
+        if plan is None and self.similarity_index is not None:
+            label, score = self.similarity_index.best_match(user_message)
+            if label not in (None, "answer_direct") and score >= self.guess_threshold:
+                args = self._similar_args(label, user_message)
+                if args is not None:
+                    plan = {"action": "use_tool", "tool": label, "args": args}
+
+        if plan is None or plan["action"] == "answer_direct":
+            return []
+        if plan["action"] == "use_tool":
+            return [{"tool": plan["tool"], "args": plan["args"]}]
+        return plan["steps"]
+
+    def record_planner_latency(self, seconds: float):
+        """ Called by PlannerNode after each LLM planning call """
+        with self._lock:
+            self._stats["planner_calls"] += 1
+            self._stats["planner_latency_s"] += seconds
+
+    def stats(self) -> dict:
+        """ Hit rate and estimated latency saved by skipping the LLM planner """
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["hits"] + stats["misses"]
+        avg_planner = stats["planner_latency_s"] / stats["planner_calls"] if stats["planner_calls"] else 0.0
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        stats["avg_planner_latency_s"] = avg_planner
+        stats["latency_saved_s"] = stats["hits"] * avg_planner
+        return stats
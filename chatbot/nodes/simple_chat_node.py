@@ -1,5 +1,7 @@
 from .base_node import BaseNode
-from chatbot.utils.call_llm import call_llm
+from chatbot.utils.call_llm import call_llm, acall_llm
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient, get_default_client
+from chatbot.utils.tracing import traced
 
 class SimpleChatNode(BaseNode):
     """
@@ -9,6 +11,11 @@ class SimpleChatNode(BaseNode):
     - sends to call_llm
     - returns LLM response as output string
     """
+    def __init__(self, client: LLMClient = None, async_client: AsyncLLMClient = None):
+        self.client = client or get_default_client()       # shared pooled LLM client
+        self.async_client = async_client                   # None -> per-loop default in aprocess
+
+    @traced("node.simple_chat")
     def process(self, user_message: str) -> str:
         """
         Process the user message by calling the LLM and returning its response.
@@ -16,7 +23,17 @@ class SimpleChatNode(BaseNode):
         Args:
             user_message (str): The message from the user.
         """
+        # call llm utility function
+        reply = call_llm(self._build_prompt(user_message), client=self.client)
+
+        return reply.strip()
+
+    @traced("node.simple_chat")
+    async def aprocess(self, user_message: str) -> str:
+        reply = await acall_llm(self._build_prompt(user_message), client=self.async_client)
+        return reply.strip()
 
+    def _build_prompt(self, user_message: str) -> str:
         # simple system instructions
         system_instructions = (
             "You are a helpful AI assistant designed to assist users with their questions and provide information."
@@ -30,8 +47,4 @@ class SimpleChatNode(BaseNode):
             f"Assistant:   "
         )
 
-
-        # call llm utility function
-        reply = call_llm(full_prompt)
-
-        return reply.strip()
\ No newline at end of file
+        return full_prompt
\ No newline at end of file
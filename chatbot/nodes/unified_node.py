@@ -0,0 +1,183 @@
+from typing import Callable
+from .base_node import BaseNode
+from .planner_node import parse_plan
+from .answer_node import AnswerNode
+from .chain_executor_node import ChainExecutorNode
+from chatbot.utils.call_llm import call_llm_stream, acall_llm_stream
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient, get_default_client
+from chatbot.utils.node_config import get_node_config
+from chatbot.utils.plan_stream import PlanStreamParser
+from chatbot.utils.prompt_builder import PromptLayout
+from chatbot.utils.tracing import traced
+from chatbot.tools import registry
+
+def build_unified_prompt(tool_block: str) -> str:
+    return (
+        "You are a helpful assistant for a simple chatbot.\n"
+        "You can use these tools:\n"
+        + tool_block
+        + "\n"
+        "\n"
+        "If you can answer without tools, just answer the user directly in plain text.\n"
+        "Be concise and friendly.\n"
+        "\n"
+        "If you NEED a tool, reply with ONLY a JSON object and nothing else:\n"
+        '{"action": "use_tool", "tool": "get_time", "args": {}}\n'
+        "or for several tools:\n"
+        '{"action": "use_tools", "steps": [\n'
+        '  {"tool": "fake_weather", "args": {"location": "Tokyo"}},\n'
+        '  {"tool": "get_time", "args": {}}\n'
+        ']}\n'
+        "\n"
+        "Never mix text and JSON in the same reply.\n"
+    )
+
+
+# read at call time: byte-identical between turns, rebuilt when a tool is (un)registered
+def unified_layout() -> PromptLayout:
+    return registry.derived("unified_layout", lambda reg: PromptLayout(build_unified_prompt(reg.prompt_block())))
+
+
+class _StreamSniffer:
+    """
+    Decides from the first visible characters of a stream whether the model
+    is answering in plain text or emitting a JSON tool request.
+
+    mode: None (undecided yet), "answer" or "tool"
+    complete: in tool mode, True once the JSON object has closed (the rest
+    of the stream can be dropped); plan_text() is the request up to there
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.buffer = ""
+        self._parser = None
+
+    def feed(self, chunk: str) -> str:
+        """ Returns text that can be shown to the user right now """
+        if self.mode == "answer":
+            return chunk
+
+        if self.mode == "tool":
+            self._parser.feed(chunk)
+            return ""
+
+        self.buffer += chunk
+        head = self.buffer.lstrip()
+        if not head:
+            return ""
+
+        # JSON object or a ```json fence -> tool request, keep buffering
+        if head[0] in "{`":
+            self.mode = "tool"
+            self._parser = PlanStreamParser()
+            self._parser.feed(self.buffer)
+            return ""
+
+        self.mode = "answer"
+        return head
+
+    @property
+    def complete(self) -> bool:
+        return self._parser is not None and self._parser.end is not None
+
+    def plan_text(self) -> str:
+        raw = self._parser.raw
+        return raw[:self._parser.end] if self.complete else raw
+
+
+class UnifiedNode(BaseNode):
+    """
+    Fused planner + answerer (one streamed LLM call for tool-less turns).
+
+    The model is asked to either answer right away in plain text, or reply
+    with nothing but a planner-style JSON object when it needs tools. The
+    first visible characters of the stream decide which:
+    - plain text: chunks are passed straight through to the user
+    - JSON: the plan is collected, run through ChainExecutorNode and the
+      final answer comes from AnswerNode (second call only in this case)
+
+    In tool mode the stream is dropped as soon as the JSON object closes.
+
+    Output:
+    - generator of answer chunks (str); pass on_plan to also get the plan
+      used for the turn (answer_direct when the model answered in text)
+    """
+
+    def __init__(
+            self,
+            client: LLMClient = None,
+            async_client: AsyncLLMClient = None,
+            chain_executor: ChainExecutorNode = None,
+            answerer: AnswerNode = None,
+    ):
+        self.client = client or get_default_client()       # shared pooled LLM client
+        self.async_client = async_client                   # None -> per-loop default in aprocess
+        self.chain_executor = chain_executor or ChainExecutorNode()
+        self.answerer = answerer or AnswerNode(client=self.client, async_client=async_client)
+        self.config = get_node_config("unified")           # keep_alive / num_ctx
+
+    @traced("node.unified")
+    def process(self, user_message: str, conversation_history: list, on_plan: Callable[[dict], None] = None):
+        messages = self._build_messages(user_message, conversation_history)
+        sniffer = _StreamSniffer()
+
+        stream = call_llm_stream(messages=messages, client=self.client, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority)
+        try:
+            for chunk in stream:
+                visible = sniffer.feed(chunk)
+                if visible:
+                    yield visible
+                if sniffer.complete:
+                    break
+        finally:
+            stream.close()
+
+        plan = self._plan(sniffer, on_plan)
+        if sniffer.mode == "tool":
+            tool_output = None
+            if plan.get("action") in ["use_tool", "use_tools"]:
+                tool_output = self.chain_executor.process(plan)
+
+            for chunk in self.answerer.process(user_message, tool_output, conversation_history):
+                yield chunk
+
+    @traced("node.unified")
+    async def aprocess(self, user_message: str, conversation_history: list, on_plan: Callable[[dict], None] = None):
+        """ Async generator twin of process() """
+        messages = self._build_messages(user_message, conversation_history)
+        sniffer = _StreamSniffer()
+
+        stream = acall_llm_stream(messages=messages, client=self.async_client, options=self.config.options, keep_alive=self.config.keep_alive, model=self.config.model, priority=self.config.priority)
+        try:
+            async for chunk in stream:
+                visible = sniffer.feed(chunk)
+                if visible:
+                    yield visible
+                if sniffer.complete:
+                    break
+        finally:
+            await stream.aclose()
+
+        plan = self._plan(sniffer, on_plan)
+        if sniffer.mode == "tool":
+            tool_output = None
+            if plan.get("action") in ["use_tool", "use_tools"]:
+                tool_output = await self.chain_executor.aprocess(plan)
+
+            async for chunk in self.answerer.aprocess(user_message, tool_output, conversation_history):
+                yield chunk
+
+    @staticmethod
+    def _plan(sniffer: _StreamSniffer, on_plan: Callable[[dict], None] = None) -> dict:
+        # per call, never on the node: one UnifiedNode serves every session
+        if sniffer.mode == "tool":
+            plan = parse_plan(sniffer.plan_text())
+        else:
+            plan = {"action": "answer_direct", "tool": None, "args": {}}
+        if on_plan is not None:
+            on_plan(plan)
+        return plan
+
+    def _build_messages(self, user_message: str, conversation_history: list) -> list:
+        return unified_layout().build(user_message, conversation_history)
@@ -0,0 +1,201 @@
+import asyncio
+
+from chatbot.nodes.planner_node import PlannerNode
+from chatbot.nodes.answer_node import AnswerNode
+from chatbot.nodes.chain_executor_node import ChainExecutorNode
+from chatbot.nodes.unified_node import UnifiedNode
+from chatbot.utils.memory import ConversationMemory
+from chatbot.utils.tracing import traced
+from chatbot.utils.resilience import deadline_scope
+from chatbot.utils.backend_pool import session_scope
+
+
+class ChatPipeline:
+    """
+    planner -> tools -> answer pipeline for a single turn.
+
+    run_turn() is the blocking version used by the CLI.
+    arun_turn() is the async version: every LLM call awaits Ollama on the
+    event loop and tools run in worker threads, so many conversations can
+    share one loop.
+
+    Both yield answer chunks (str). The caller owns conversation_history and
+    is expected to have appended the current user message already. It can be
+    a plain list of messages or a ConversationMemory, in which case each node
+    gets its own token-budgeted window.
+
+    With unified=True (or a UnifiedNode instance) the turn goes through
+    UnifiedNode instead, which plans and answers in a single streamed call
+    unless tools are needed.
+
+    turn_timeout (seconds) is one deadline shared by every LLM and tool
+    call of a turn, retries included (None = no deadline). session_id keeps
+    a conversation on the Ollama backend that holds its KV cache.
+
+    With stream_plan=True the planner streams its plan and each step starts
+    running as soon as it is parsed (plus the planner's speculative guesses,
+    if it has a speculator), hiding tool latency behind plan decoding.
+
+    answer_budget (seconds) turns on progressive answering: tools run in
+    the background and the answer starts as soon as the first result is
+    in, or once the budget ran out if none is. Steps still running are
+    shown to the answer model as pending; when they finish, a follow-up
+    continuation adds what they returned.
+    """
+
+    def __init__(self, planner: PlannerNode = None, chain_executor: ChainExecutorNode = None, answerer: AnswerNode = None, debug: bool = False, unified: bool | UnifiedNode = False, turn_timeout: float = 120.0, stream_plan: bool = False, answer_budget: float = None):
+        self.planner = planner or PlannerNode()
+        self.chain_executor = chain_executor or ChainExecutorNode()
+        self.answerer = answerer or AnswerNode()
+        if unified is True:
+            unified = UnifiedNode(
+                client=self.answerer.client,
+                async_client=self.answerer.async_client,
+                chain_executor=self.chain_executor,
+                answerer=self.answerer,
+            )
+        self.unified = unified or None
+        self.debug = debug
+        self.turn_timeout = turn_timeout
+        self.stream_plan = stream_plan
+        self.answer_budget = answer_budget
+
+    @staticmethod
+    def _history_for(conversation_history, consumer: str) -> list:
+        if isinstance(conversation_history, ConversationMemory):
+            return conversation_history.messages_for(consumer)
+        return conversation_history
+
+    def _log(self, *args):
+        if self.debug:
+            print(*args)
+
+    @traced("turn", kind="turn")
+    def run_turn(self, user_message: str, conversation_history: list, session_id: str = None):
+        with deadline_scope(self.turn_timeout), session_scope(session_id):
+            yield from self._run_turn(user_message, conversation_history)
+
+    def _run_turn(self, user_message: str, conversation_history: list):
+        if self.unified is not None:
+            yield from self.unified.process(user_message, self._history_for(conversation_history, "answer"))
+            return
+
+        # Planning phase (streamed: steps start while the plan is still decoding)
+        prefetch = self.chain_executor.prefetcher() if self.stream_plan else None
+        try:
+            if prefetch is not None:
+                plan = self.planner.process_streaming(user_message, self._history_for(conversation_history, "planner"), prefetch)
+            else:
+                plan = self.planner.process(user_message, self._history_for(conversation_history, "planner"))
+            self._log("[debug] Plan:", plan)
+
+            if self._progressive(plan):
+                yield from self._answer_progressively(user_message, plan, prefetch, conversation_history)
+                return
+
+            tool_output = self._run_tools(plan, prefetch)
+        finally:
+            if prefetch is not None:
+                prefetch.discard()
+
+        # Answer generation phase
+        for chunk in self.answerer.process(user_message, tool_output, self._history_for(conversation_history, "answer")):
+            yield chunk
+
+    def _progressive(self, plan: dict) -> bool:
+        return self.answer_budget is not None and plan.get("action") in ["use_tool", "use_tools"]
+
+    def _answer_progressively(self, user_message: str, plan: dict, prefetch, conversation_history):
+        run = self.chain_executor.start(plan, prefetch)
+        run.wait_first(self.answer_budget)
+        tool_output = run.output()
+        self._log("[debug] Execution result:", tool_output)
+
+        history = self._history_for(conversation_history, "answer")
+        answer = []
+        for chunk in self.answerer.process(user_message, tool_output, history):
+            answer.append(chunk)
+            yield chunk
+        if not run.pending(tool_output):
+            return
+
+        # late steps finish (or time out) on their own per-step timeouts
+        run.wait()
+        late = run.late_output(tool_output)
+        if late is None:
+            return
+        self._log("[debug] Late results:", late)
+        yield "\n\n"
+        yield from self.answerer.process_followup(user_message, tool_output, "".join(answer), late, history)
+
+    @traced("turn", kind="turn")
+    async def arun_turn(self, user_message: str, conversation_history: list, session_id: str = None):
+        with deadline_scope(self.turn_timeout), session_scope(session_id):
+            async for chunk in self._arun_turn(user_message, conversation_history):
+                yield chunk
+
+    async def _arun_turn(self, user_message: str, conversation_history: list):
+        if self.unified is not None:
+            async for chunk in self.unified.aprocess(user_message, self._history_for(conversation_history, "answer")):
+                yield chunk
+            return
+
+        prefetch = self.chain_executor.prefetcher() if self.stream_plan else None
+        try:
+            if prefetch is not None:
+                plan = await self.planner.aprocess_streaming(user_message, self._history_for(conversation_history, "planner"), prefetch)
+            else:
+                plan = await self.planner.aprocess(user_message, self._history_for(conversation_history, "planner"))
+            self._log("[debug] Plan:", plan)
+
+            if self._progressive(plan):
+                async for chunk in self._aanswer_progressively(user_message, plan, prefetch, conversation_history):
+                    yield chunk
+                return
+
+            tool_output = None
+            if plan.get("action") in ["use_tool", "use_tools"]:
+                tool_output = await self.chain_executor.aprocess(plan, prefetch)
+                self._log("[debug] Execution result:", tool_output)
+        finally:
+            if prefetch is not None:
+                prefetch.discard()
+
+        async for chunk in self.answerer.aprocess(user_message, tool_output, self._history_for(conversation_history, "answer")):
+            yield chunk
+
+    async def _aanswer_progressively(self, user_message: str, plan: dict, prefetch, conversation_history):
+        run = self.chain_executor.start(plan, prefetch)
+        await asyncio.to_thread(run.wait_first, self.answer_budget)
+        tool_output = run.output()
+        self._log("[debug] Execution result:", tool_output)
+
+        history = self._history_for(conversation_history, "answer")
+        answer = []
+        async for chunk in self.answerer.aprocess(user_message, tool_output, history):
+            answer.append(chunk)
+            yield chunk
+        if not run.pending(tool_output):
+            return
+
+        await asyncio.to_thread(run.wait)
+        late = run.late_output(tool_output)
+        if late is None:
+            return
+        self._log("[debug] Late results:", late)
+        yield "\n\n"
+        async for chunk in self.answerer.aprocess_followup(user_message, tool_output, "".join(answer), late, history):
+            yield chunk
+
+    def _run_tools(self, plan: dict, prefetch=None):
+        # Tool execution phase
+        if plan.get("action") in ["use_tool", "use_tools"]:
+            # Use ChainExecutorNode for both single and multi-tool execution
+            execution_result = self.chain_executor.process(plan, prefetch)
+            self._log("[debug] Execution result:", execution_result)
+            return execution_result
+        elif plan.get("action") == "answer_direct":
+            self._log("[debug] No tools used, proceeding to answer generation.")
+        else:
+            self._log(f"[debug] Unknown action: {plan.get('action')}")
+        return None
@@ -0,0 +1,403 @@
+"""
+Async HTTP server for the planner -> tools -> answer pipeline.
+
+    python -m chatbot.routes.rest_routes --port 8080
+
+Routes:
+- POST   /sessions                      -> 201 {"session_id"}
+- GET    /sessions/{session_id}         -> {"session_id", "summary", "messages", "active_turns"}
+- DELETE /sessions/{session_id}         -> 204
+- POST   /sessions/{session_id}/messages  body {"message": "...", "stream": true}
+    stream=true (default): text/event-stream with
+        event: chunk  data: {"text": "..."}       (one per answer chunk)
+        event: done   data: {"reply": "...", "elapsed_s": ...}
+        event: error  data: {"error": "..."}
+      and ": ping" comments while the planner / tools are still working
+    stream=false: 200 {"reply": "...", "elapsed_s": ...}
+- GET    /health                        -> {"status": "ok" | "draining", ...}
+
+A session is created on its first message if the id is new, so clients may
+pick their own ids. Sessions live in a SessionStore: idle ones are evicted
+from memory and, with --session-db, resumed from disk on their next request.
+Everything runs on one event loop (ChatPipeline.arun_turn, aiohttp to
+Ollama, tools in worker threads), so idle and streaming connections cost a
+socket and a coroutine, not a thread.
+
+Each session runs at most `max_turns_per_session` turns at once (default 1:
+turns of one conversation must see each other's history); extra requests
+get 429. On shutdown the server stops accepting, answers new requests with
+503 and lets running turns finish for up to `drain_timeout` seconds before
+cancelling them.
+"""
+import re
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from aiohttp import web
+
+from chatbot.pipeline import ChatPipeline
+from chatbot.nodes.planner_node import PlannerNode
+from chatbot.nodes.answer_node import AnswerNode
+from chatbot.nodes.router_node import RouterNode, SimilarityIndex
+from chatbot.nodes.chain_executor_node import ChainExecutorNode, DEFAULT_STEP_TIMEOUT
+from chatbot.utils.session_store import Session, SessionStore, SqliteSessionBackend
+from chatbot.utils.response_cache import ResponseCache
+from chatbot.utils.ollama_errors import format_ollama_error
+from chatbot.utils.llm_client import close_default_async_client, get_default_async_client, get_default_pool
+from chatbot.utils.scheduler import LLMScheduler
+from chatbot.utils.tracing import configure_tracing
+from chatbot.utils.node_config import load_node_configs
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",         # nginx: don't buffer the stream
+}
+
+_END = object()     # end-of-turn marker on a turn's chunk queue
+
+
+class ServerDraining(Exception):
+    """ Turn cancelled because the server is shutting down """
+
+
+class ChatServer:
+    """
+    aiohttp application around a ChatPipeline.
+
+    Attr:
+    - pipeline: ChatPipeline shared by every session
+    - max_turns_per_session: concurrent turns allowed per session
+    - drain_timeout: seconds running turns get to finish on shutdown
+    - heartbeat: seconds between SSE keep-alive comments while a turn is quiet
+    - sessions: SessionStore holding every conversation
+    """
+
+    def __init__(
+            self,
+            pipeline: ChatPipeline = None,
+            max_turns_per_session: int = 1,
+            drain_timeout: float = 30.0,
+            heartbeat: float = 15.0,
+            sessions: SessionStore = None,
+    ):
+        self.pipeline = pipeline or ChatPipeline()
+        self.max_turns_per_session = max_turns_per_session
+        self.drain_timeout = drain_timeout
+        self.heartbeat = heartbeat
+        self.sessions = sessions if sessions is not None else SessionStore()
+
+        self.draining = False
+        self._turns = set()             # running turn tasks
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._sweeper = None
+        self._stats = {"turns": 0, "completed": 0, "failed": 0, "rejected_busy": 0, "rejected_draining": 0, "disconnects": 0}
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/health", self.health),
+            web.post("/sessions", self.create_session),
+            web.get("/sessions/{session_id}", self.get_session),
+            web.delete("/sessions/{session_id}", self.delete_session),
+            web.post("/sessions/{session_id}/messages", self.post_message),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    # ---- handlers ----
+
+    async def health(self, request: web.Request) -> web.Response:
+        health = {
+            "status": "draining" if self.draining else "ok",
+            "sessions": self.sessions.stats(),
+            "active_turns": len(self._turns),
+            "llm": (self.pipeline.answerer.async_client or get_default_async_client()).pool.stats(),
+            **self._stats,
+        }
+        response_cache = getattr(self.pipeline.answerer, "response_cache", None)
+        if response_cache is not None:
+            health["response_cache"] = response_cache.stats()
+        return web.json_response(health)
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        if self.draining:
+            raise self._draining_error()
+        session = self.sessions.get(uuid.uuid4().hex)
+        return web.json_response({"session_id": session.session_id}, status=201)
+
+    async def get_session(self, request: web.Request) -> web.Response:
+        session = self._lookup(request)
+        return web.json_response({
+            "session_id": session.session_id,
+            "summary": session.memory.summary,
+            "messages": session.memory.messages_for("default"),
+            "active_turns": session.active_turns,
+        })
+
+    async def delete_session(self, request: web.Request) -> web.Response:
+        session = self._lookup(request)
+        if session.active_turns:
+            raise web.HTTPConflict(text=json.dumps({"error": "session has a turn in progress"}), content_type="application/json")
+        self.sessions.delete(session.session_id)
+        return web.Response(status=204)
+
+    async def post_message(self, request: web.Request) -> web.StreamResponse:
+        if self.draining:
+            self._stats["rejected_draining"] += 1
+            raise self._draining_error()
+
+        session_id = request.match_info["session_id"]
+        if not SESSION_ID_RE.match(session_id):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "invalid session id"}), content_type="application/json")
+
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "body must be JSON"}), content_type="application/json")
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            raise web.HTTPBadRequest(text=json.dumps({"error": "'message' (non-empty string) is required"}), content_type="application/json")
+
+        session = self.sessions.get(session_id)
+        if session.active_turns >= self.max_turns_per_session:
+            self._stats["rejected_busy"] += 1
+            raise web.HTTPTooManyRequests(
+                text=json.dumps({"error": "this session already has a turn in progress"}),
+                content_type="application/json",
+                headers={"Retry-After": "1"},
+            )
+
+        if body.get("stream", True):
+            return await self._stream_turn(request, session, message.strip())
+        return await self._json_turn(session, message.strip())
+
+    # ---- turns ----
+
+    async def _stream_turn(self, request: web.Request, session: Session, message: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers=SSE_HEADERS)
+        started = time.perf_counter()
+        queue, task = self._start_turn(session, message)
+        reply = []
+        try:
+            await response.prepare(request)
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    await response.write(b": ping\n\n")        # keeps proxies from closing a quiet stream
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    await response.write(_sse("error", {"error": _error_text(item)}))
+                    return response
+                reply.append(item)
+                await response.write(_sse("chunk", {"text": item}))
+
+            await response.write(_sse("done", {"reply": "".join(reply), "elapsed_s": round(time.perf_counter() - started, 4)}))
+            await response.write_eof()
+        except ConnectionResetError:
+            # client went away: stop the turn so it doesn't hold an Ollama slot
+            self._stats["disconnects"] += 1
+            task.cancel()
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        return response
+
+    async def _json_turn(self, session: Session, message: str) -> web.Response:
+        started = time.perf_counter()
+        queue, task = self._start_turn(session, message)
+        reply = []
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                return web.json_response({"error": _error_text(item)}, status=503 if isinstance(item, ServerDraining) else 502)
+            reply.append(item)
+        return web.json_response({"reply": "".join(reply), "elapsed_s": round(time.perf_counter() - started, 4)})
+
+    def _start_turn(self, session: Session, message: str):
+        """
+        Run one turn in its own task, feeding chunks into a queue.
+
+        The whole turn (and so its deadline / session / tracing contextvars)
+        lives in a single task; the handler only reads the queue, which lets
+        it send heartbeats without touching the pipeline generator.
+
+        Returns:
+            (queue, task): queue yields str chunks, then an exception or _END
+        """
+        queue = asyncio.Queue()
+        session.active_turns += 1
+        session.last_used = time.monotonic()
+        session.memory.add("user", message)
+        self._stats["turns"] += 1
+
+        async def run():
+            reply = []
+            turn = self.pipeline.arun_turn(message, session.memory, session_id=session.session_id)
+            try:
+                async for chunk in turn:
+                    reply.append(chunk)
+                    queue.put_nowait(chunk)
+                self._stats["completed"] += 1
+                queue.put_nowait(_END)
+            except asyncio.CancelledError:
+                queue.put_nowait(ServerDraining("turn cancelled") if self.draining else _END)
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                queue.put_nowait(e)
+            finally:
+                await turn.aclose()
+                # keep whatever the user already saw so the next turn has context
+                if reply:
+                    session.memory.add("assistant", "".join(reply))
+                session.active_turns -= 1
+                session.last_used = time.monotonic()
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._turns.add(task)
+        self._idle.clear()
+        task.add_done_callback(self._turn_done)
+        return queue, task
+
+    def _turn_done(self, task: asyncio.Task):
+        self._turns.discard(task)
+        if not self._turns:
+            self._idle.set()
+
+    # ---- sessions ----
+
+    def _lookup(self, request: web.Request) -> Session:
+        session = self.sessions.get(request.match_info["session_id"], create=False)
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown session"}), content_type="application/json")
+        return session
+
+    @staticmethod
+    def _draining_error() -> web.HTTPServiceUnavailable:
+        return web.HTTPServiceUnavailable(
+            text=json.dumps({"error": "server is shutting down"}),
+            content_type="application/json",
+            headers={"Retry-After": "5", "Connection": "close"},
+        )
+
+    # ---- lifecycle ----
+
+    async def drain(self, timeout: float = None) -> int:
+        """
+        Stop taking turns and wait for running ones.
+
+        Returns:
+            number of turns that had to be cancelled after the timeout
+        """
+        self.draining = True
+        timeout = self.drain_timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return 0
+        except asyncio.TimeoutError:
+            pending = list(self._turns)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return len(pending)
+
+    async def _on_startup(self, app: web.Application):
+        self._sweeper = asyncio.get_running_loop().create_task(self._sweep_idle())
+
+    async def _sweep_idle(self):
+        # new sessions already evict old ones, this covers quiet periods
+        while True:
+            await asyncio.sleep(60)
+            self.sessions.evict_idle()
+
+    async def _on_shutdown(self, app: web.Application):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        cancelled = await self.drain()
+        if cancelled:
+            print(f"[server] drain timeout, cancelled {cancelled} turn(s)")
+
+    async def _on_cleanup(self, app: web.Application):
+        await close_default_async_client()
+
+
+def _sse(event: str, data: dict) -> bytes:
+    # json keeps newlines inside chunks from breaking the event framing
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def _error_text(exc: BaseException) -> str:
+    if isinstance(exc, ServerDraining):
+        return "The server is restarting, please retry."
+    return format_ollama_error(exc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama Chatbot HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unified", action="store_true", help="plan and answer in one streamed LLM call")
+    parser.add_argument("--stream-plan", action="store_true", help="start tools while the plan is still streaming")
+    parser.add_argument("--prefetch", action="store_true", help="also prefetch side-effect-free tools guessed from the message (implies --stream-plan)")
+    parser.add_argument("--turn-timeout", type=float, default=120.0, help="seconds budget per turn shared by all LLM/tool calls")
+    parser.add_argument("--answer-budget", type=float, default=None, help="answer as soon as the first tool result is in, waiting at most this many seconds for it (late results follow)")
+    parser.add_argument("--step-timeout", type=float, default=DEFAULT_STEP_TIMEOUT, help="seconds a tool call may run unless the tool sets its own timeout")
+    parser.add_argument("--max-turns-per-session", type=int, default=1, help="concurrent turns per session before 429")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="seconds running turns get to finish on shutdown")
+    parser.add_argument("--session-db", default=None, help="sqlite file so conversations survive restarts")
+    parser.add_argument("--idle-ttl", type=float, default=1800.0, help="seconds before an idle session is evicted from memory")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="LLM requests in flight per Ollama backend, the rest queue by priority / session (default: no limit)")
+    parser.add_argument("--llm-max-wait", type=float, default=10.0, help="seconds an LLM request may queue before it gets a busy answer (with --llm-concurrency)")
+    parser.add_argument("--response-cache", action="store_true", help="cache answers to tool-free first questions (greetings, FAQs) and share identical in-flight ones")
+    parser.add_argument("--response-cache-similarity", type=float, default=None, help="also reuse answers for near-duplicate questions above this shingle similarity, e.g. 0.9 (implies --response-cache)")
+    parser.add_argument("--node-config", default=None, help="JSON file mapping nodes to models/options (see node_config.py)")
+    parser.add_argument("--trace", default=None, help="trace exporters, e.g. ring,jsonl=traces.jsonl,prometheus=9464 (default: $CHATBOT_TRACE)")
+    args = parser.parse_args()
+
+    configure_tracing(args.trace)
+    if args.node_config:
+        load_node_configs(args.node_config)
+    if args.llm_concurrency:
+        get_default_pool().scheduler = LLMScheduler(args.llm_concurrency, max_wait=args.llm_max_wait)
+
+    response_cache = None
+    if args.response_cache or args.response_cache_similarity is not None:
+        response_cache = ResponseCache(similarity=args.response_cache_similarity)
+
+    server = ChatServer(
+        pipeline=ChatPipeline(
+            planner=PlannerNode(speculator=RouterNode(similarity_index=SimilarityIndex()) if args.prefetch else None),
+            chain_executor=ChainExecutorNode(step_timeout=args.step_timeout),
+            answerer=AnswerNode(response_cache=response_cache),
+            unified=args.unified,
+            turn_timeout=args.turn_timeout,
+            stream_plan=args.stream_plan or args.prefetch,
+            answer_budget=args.answer_budget,
+        ),
+        max_turns_per_session=args.max_turns_per_session,
+        drain_timeout=args.drain_timeout,
+        sessions=SessionStore(
+            backend=SqliteSessionBackend(args.session_db) if args.session_db else None,
+            idle_ttl=args.idle_ttl,
+        ),
+    )
+    # on_shutdown already waited drain_timeout, aiohttp only has to close sockets
+    web.run_app(server.make_app(), host=args.host, port=args.port, shutdown_timeout=5.0)
+
+
+if __name__ == "__main__":
+    main()
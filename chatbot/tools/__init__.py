@@ -0,0 +1,2 @@
+from .tool_executor import Tool, ToolRegistry, registry, tool
+from . import simple_tools      # registers the built-in tools
@@ -0,0 +1,18 @@
+import time
+from functools import wraps
+from typing import Callable
+
+
+def with_latency(func: Callable, seconds: float) -> Callable:
+    """
+    Wrap a tool so every call takes `seconds` longer.
+
+    Used by benchmarks to stand in for network-backed tools (weather APIs,
+    lookups) without changing what the tool returns.
+    """
+    @wraps(func)
+    def slow_tool(*args, **kwargs):
+        time.sleep(seconds)
+        return func(*args, **kwargs)
+
+    return slow_tool
@@ -1,12 +1,18 @@
 import random
 from datetime import datetime
+from chatbot.tools.tool_executor import tool
 
+# read-only tools are marked side_effect_free so the planner may prefetch them speculatively
+@tool("Returns the current system time.", side_effect_free=True)
 def get_time():
     return {"time": datetime.now().astimezone().isoformat()}
 
+@tool("Returns a random integer between 1 and 100.", side_effect_free=True)
 def random_number():
     return {"number": random.randint(1, 100)}
 
+# same location -> same report for 10 minutes; get_time / random_number must never be cached
+@tool("Returns a fake weather report for a given location.", cache_ttl=600, cache_key_fn=lambda args: str(args.get("location", "")).strip().lower(), side_effect_free=True)
 def fake_weather(location: str):
     return {
         "location": location,
@@ -15,6 +21,7 @@ def fake_weather(location: str):
     }
 
 
+@tool("A tool that always fails to demonstrate error handling.")
 def failing_tool():
     """ A tool that always fails to demonstrate error handling """
     raise ValueError("Simulated tool failure.")
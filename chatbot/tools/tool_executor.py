@@ -1,27 +1,82 @@
 import inspect
+import threading
 from typing import Callable, Any, Dict, List
-from functools import wraps
 from chatbot.utils.error_handler import RetryConfig, logger, retry_with_backoff
+from chatbot.utils.tracing import tracer
+from chatbot.utils.tool_cache import ToolResultCache
+
+# python annotation -> (JSON schema type, isinstance check)
+_TYPE_MAP = {
+    str: ("string", str),
+    int: ("integer", int),
+    float: ("number", (int, float)),
+    bool: ("boolean", bool),
+    dict: ("object", dict),
+    list: ("array", list),
+}
+
+# transient failures worth retrying, anything else fails on the first attempt
+DEFAULT_RETRY = RetryConfig(
+    max_attempts=3,
+    initial_delay=0.5,
+    backoff_multiplier=2.0,
+    retry_exceptions=(ConnectionError, TimeoutError)
+)
 
 
 class Tool:
     """
     Represents a single tool that chatbot can use.
 
+    Signature introspection, the argument validator, the LLM description and
+    the args JSON schema are all computed once here, so execute() only does
+    dict lookups before calling the function.
+
     Attr:
     - name: tool name (str)
     - description: brief description of tool purpose (str)
-    - func: callable function implementing the tool
-    - parameters: dict of parameter names to types (from func signature)
+    - function: callable implementing the tool
+    - parameters: dict of parameter names to {"type", "required"} (from func signature)
+    - retry_config: RetryConfig used by execute()
+    - cache_ttl: seconds results may be reused (None = never cached)
+    - cache_key_fn: args -> cache key str (None = canonical JSON of args)
+    - side_effect_free: safe to run speculatively and throw the result away
+    - timeout: seconds the executor waits for one call (None = executor default)
+    - llm_desc: one-line description for prompts
+    - args_schema: JSON schema of the args object
     """
 
 
-    def __init__(self, name: str, description: str, function: Callable):
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            function: Callable,
+            retry_config: RetryConfig = DEFAULT_RETRY,
+            cache_ttl: float = None,
+            cache_key_fn: Callable[[dict], str] = None,
+            side_effect_free: bool = False,
+            timeout: float = None,
+    ):
         self.name = name
         self.description = description
         self.function = function
+        self.retry_config = retry_config
+        self.cache_ttl = cache_ttl
+        self.cache_key_fn = cache_key_fn
+        self.side_effect_free = side_effect_free
+        self.timeout = timeout
         self.parameters = self._extract_parameters()
 
+        # precompiled validation: (param, python type or None, required)
+        self._checks = [
+            (param_name, _TYPE_MAP.get(info["type"], (None, None))[1], info["required"])
+            for param_name, info in self.parameters.items()
+        ]
+        self._allowed = frozenset(self.parameters)
+        self.llm_desc = self.to_llm_desc()
+        self.args_schema = self._build_args_schema()
+
 
     def _extract_parameters(self) -> Dict[str, Any]:
         """ Extract parameter info fr function sig using introspection"""
@@ -35,76 +90,225 @@ class Tool:
             }
 
         return params
-    
+
+
+    def _build_args_schema(self) -> dict:
+        properties = {}
+        for param_name, info in self.parameters.items():
+            json_type = _TYPE_MAP.get(info["type"], (None, None))[0]
+            properties[param_name] = {"type": json_type} if json_type else {}
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": [name for name, info in self.parameters.items() if info["required"]],
+        }
+
 
     def to_llm_desc(self) -> str:
         """
         Generate a desc for LLM in clear format.
 
         Example output:
-        "get_time: Returns the current time as a string. No parameters."
-        "fake_weather: Returns fake weather for a location. Parameters: location (str)."
+        "Returns the current system time. Parameters: NONE (use empty args: {})"
+        "Returns fake weather for a location. Parameters: location (str, required)"
 
         """
 
         if not self.parameters:
-            return f"{self.name}: {self.description} No parameters."
-        
+            return f"{self.description} Parameters: NONE (use empty args: {{}})"
+
         # build param string
         param_parts = []
-        required_params = []
-
 
         for param_name, param_info in self.parameters.items():
             param_type = param_info["type"].__name__ if hasattr(param_info["type"], "__name__") else str(param_info["type"])
-            param_parts.append(f"{param_name} ({param_type})")
+            required = "required" if param_info["required"] else "optional"
+            param_parts.append(f"{param_name} ({param_type}, {required})")
 
-            if param_info["required"]:
-                required_params.append(param_name)
+        return f"{self.description} Parameters: {', '.join(param_parts)}"
 
-        params_str = ", ".join(param_parts)
-        desc = f"{self.name}({params_str}: {self.description})."
 
-        if required_params:
-            desc += f" Required parameters: {', '.join(required_params)}."
+    def validate(self, args: dict) -> List[str]:
+        """ Returns a list of problems with args (empty list = valid) """
+        errors = [f"Unexpected parameter: {name}" for name in args if name not in self._allowed]
+        for param_name, expected, required in self._checks:
+            if param_name not in args:
+                if required:
+                    errors.append(f"Missing required parameter: {param_name}")
+            elif expected is not None and not isinstance(args[param_name], expected):
+                errors.append(f"Parameter '{param_name}' should be {self.parameters[param_name]['type'].__name__}")
+        return errors
 
-        return desc
-    
 
     def execute(self, **kwargs) -> Any:
         """
         Execute the tool function with provided kwargs and retry on failure.
 
-        Validates required parameters before execution.
-        Automatically retries on temporary failures.
+        Validates parameters before execution.
+        Retries only the exceptions in retry_config (temporary failures).
 
         """
-        # validate required params
-        for param_name, param_info in self.parameters.items():
-            if param_info["required"] and param_name not in kwargs:
-                raise ValueError(f"Missing required parameter: {param_name}")
-            
-        # create retry config
-        config = RetryConfig(
-            max_attempts=3,
-            initial_delay=0.5,
-            backoff_factor=2.0,
-            retry_exceptions=(ConnectionError, TimeoutError)
-        )
+        errors = self.validate(kwargs)
+        if errors:
+            raise ValueError("; ".join(errors))
 
         # execute w retry logic
         try:
             def execute_func():
                 return self.function(**kwargs)
-            
+
             result = retry_with_backoff(
                 execute_func,
-                config=config,
+                config=self.retry_config,
                 tool_name=self.name
             )
             return result
-        
+
         except Exception as e:
             # log error and re-raise with friendly message
-            logger.error(f"Tool '{self.name}' execution failed after all retry attempts: {e}")
-            raise RuntimeError(f"Tool '{self.name}' execution failed: {str(e)}") from e
\ No newline at end of file
+            logger.error(f"Tool '{self.name}' execution failed: {e}")
+            raise RuntimeError(f"Tool '{self.name}' execution failed: {str(e)}") from e
+
+
+class ToolRegistry:
+    """
+    The single table of tools every node dispatches through.
+
+    Register with the decorator:
+
+        @registry.tool("Returns the current system time.")
+        def get_time(): ...
+
+    Prompt blocks, schemas and other views built from the registry are
+    cached via derived() and rebuilt only after a registration changes the
+    catalog.
+
+    Results of tools that declare cache_ttl go through `cache`
+    (a ToolResultCache; set registry.cache = None to disable).
+    """
+
+    def __init__(self, cache: ToolResultCache = None):
+        self._tools: Dict[str, Tool] = {}
+        self.cache = cache if cache is not None else ToolResultCache()
+        self._lock = threading.Lock()
+        self._derived = {}
+        self.version = 0            # bumped on every (un)registration
+
+
+    def register(self, tool: Tool) -> Tool:
+        with self._lock:
+            self._tools[tool.name] = tool
+            self._derived = {}
+            self.version += 1
+        if self.cache is not None:
+            self.cache.invalidate(tool.name)       # results of a replaced tool are stale
+        return tool
+
+
+    def unregister(self, name: str):
+        with self._lock:
+            if self._tools.pop(name, None) is not None:
+                self._derived = {}
+                self.version += 1
+
+
+    def tool(
+            self,
+            description: str,
+            name: str = None,
+            retry_config: RetryConfig = DEFAULT_RETRY,
+            cache_ttl: float = None,
+            cache_key_fn: Callable[[dict], str] = None,
+            side_effect_free: bool = False,
+            timeout: float = None,
+    ):
+        """ Decorator registering a function as a tool, returns the function unchanged """
+        def decorate(func: Callable) -> Callable:
+            self.register(Tool(name or func.__name__, description, func, retry_config, cache_ttl, cache_key_fn, side_effect_free, timeout))
+            return func
+        return decorate
+
+
+    def get(self, name: str) -> Tool | None:
+        return self._tools.get(name)
+
+
+    def __contains__(self, name) -> bool:
+        return name in self._tools
+
+
+    def __iter__(self):
+        return iter(list(self._tools.values()))
+
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+
+    def derived(self, key: str, build_fn: Callable):
+        """ build_fn(registry) cached until the catalog changes """
+        cache = self._derived
+        if key not in cache:
+            value = build_fn(self)
+            with self._lock:
+                if self._derived is cache:
+                    cache[key] = value
+            return value
+        return cache[key]
+
+
+    def descriptions(self) -> Dict[str, str]:
+        """ {tool name: LLM description}, in registration order """
+        return self.derived("descriptions", lambda reg: {t.name: t.llm_desc for t in reg})
+
+
+    def prompt_block(self) -> str:
+        """ "- name: description" lines for system prompts """
+        return self.derived("prompt_block", lambda reg: "\n".join(f"- {name}: {desc}" for name, desc in reg.descriptions().items()))
+
+
+    def call_schemas(self) -> List[dict]:
+        """ One {"tool": name, "args": its args_schema} object schema per tool, for structured output """
+        return self.derived("call_schemas", lambda reg: [
+            {
+                "type": "object",
+                "properties": {
+                    "tool": {"type": "string", "enum": [tool.name]},
+                    "args": {**tool.args_schema, "additionalProperties": False},
+                },
+                "required": ["tool"],
+            }
+            for tool in reg
+        ])
+
+
+    def run(self, name: str, args: dict = None) -> dict:
+        """
+        Execute a tool by name for a node.
+
+        Returns:
+            {"result": ...} on success or {"error": "..."}; never raises
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            return {"error": f"Unknown tool: {name}"}
+
+        with tracer.span(f"tool.{name}", kind="tool", tool=name) as span:
+            try:
+                args = args or {}
+                if self.cache is None:
+                    return {"result": tool.execute(**args)}
+                return {"result": self.cache.call(tool, args, lambda: tool.execute(**args))}
+            except Exception as e:
+                cause = e.__cause__ or e          # unwrap execute()'s RuntimeError
+                span.set(failed=str(cause))
+                return {"error": f"Tool execution failed: {cause}"}
+
+
+# process-wide registry; chatbot.tools registers the built-in tools on import
+registry = ToolRegistry()
+tool = registry.tool
@@ -0,0 +1,282 @@
+"""
+Pool of Ollama backends for horizontal scaling.
+
+    OLLAMA_URLS=http://gpu1:11434/api/chat,http://gpu2:11434/api/chat python main_cli.py
+
+Routing for every LLM request:
+1. only healthy backends whose circuit breaker lets the call through
+2. prefer backends that have the requested model (from /api/tags)
+3. session affinity: a conversation sticks to the backend that already
+   holds its KV cache, unless that backend is much busier than the rest
+4. otherwise the backend with the fewest outstanding requests
+
+A background thread probes GET /api/tags to eject dead nodes and readmit
+recovered ones. Failed attempts move to another backend on retry (see
+LLMClient), so a non-streaming call fails over mid-turn.
+"""
+import random
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import List
+from urllib.parse import urlsplit
+
+import requests
+
+from chatbot.utils.resilience import CircuitOpenError, get_breaker, is_retryable
+
+_current_session = contextvars.ContextVar("llm_session", default=None)
+
+
+def current_session():
+    """ Session id of the running turn (for backend affinity), or None """
+    return _current_session.get()
+
+
+class session_scope:
+    """ `with session_scope("abc"):` - LLM calls inside prefer abc's backend """
+
+    def __init__(self, session_id: str = None):
+        self.session_id = session_id
+        self._token = None
+
+    def __enter__(self):
+        if self.session_id is not None:
+            self._token = _current_session.set(self.session_id)
+        return self.session_id
+
+    def __exit__(self, *exc):
+        if self._token is not None:
+            try:
+                _current_session.reset(self._token)
+            except ValueError:
+                pass        # generator finalised from another context
+        return False
+
+
+class Backend:
+    """
+    One Ollama node.
+
+    Attr:
+    - url: full /api/chat url
+    - base_url: scheme://host:port (for /api/tags probes)
+    - healthy: last probe result (True until a probe says otherwise)
+    - models: model names from /api/tags, None until the first probe
+    - outstanding: requests currently in flight
+    - queued: requests waiting for a slot (set by the pool's LLMScheduler)
+    - breaker: shared CircuitBreaker for this host
+    """
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.url = url
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        self.healthy = True
+        self.models = None
+        self.outstanding = 0
+        self.queued = 0
+        self.breaker = get_breaker(parts.netloc)
+        self.stats = {"requests": 0, "failures": 0, "ejections": 0}
+
+    def has_model(self, model: str) -> bool:
+        if self.models is None:
+            return True         # unknown yet, don't exclude
+        return model in self.models or f"{model}:latest" in self.models
+
+
+class _Lease:
+    """ Counts a request as outstanding on a backend and feeds its breaker """
+
+    __slots__ = ("pool", "backend")
+
+    def __init__(self, pool, backend: Backend):
+        self.pool = pool
+        self.backend = backend
+
+    def __enter__(self) -> Backend:
+        with self.pool._lock:
+            self.backend.outstanding += 1
+            self.backend.stats["requests"] += 1
+        return self.backend
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.pool._lock:
+            self.backend.outstanding -= 1
+            if exc is not None and isinstance(exc, Exception) and is_retryable(exc):
+                self.backend.stats["failures"] += 1
+
+        breaker = self.backend.breaker
+        if exc is None:
+            breaker.record_success()
+        elif isinstance(exc, Exception) and is_retryable(exc):
+            breaker.record_failure()
+        else:
+            breaker.release()       # 4xx, cancelled, closed early: says nothing about the node
+        return False
+
+
+class BackendPool:
+    """
+    Routes requests across several Ollama backends.
+
+    Attr:
+    - backends: list of Backend
+    - affinity_slack: how many more outstanding requests a session's
+      sticky backend may have than the least busy one before we move it
+    - max_sessions: sessions remembered for affinity (LRU)
+    - probe_interval / probe_timeout: health check cadence (seconds)
+    - scheduler: optional LLMScheduler limiting requests in flight per
+      backend (None = no limit); clients take a slot from it per request
+    """
+
+    def __init__(
+            self,
+            urls: List[str],
+            affinity_slack: int = 4,
+            max_sessions: int = 10000,
+            probe_interval: float = 10.0,
+            probe_timeout: float = 2.0,
+            health_checks: bool = None,
+    ):
+        if not urls:
+            raise ValueError("BackendPool needs at least one Ollama url")
+        self.backends = [Backend(url) for url in urls]
+        self.affinity_slack = affinity_slack
+        self.max_sessions = max_sessions
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.scheduler = None
+
+        self._lock = threading.Lock()
+        self._affinity = OrderedDict()      # session id -> Backend
+        self._stop = threading.Event()
+        self._probe_thread = None
+
+        # probing a single backend buys nothing: there is nowhere to fail over to
+        if health_checks if health_checks is not None else len(self.backends) > 1:
+            self.start_health_checks()
+
+    @property
+    def url(self) -> str:
+        return self.backends[0].url
+
+    def pick(self, model: str = None, exclude=()) -> Backend:
+        """
+        Choose a backend for one attempt.
+
+        Args:
+            model: requested model (prefers backends that have it)
+            exclude: backends already tried in this call (failover)
+
+        Raises:
+            CircuitOpenError if every backend is down
+        """
+        session = _current_session.get()
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy and b.breaker.state != "open"]
+            if not candidates:
+                # probes may be stale: still let the breakers decide rather than failing blind
+                candidates = [b for b in self.backends if b.breaker.state != "open"]
+            fresh = [b for b in candidates if b not in exclude]
+            candidates = fresh or candidates
+            if model is not None:
+                candidates = [b for b in candidates if b.has_model(model)] or candidates
+
+            ordered = self._preference(candidates, session)
+
+        for backend in ordered:
+            try:
+                backend.breaker.before_call()
+            except CircuitOpenError:
+                continue
+            if session is not None:
+                self._remember(session, backend)
+            return backend
+
+        raise CircuitOpenError("no Ollama backend available")
+
+    def _preference(self, candidates: List[Backend], session) -> List[Backend]:
+        """ Least busy (outstanding + queued) first (random tie-break), sticky backend in front if not overloaded """
+        ordered = sorted(candidates, key=lambda b: (b.outstanding + b.queued, random.random()))
+        sticky = self._affinity.get(session) if session is not None else None
+        if sticky in ordered and ordered and sticky.outstanding + sticky.queued <= ordered[0].outstanding + ordered[0].queued + self.affinity_slack:
+            ordered.remove(sticky)
+            ordered.insert(0, sticky)
+        return ordered
+
+    def _remember(self, session: str, backend: Backend):
+        with self._lock:
+            self._affinity[session] = backend
+            self._affinity.move_to_end(session)
+            while len(self._affinity) > self.max_sessions:
+                self._affinity.popitem(last=False)
+
+    def lease(self, backend: Backend) -> _Lease:
+        """ `with pool.lease(backend):` around one request """
+        return _Lease(self, backend)
+
+    def probe(self, backend: Backend) -> bool:
+        """ One health check: GET /api/tags, also refreshes the model list """
+        try:
+            response = requests.get(f"{backend.base_url}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+            models = {m.get("name") for m in response.json().get("models", [])}
+            healthy = True
+        except Exception:
+            models = None
+            healthy = False
+
+        with self._lock:
+            if backend.healthy and not healthy:
+                backend.stats["ejections"] += 1
+                # its sessions' KV cache is gone with it
+                for session in [s for s, b in self._affinity.items() if b is backend]:
+                    del self._affinity[session]
+            backend.healthy = healthy
+            if models is not None:
+                backend.models = models
+        return healthy
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def start_health_checks(self):
+        if self._probe_thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while True:
+                self.probe_all()
+                if self._stop.wait(self.probe_interval):
+                    return
+
+        self._probe_thread = threading.Thread(target=loop, name="ollama-health", daemon=True)
+        self._probe_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+        self._probe_thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            backends = [
+                {
+                    "url": b.url,
+                    "healthy": b.healthy,
+                    "outstanding": b.outstanding,
+                    "queued": b.queued,
+                    "models": sorted(b.models) if b.models is not None else None,
+                    **b.stats,
+                }
+                for b in self.backends
+            ]
+            sessions = len(self._affinity)
+        for entry, backend in zip(backends, self.backends):
+            entry["breaker"] = backend.breaker.state
+        stats = {"backends": backends, "sticky_sessions": sessions}
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
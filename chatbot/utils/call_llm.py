@@ -1,68 +1,74 @@
-import requests
 from .ollama_errors import format_ollama_error
-import json
+from .llm_client import (
+    LLMClient, AsyncLLMClient, get_default_client, get_default_async_client, OLLAMA_URL, DEFAULT_MODEL
+)
+from .scheduler import PRIORITY_ANSWER
+from .response_cache import ResponseCache
 
-OLLAMA_URL= "http://localhost:11434/api/chat"
-DEFAULT_MODEL = "gemma3:1b"
 
-
-
-def call_llm(prompt: str=None, messages: list=None) -> str:
+def _to_messages(prompt: str=None, messages: list=None) -> list:
     # if messages provided directly, use.
     if messages is not None:
-        final_messages = messages
+        return messages
 
     # otherwise convert prompt to message
     elif prompt is not None:
-        final_messages = [{
+        return [{
             "role": "user",
             "content": prompt
         }]
     else:
         raise ValueError("Either prompt or messages must be provided to call_llm.")
-    
-    payload = {"model": DEFAULT_MODEL, "messages": final_messages, "stream": False}           # what Ollama's /api/chat expects
+
+
+def call_llm(prompt: str=None, messages: list=None, client: LLMClient=None, format=None, options: dict=None, keep_alive=None, model: str=None, priority: int=PRIORITY_ANSWER) -> str:
+    final_messages = _to_messages(prompt, messages)
+    client = client or get_default_client()
 
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=60)                  # where code calls Ollama API
-        response.raise_for_status()
-        data = response.json()
-        return data["message"]["content"].strip()
+        return client.chat(final_messages, format=format, options=options, keep_alive=keep_alive, model=model, priority=priority)                  # pooled keep-alive session to Ollama
     except Exception as e:
         return format_ollama_error(e)
 
-def call_llm_stream(prompt: str=None, messages: list=None):
-    # if messages provided directly, use.
-    if messages is not None:
-        final_messages = messages
+def call_llm_stream(prompt: str=None, messages: list=None, client: LLMClient=None, format=None, options: dict=None, keep_alive=None, model: str=None, priority: int=PRIORITY_ANSWER, cache: ResponseCache=None):
+    """ Streamed chat; with a ResponseCache, cached answers replay and identical requests share one stream """
+    final_messages = _to_messages(prompt, messages)
+    client = client or get_default_client()
+
+    def upstream():
+        return client.chat_stream(final_messages, format=format, options=options, keep_alive=keep_alive, model=model, priority=priority)
 
-    # otherwise convert prompt to message
-    elif prompt is not None:
-        final_messages = [{
-            "role": "user",
-            "content": prompt
-        }]
-    else:
-        raise ValueError("Either prompt or messages must be provided to call_llm.")
-    
-    payload = {"model": DEFAULT_MODEL, "messages": final_messages, "stream": True}
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=60, stream=True) 
-        
-        # Check for errors before processing
-        if response.status_code != 200:
-            error_text = response.text
-            yield f"Error: {error_text}"
-            return
-        
-        # iterate through response lines
-        for line in response.iter_lines():
-            if line:
-                chunk_data = json.loads(line)
-                #extract content from chunk
-                if "message" in chunk_data and "content" in chunk_data["message"]:
-                    yield chunk_data["message"]["content"]
+        # errors raise out of the cache (and aren't stored), so they are still turned into text here
+        stream = cache.stream(final_messages, model or client.model, {"format": format, **(options or {})}, upstream) if cache is not None else upstream()
+        for chunk in stream:
+            yield chunk
+    except Exception as e:
+        yield format_ollama_error(e)
 
+
+async def acall_llm(prompt: str=None, messages: list=None, client: AsyncLLMClient=None, format=None, options: dict=None, keep_alive=None, model: str=None, priority: int=PRIORITY_ANSWER) -> str:
+    """ Async twin of call_llm, awaits Ollama without blocking the event loop """
+    final_messages = _to_messages(prompt, messages)
+    client = client or get_default_async_client()
+
+    try:
+        return await client.chat(final_messages, format=format, options=options, keep_alive=keep_alive, model=model, priority=priority)
+    except Exception as e:
+        return format_ollama_error(e)
+
+async def acall_llm_stream(prompt: str=None, messages: list=None, client: AsyncLLMClient=None, format=None, options: dict=None, keep_alive=None, model: str=None, priority: int=PRIORITY_ANSWER, cache: ResponseCache=None):
+    """ Async twin of call_llm_stream, async generator of chunks """
+    final_messages = _to_messages(prompt, messages)
+    client = client or get_default_async_client()
+
+    def upstream():
+        return client.chat_stream(final_messages, format=format, options=options, keep_alive=keep_alive, model=model, priority=priority)
+
+    try:
+        stream = cache.astream(final_messages, model or client.model, {"format": format, **(options or {})}, upstream) if cache is not None else upstream()
+        async for chunk in stream:
+            yield chunk
     except Exception as e:
         yield format_ollama_error(e)
                     
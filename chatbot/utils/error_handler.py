@@ -1,6 +1,6 @@
-import time
 import logging
 from typing import Any, Callable, Dict
+from chatbot.utils.resilience import RetryPolicy, retry_call
 
 
 # Set up logging
@@ -20,12 +20,14 @@ class RetryConfig:
             max_attempts: int = 3,
             initial_delay: float = 1.0,
             backoff_multiplier: float = 2.0,
-            max_delay: float = 10.0
+            max_delay: float = 10.0,
+            retry_exceptions: tuple = (Exception,)
     ):
         self.max_attempts = max_attempts
         self.initial_delay = initial_delay
         self.backoff_multiplier = backoff_multiplier
         self.max_delay = max_delay
+        self.retry_exceptions = retry_exceptions    # only these are retried, anything else fails fast
 
 def retry_with_backoff(
         func: Callable,
@@ -35,6 +37,9 @@ def retry_with_backoff(
     """
     Execute func with exponential backoff retry logic.
 
+    Delays use full jitter and never run past the current turn deadline
+    (see chatbot.utils.resilience).
+
     Args:
         func: function to execute
         config: RetryConfig instance
@@ -44,34 +49,34 @@ def retry_with_backoff(
         Result of func() if successful.
 
     Raises:
-        Exception from func() if all retries fail.
+        Exception from func() if all retries fail (or DeadlineExceeded).
     """
     if config is None:
         config = RetryConfig()
 
-    last_exception = None
-    delay = config.initial_delay
-
-    for attempt in range(1, config.max_attempts + 1):
-        try:
-            logger.info(f"Executing tool '{tool_name}', attempt {attempt}...")
-            result = func()
-            logger.info(f"Tool '{tool_name}' succeeded on attempt {attempt}.")
-            return result
-        
-        except Exception as e:
-            last_exception = e
-            logger.warning(
-                f"Tool '{tool_name}' failed on attempt {attempt}: {e}")
-            if attempt < config.max_attempts:
-                logger.info(
-                    f"Retrying tool '{tool_name}' in {delay:.2f} seconds...")
-                time.sleep(delay)
-                delay = min(delay * config.backoff_multiplier, config.max_delay)
-            else:
-                logger.error(
-                    f"Tool '{tool_name}' failed after {config.max_attempts} attempts.")
-    raise last_exception
+    policy = RetryPolicy(
+        max_attempts=config.max_attempts,
+        base_delay=config.initial_delay,
+        max_delay=config.max_delay,
+        multiplier=config.backoff_multiplier,
+        retry_on=lambda e: isinstance(e, config.retry_exceptions),
+    )
+
+    attempts = 1
+
+    def on_retry(attempt, e, delay):
+        nonlocal attempts
+        attempts = attempt + 1
+        logger.warning(f"Tool '{tool_name}' failed on attempt {attempt}: {e}")
+        logger.info(f"Retrying tool '{tool_name}' in {delay:.2f} seconds...")
+
+    logger.debug("Executing tool '%s'...", tool_name)     # lazy: no formatting unless enabled
+    try:
+        return retry_call(func, policy, on_retry=on_retry)
+    except Exception as e:
+        logger.warning(f"Tool '{tool_name}' failed on attempt {attempts}: {e}")
+        logger.error(f"Tool '{tool_name}' failed after {attempts} attempts.")
+        raise
     
 
 def format_user_friendly_error(error: Exception, tool_name: str) -> str:
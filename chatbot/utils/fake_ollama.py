@@ -0,0 +1,283 @@
+"""
+Local stand-in for Ollama's /api/chat, for offline load and latency tests.
+
+Speaks both formats call_llm uses:
+- stream: false -> one JSON object
+- stream: true  -> NDJSON chunks, final chunk has done=true plus eval stats
+
+Run it and point the bot at it:
+    python -m chatbot.utils.fake_ollama --port 11435 --ttft 0.2 --token-delay 0.02
+    OLLAMA_URL=http://127.0.0.1:11435/api/chat python main_cli.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, List, Tuple
+
+DEFAULT_PLAN = '{"action": "answer_direct"}'
+DEFAULT_ANSWER = "Sure! Here is a short, friendly answer from the fake Ollama server."
+
+
+def default_responder(payload: dict) -> str:
+    """
+    Pick a canned response for a request.
+
+    Structured-output requests (planner / ReAct, they send `format`) get a
+    JSON plan, everything else gets plain answer text.
+    """
+    if payload.get("format") is not None:
+        return DEFAULT_PLAN
+    return DEFAULT_ANSWER
+
+
+class FakeOllamaConfig:
+    """
+    Behaviour of the fake server.
+
+    Attr:
+    - ttft: seconds before the first token (also applied to non-stream calls)
+    - token_delay: seconds between streamed tokens
+    - rules: [(regex, response)] matched against the last user message; the
+      first match wins, otherwise responder(payload) is used
+    - responder: callable(payload) -> response text
+    - error_rate: fraction of requests answered with an injected error
+    - error_statuses: statuses to pick from for injected errors (429, 500, ...)
+    - timeout_rate: fraction of requests that hang for `hang_seconds`
+    - max_concurrency: requests generating at once; extra ones queue
+    - max_queue: queued requests beyond which the server answers 503
+    - seed: makes error injection reproducible
+    """
+
+    def __init__(
+            self,
+            ttft: float = 0.05,
+            token_delay: float = 0.01,
+            rules: List[Tuple[str, str]] = None,
+            responder: Callable[[dict], str] = default_responder,
+            error_rate: float = 0.0,
+            error_statuses: Tuple[int, ...] = (429, 500),
+            timeout_rate: float = 0.0,
+            hang_seconds: float = 120.0,
+            max_concurrency: int = 4,
+            max_queue: int = 512,
+            seed: int = None,
+    ):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.rules = [(re.compile(pattern, re.IGNORECASE), text) for pattern, text in (rules or [])]
+        self.responder = responder
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.rng = random.Random(seed)
+
+    def respond(self, payload: dict) -> str:
+        messages = payload.get("messages") or []
+        last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        for pattern, text in self.rules:
+            if pattern.search(last_user):
+                return text
+        return self.responder(payload)
+
+
+def tokenize(text: str) -> List[str]:
+    """ Split into word-ish tokens, keeping whitespace so chunks join back exactly """
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: FakeOllamaConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.slots = threading.Semaphore(config.max_concurrency)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.stats = {"requests": 0, "errors_injected": 0, "timeouts_injected": 0, "rejected": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/chat"
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, like real Ollama
+    disable_nagle_algorithm = True      # small NDJSON chunks go out immediately (Go sets TCP_NODELAY too)
+    server: FakeOllamaServer
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake:latest"}]})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "fake"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        server = self.server
+        config = server.config
+        server.count("requests")
+
+        # admission: like Ollama, reject once the queue is full
+        with server.lock:
+            if server.waiting >= config.max_queue:
+                server.stats["rejected"] += 1
+                self._send_json(503, {"error": "server busy, please try again. maximum pending requests exceeded"})
+                return
+            server.waiting += 1
+            roll = config.rng.random()
+            status = config.rng.choice(config.error_statuses) if config.error_statuses else 500
+
+        try:
+            with server.slots:
+                with server.lock:
+                    server.waiting -= 1
+
+                if roll < config.error_rate:
+                    server.count("errors_injected")
+                    self._send_json(status, {"error": f"injected error {status}"})
+                    return
+
+                if roll < config.error_rate + config.timeout_rate:
+                    server.count("timeouts_injected")
+                    time.sleep(config.hang_seconds)
+                    self.close_connection = True
+                    return
+
+                self._generate(payload, config)
+        except (BrokenPipeError, ConnectionResetError):
+            # client gave up (e.g. read timeout), nothing to do
+            self.close_connection = True
+
+    def _generate(self, payload: dict, config: FakeOllamaConfig):
+        model = payload.get("model", "fake")
+        text = config.respond(payload)
+        tokens = tokenize(text)
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages") or [])
+        started = time.perf_counter()
+
+        time.sleep(config.ttft)
+
+        def final_stats() -> dict:
+            total = time.perf_counter() - started
+            return {
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int(total * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": max(1, prompt_chars // 4),
+                "prompt_eval_duration": int(config.ttft * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(max(total - config.ttft, 1e-6) * 1e9),
+            }
+
+        if not payload.get("stream", True):
+            time.sleep(config.token_delay * len(tokens))
+            body = {"model": model, "message": {"role": "assistant", "content": text}}
+            body.update(final_stats())
+            self._send_json(200, body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(obj: dict):
+            line = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(config.token_delay)
+            write_chunk({"model": model, "message": {"role": "assistant", "content": token}, "done": False})
+
+        final = {"model": model, "message": {"role": "assistant", "content": ""}}
+        final.update(final_stats())
+        write_chunk(final)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_fake_ollama(config: FakeOllamaConfig = None, host: str = "127.0.0.1", port: int = 0) -> FakeOllamaServer:
+    """
+    Start the fake server on a background thread (port 0 = pick a free port).
+
+    Returns:
+        the server; use server.url as OLLAMA_URL and server.shutdown() to stop
+    """
+    server = FakeOllamaServer((host, port), config or FakeOllamaConfig())
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama /api/chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.05, help="seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 429/500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that hang")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=512)
+    parser.add_argument("--plan", default=DEFAULT_PLAN, help="JSON returned to structured-output (planner) calls")
+    parser.add_argument("--answer", default=DEFAULT_ANSWER, help="text returned to answer calls")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        ttft=args.ttft,
+        token_delay=args.token_delay,
+        responder=lambda payload: args.plan if payload.get("format") is not None else args.answer,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        seed=args.seed,
+    )
+    server = FakeOllamaServer((args.host, args.port), config)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
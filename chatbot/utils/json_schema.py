@@ -0,0 +1,59 @@
+from typing import Any, Dict, List
+
+# JSON schema type name -> python types (bool is excluded from numbers on purpose)
+_TYPES = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+def schema_errors(instance: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Validate instance against the small JSON schema subset we send to
+    Ollama's `format` (type, enum, properties, required, items,
+    additionalProperties=false, anyOf).
+
+    Returns:
+        list of error strings, empty when valid
+    """
+    errors = []
+
+    expected = schema.get("type")
+    if expected is not None:
+        python_types = _TYPES[expected]
+        is_bool = isinstance(instance, bool)
+        if not isinstance(instance, python_types) or (is_bool and expected in ("integer", "number")):
+            return [f"{path}: expected {expected}, got {type(instance).__name__}"]
+
+    if "anyOf" in schema:
+        branches = [schema_errors(instance, option, path) for option in schema["anyOf"]]
+        if all(branches):
+            # report the closest branch: right enum values (e.g. tool name) first, then fewest errors
+            closest = min(branches, key=lambda errs: (sum("not one of" in e for e in errs), len(errs)), default=[])
+            errors.append(f"{path}: matches none of the {len(branches)} allowed shapes")
+            errors.extend(closest)
+
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: {instance!r} not one of {schema['enum']}")
+
+    if isinstance(instance, dict):
+        properties = schema.get("properties", {})
+        for name in schema.get("required", []):
+            if name not in instance:
+                errors.append(f"{path}: missing required '{name}'")
+        for name, value in instance.items():
+            if name in properties:
+                errors.extend(schema_errors(value, properties[name], f"{path}.{name}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected property '{name}'")
+
+    if isinstance(instance, list) and "items" in schema:
+        for i, item in enumerate(instance):
+            errors.extend(schema_errors(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
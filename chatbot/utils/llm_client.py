@@ -0,0 +1,444 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from chatbot.utils.tracing import tracer, eval_stats
+from chatbot.utils.resilience import (
+    RetryPolicy, current_deadline, retry_call, aretry_call, retry_stream, aretry_stream
+)
+from chatbot.utils.backend_pool import Backend, BackendPool
+from chatbot.utils.prompt_builder import encode_messages
+from chatbot.utils.scheduler import PRIORITY_ANSWER
+
+# env overrides let the bot point at another box or the local fake server
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/chat")
+DEFAULT_MODEL = os.environ.get("OLLAMA_MODEL", "gemma3:1b")
+
+# several inference boxes: OLLAMA_URLS=http://gpu1:11434/api/chat,http://gpu2:11434/api/chat
+OLLAMA_URLS = [u.strip() for u in os.environ.get("OLLAMA_URLS", OLLAMA_URL).split(",") if u.strip()]
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# transient Ollama failures (connection refused, 503 queue full, timeouts) get two more tries
+DEFAULT_LLM_RETRY = RetryPolicy(max_attempts=3, base_delay=0.25, max_delay=2.0)
+
+
+class _BaseClient:
+    """
+    Payload building, backend picking and latency stats shared by the sync
+    and async clients.
+
+    url=None uses the process-wide BackendPool (OLLAMA_URLS); an explicit
+    url gets a single-backend pool; pass pool= to share one across clients.
+    """
+
+    def __init__(
+            self,
+            url: str = None,
+            model: str = DEFAULT_MODEL,
+            connect_timeout: float = 3.0,
+            read_timeout: float = 60.0,
+            pool_size: int = 10,
+            retry_policy: RetryPolicy = DEFAULT_LLM_RETRY,
+            pool: BackendPool = None,
+    ):
+        if pool is None:
+            pool = get_default_pool() if url is None else BackendPool([url], health_checks=False)
+        self.pool = pool
+        self.url = pool.url
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.retry_policy = retry_policy
+
+        # per-request latency tracking
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "request_bytes": 0,
+            "total_latency_s": 0.0,
+            "last_latency_s": 0.0,
+        }
+
+
+    def _build_payload(self, messages: list, stream: bool, format=None, options: dict = None, keep_alive=None, model: str = None) -> dict:
+        payload = {"model": model or self.model, "messages": messages, "stream": stream}     # what Ollama's /api/chat expects
+        if format is not None:
+            payload["format"] = format          # "json" or a JSON schema (structured output)
+        if options:
+            payload["options"] = options        # e.g. {"num_predict": 200, "num_ctx": 4096}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive  # keep the model (and its prompt cache) loaded
+        return payload
+
+
+    def _encode(self, messages: list, *args, **kwargs) -> bytes:
+        """
+        JSON-encode the payload once (also counted for prompt size stats).
+
+        The messages array is spliced in from each message's cached bytes
+        (see prompt_builder.ChatMessage), so a long history isn't
+        re-serialized every call; only the small remaining fields are dumped.
+        """
+        fields = self._build_payload(None, *args, **kwargs)
+        del fields["messages"]
+        rest = json.dumps(fields, ensure_ascii=False).encode("utf-8")
+        body = b'{"messages": ' + encode_messages(messages) + b", " + rest[1:]
+        with self._stats_lock:
+            self._stats["request_bytes"] += len(body)
+        return body
+
+
+    def _pick(self, tried: set, model: str = None) -> Backend:
+        """ Backend for the next attempt; earlier failed ones are avoided (failover) """
+        backend = self.pool.pick(model or self.model, exclude=tried)
+        tried.add(backend)
+        return backend
+
+
+    def _slot(self, backend: Backend, priority: int, span):
+        """ Scheduler slot on backend for one attempt (sync or async context manager), no-op without a scheduler """
+        if self.pool.scheduler is None:
+            return nullcontext()
+        return self.pool.scheduler.slot(backend, priority, span)
+
+
+    def _start_span(self, name: str, messages: list, backend: Backend, model: str = None):
+        """ Tracing span for one request (no-op unless tracing is enabled) """
+        if not tracer.exporters:
+            return tracer.start(name)
+        return tracer.start(name, kind="llm", model=model or self.model, url=backend.url, messages=len(messages))
+
+
+    def _record(self, started: float, ok: bool):
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["total_latency_s"] += elapsed
+            self._stats["last_latency_s"] = elapsed
+            if not ok:
+                self._stats["errors"] += 1
+
+
+    def latency_stats(self) -> dict:
+        """ Snapshot of request count, error count and latency (seconds) """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_latency_s"] = stats["total_latency_s"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+class LLMClient(_BaseClient):
+    """
+    Shared client for Ollama's /api/chat endpoint.
+
+    Holds one pooled, keep-alive requests.Session so planner calls, answer
+    streams and ReAct iterations reuse TCP connections instead of opening a
+    new one every turn.
+
+    Attr:
+    - url: full /api/chat url
+    - model: model name sent with every request
+    - connect_timeout / read_timeout: separate timeouts (seconds)
+    - pool_size: max keep-alive connections kept per Ollama host
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        for backend in self.pool.backends:
+            self._mount_host(backend.url)
+
+
+    def _mount_host(self, url: str):
+        """ Mount a pooled adapter sized for a single Ollama host """
+        parts = urlsplit(url)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount(f"{parts.scheme}://{parts.netloc}/", adapter)
+
+
+    @property
+    def timeout(self) -> tuple:
+        deadline = current_deadline()
+        if deadline is None:
+            return (self.connect_timeout, self.read_timeout)
+        # never wait past the turn's deadline (tiny floor so requests doesn't treat 0 as "no timeout")
+        return (max(deadline.cap(self.connect_timeout), 0.001), max(deadline.cap(self.read_timeout), 0.001))
+
+
+    def chat(self, messages: list, format=None, options: dict = None, keep_alive=None, model: str = None, priority: int = PRIORITY_ANSWER) -> str:
+        """
+        Non-streaming chat request.
+
+        Args:
+            messages: chat messages
+            format: optional Ollama `format` ("json" or a JSON schema dict)
+            options: optional Ollama generation options
+            keep_alive: optional Ollama keep_alive ("30m", -1, ...)
+            model: optional model override for this request (per-node routing)
+            priority: scheduler priority (see scheduler.py), only matters with pool.scheduler set
+
+        Returns:
+            assistant message content (str)
+
+        Raises:
+            requests exceptions on connection / HTTP errors (after retries),
+            CircuitOpenError / DeadlineExceeded from the resilience layer,
+            Overloaded when the scheduler sheds the request
+        """
+        tried = set()
+        return retry_call(lambda: self._chat_once(self._pick(tried, model), messages, format, options, keep_alive, model, priority), self.retry_policy)
+
+
+    def _chat_once(self, backend: Backend, messages: list, format, options: dict, keep_alive, model: str = None, priority: int = PRIORITY_ANSWER) -> str:
+        started = time.perf_counter()
+        ok = False
+        span = self._start_span("llm.chat", messages, backend, model)
+        error = None
+        try:
+            body = self._encode(messages, False, format, options, keep_alive, model)
+            span.set(prompt_bytes=len(body))
+            with self._slot(backend, priority, span), self.pool.lease(backend):
+                response = self.session.post(backend.url, data=body, headers=JSON_HEADERS, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+            span.set(**eval_stats(data))
+            ok = True
+            return data["message"]["content"].strip()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(started, ok)
+            span.end(error)
+
+
+    def chat_stream(self, messages: list, format=None, options: dict = None, keep_alive=None, model: str = None, priority: int = PRIORITY_ANSWER):
+        """
+        Streaming chat request, yields content chunks as they arrive.
+
+        Failures before the first chunk are retried; latency is recorded
+        once the stream is fully consumed (or closed).
+        """
+        tried = set()
+        yield from retry_stream(lambda: self._chat_stream_once(self._pick(tried, model), messages, format, options, keep_alive, model, priority), self.retry_policy)
+
+
+    def _chat_stream_once(self, backend: Backend, messages: list, format, options: dict, keep_alive, model: str = None, priority: int = PRIORITY_ANSWER):
+        started = time.perf_counter()
+        ok = False
+        span = self._start_span("llm.chat_stream", messages, backend, model)
+        error = None
+        first_token = True
+        try:
+            body = self._encode(messages, True, format, options, keep_alive, model)
+            span.set(prompt_bytes=len(body))
+            with self._slot(backend, priority, span), self.pool.lease(backend), self.session.post(backend.url, data=body, headers=JSON_HEADERS, timeout=self.timeout, stream=True) as response:
+                # check for errors before processing
+                if response.status_code != 200:
+                    raise requests.HTTPError(f"{response.status_code} {response.text}", response=response)
+
+                # iterate through response lines
+                for line in response.iter_lines():
+                    if line:
+                        chunk_data = json.loads(line)
+                        if chunk_data.get("done"):
+                            span.set(**eval_stats(chunk_data))      # final chunk carries eval counts
+                        # extract content from chunk
+                        if "message" in chunk_data and "content" in chunk_data["message"]:
+                            if first_token:
+                                first_token = False
+                                span.set(ttft_s=round(time.perf_counter() - started, 4))
+                            yield chunk_data["message"]["content"]
+            ok = True
+        except GeneratorExit:
+            # the caller stopped reading (e.g. it had what it needed), not a failure
+            ok = True
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(started, ok)
+            span.end(error)
+
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient(_BaseClient):
+    """
+    asyncio twin of LLMClient built on aiohttp.
+
+    One aiohttp.ClientSession (created lazily inside the running loop) keeps
+    a keep-alive pool of `pool_size` connections per Ollama host, so many
+    sessions can wait on Ollama concurrently from a single event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._session = None
+
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+
+    def _request_timeout(self) -> aiohttp.ClientTimeout:
+        """ Per-request timeout: the session default, capped by the turn deadline if there is one """
+        deadline = current_deadline()
+        if deadline is None:
+            return self._get_session().timeout
+        return aiohttp.ClientTimeout(
+            total=max(deadline.remaining(), 0.001),
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+
+
+    async def chat(self, messages: list, format=None, options: dict = None, keep_alive=None, model: str = None, priority: int = PRIORITY_ANSWER) -> str:
+        """ Non-streaming chat request with retries, returns assistant message content """
+        tried = set()
+        return await aretry_call(lambda: self._chat_once(self._pick(tried, model), messages, format, options, keep_alive, model, priority), self.retry_policy)
+
+
+    async def _chat_once(self, backend: Backend, messages: list, format, options: dict, keep_alive, model: str = None, priority: int = PRIORITY_ANSWER) -> str:
+        started = time.perf_counter()
+        ok = False
+        span = self._start_span("llm.chat", messages, backend, model)
+        error = None
+        try:
+            body = self._encode(messages, False, format, options, keep_alive, model)
+            span.set(prompt_bytes=len(body))
+            async with self._slot(backend, priority, span):
+                with self.pool.lease(backend):
+                    async with self._get_session().post(backend.url, data=body, headers=JSON_HEADERS, timeout=self._request_timeout()) as response:
+                        response.raise_for_status()
+                        data = await response.json(content_type=None)
+            span.set(**eval_stats(data))
+            ok = True
+            return data["message"]["content"].strip()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(started, ok)
+            span.end(error)
+
+
+    async def chat_stream(self, messages: list, format=None, options: dict = None, keep_alive=None, model: str = None, priority: int = PRIORITY_ANSWER):
+        """ Streaming chat request, async generator of content chunks (retried until the first chunk) """
+        tried = set()
+        async for chunk in aretry_stream(lambda: self._chat_stream_once(self._pick(tried, model), messages, format, options, keep_alive, model, priority), self.retry_policy):
+            yield chunk
+
+
+    async def _chat_stream_once(self, backend: Backend, messages: list, format, options: dict, keep_alive, model: str = None, priority: int = PRIORITY_ANSWER):
+        started = time.perf_counter()
+        ok = False
+        span = self._start_span("llm.chat_stream", messages, backend, model)
+        error = None
+        first_token = True
+        try:
+            body = self._encode(messages, True, format, options, keep_alive, model)
+            span.set(prompt_bytes=len(body))
+            async with self._slot(backend, priority, span):
+                with self.pool.lease(backend):
+                    async with self._get_session().post(backend.url, data=body, headers=JSON_HEADERS, timeout=self._request_timeout()) as response:
+                        # check for errors before processing
+                        if response.status != 200:
+                            error_text = await response.text()
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history, status=response.status, message=f"{response.status} {error_text}"
+                            )
+
+                        # NDJSON: one chunk per line
+                        async for line in response.content:
+                            line = line.strip()
+                            if line:
+                                chunk_data = json.loads(line)
+                                if chunk_data.get("done"):
+                                    span.set(**eval_stats(chunk_data))      # final chunk carries eval counts
+                                if "message" in chunk_data and "content" in chunk_data["message"]:
+                                    if first_token:
+                                        first_token = False
+                                        span.set(ttft_s=round(time.perf_counter() - started, 4))
+                                    yield chunk_data["message"]["content"]
+            ok = True
+        except GeneratorExit:
+            # the caller stopped reading (e.g. it had what it needed), not a failure
+            ok = True
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(started, ok)
+            span.end(error)
+
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+_default_client = None
+_default_client_lock = threading.Lock()
+
+# aiohttp sessions are bound to a loop, so keep one async client per loop
+_default_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_default_pool() -> BackendPool:
+    """ Process-wide pool over OLLAMA_URLS, so sync and async clients share load and affinity """
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = BackendPool(OLLAMA_URLS)
+    return _default_pool
+
+
+def get_default_client() -> LLMClient:
+    """ Process-wide shared client, created lazily """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = LLMClient()
+    return _default_client
+
+
+def get_default_async_client() -> AsyncLLMClient:
+    """ Shared async client for the currently running event loop """
+    loop = asyncio.get_running_loop()
+    client = _default_async_clients.get(loop)
+    if client is None:
+        client = AsyncLLMClient()
+        _default_async_clients[loop] = client
+    return client
+
+
+async def close_default_async_client():
+    """ Close the running loop's shared async client (call before the loop shuts down) """
+    client = _default_async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -0,0 +1,255 @@
+import sys
+import math
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, List
+
+from .llm_client import get_default_client
+from .node_config import get_node_config
+from .prompt_builder import ChatMessage
+
+# rough per-message overhead for role markers / template tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# read-only so every memory can share it instead of holding its own copy
+DEFAULT_BUDGETS = MappingProxyType({
+    "planner": 512,       # planner only needs the gist of recent turns
+    "react": 768,
+    "answer": 2048,
+    "default": 2048,
+})
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate, no model call.
+
+    ~4 characters per token for English text, but never fewer tokens than
+    whitespace-separated words.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), len(text.split()))
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+class Message:
+    """
+    Compact stored history message.
+
+    A plain dict costs ~4x the memory of a slotted record; roles are
+    interned so every "user" / "assistant" in every session is the same
+    string object, and the token estimate is computed once on add.
+
+    The dict view handed to nodes is built on first use and then shared by
+    every node and every later turn, together with its cached JSON bytes,
+    until drop_view() frees it again (see ConversationMemory.compact()).
+    """
+
+    __slots__ = ("role", "content", "tokens", "_view")
+
+    def __init__(self, role: str, content: str):
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self._view = None
+
+    def as_dict(self) -> ChatMessage:
+        view = self._view
+        if view is None:
+            view = self._view = ChatMessage(self.role, self.content)
+        return view
+
+    def drop_view(self):
+        self._view = None
+
+
+def summarize_with_llm(previous_summary: str, messages: List[dict]) -> str:
+    """ Default summarizer: fold new turns into the running summary via the LLM """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Update the running summary of a conversation between a user and an assistant.\n"
+        "Keep names, numbers, places and open questions. Be brief (max 5 sentences).\n"
+        "\n"
+        f"Current summary:\n{previous_summary or '(empty)'}\n"
+        "\n"
+        f"New turns:\n{transcript}\n"
+        "\n"
+        "Updated summary:"
+    )
+    # raw client call so failures raise (and the batch is retried) instead of becoming the summary
+    config = get_node_config("summarizer")
+    return get_default_client().chat([{"role": "user", "content": prompt}], options=config.options, keep_alive=config.keep_alive, model=config.model, priority=config.priority)
+
+
+class ConversationMemory:
+    """
+    Token-budgeted conversation history with a running summary.
+
+    Keeps recent messages verbatim and folds older ones into a summary in a
+    background thread, so the prompt each node sends stays bounded instead
+    of growing with every turn.
+
+    Each consumer (planner, answer, ...) asks for its own window via
+    messages_for(consumer); windows are filled newest-first until that
+    consumer's budget is spent. Messages that no longer fit in the largest
+    budget are summarized and dropped.
+
+    Like the plain list it replaces, the returned window ends with the
+    current user message.
+
+    Messages are kept as slotted Message records and only turned into dicts
+    for the window; compact() drops those dicts again once the conversation
+    goes quiet, so an idle conversation stays small. An optional
+    journal (see session_store.py) is told about every message and summary
+    so the conversation can be persisted and resumed.
+    """
+
+    __slots__ = ("budgets", "summarize_fn", "fold_batch", "background", "journal",
+                 "_lock", "_messages", "_summary", "_summary_message", "_folded", "_summarizing", "_idle", "_has_views")
+
+    def __init__(
+            self,
+            budgets: Dict[str, int] = None,
+            summarize_fn: Callable[[str, List[dict]], str] = summarize_with_llm,
+            fold_batch: int = 4,
+            background: bool = True,
+            journal=None,
+    ):
+        self.budgets = DEFAULT_BUDGETS if budgets is None else dict(budgets)
+        self.summarize_fn = summarize_fn
+        self.fold_batch = fold_batch
+        self.background = background
+        self.journal = journal
+
+        self._lock = threading.Lock()
+        self._messages = []         # verbatim Message records not yet folded into the summary
+        self._summary = ""
+        self._summary_message = None   # Message record for _summary (tokens + cached view)
+        self._folded = 0            # messages folded into the summary so far (= seq of _messages[0])
+        self._summarizing = False
+        self._idle = None           # Event while a fold runs, created on demand
+        self._has_views = False     # messages_for() ran since the last compact()
+
+    def add(self, role: str, content: str):
+        message = Message(role, content)
+        with self._lock:
+            seq = self._folded + len(self._messages)
+            self._messages.append(message)
+        if self.journal is not None:
+            self.journal.append(seq, message.role, content)
+        self._maybe_fold()
+
+    def restore(self, summary: str, folded: int, messages: List[tuple]):
+        """ Load persisted state: summary, number of folded messages, [(role, content)] after them """
+        with self._lock:
+            self._summary = summary or ""
+            self._summary_message = self._make_summary_message(self._summary)
+            self._folded = folded
+            self._messages = [Message(role, content) for role, content in messages]
+
+    def messages_for(self, consumer: str = "default") -> List[dict]:
+        """ Window of recent messages (plus summary) that fits the consumer's budget """
+        budget = self.budgets.get(consumer, self.budgets["default"])
+
+        window = []
+        with self._lock:
+            self._has_views = True
+            summary_message = self._summary_message
+            if summary_message is not None:
+                budget -= summary_message.tokens
+
+            # newest first, always keep the current message
+            for message in reversed(self._messages):
+                cost = message.tokens
+                if window and cost > budget:
+                    break
+                window.append(message.as_dict())
+                budget -= cost
+
+        if summary_message is not None:
+            window.append(summary_message.as_dict())
+        window.reverse()
+        return window
+
+    def compact(self) -> bool:
+        """ Free the cached dict views / JSON bytes (rebuilt by the next messages_for()), False if there were none """
+        with self._lock:
+            if not self._has_views:
+                return False
+            for message in self._messages:
+                message.drop_view()
+            if self._summary_message is not None:
+                self._summary_message.drop_view()
+            self._has_views = False
+            return True
+
+    @staticmethod
+    def _make_summary_message(summary: str):
+        return Message("system", f"Summary of the earlier conversation: {summary}") if summary else None
+
+    @property
+    def summary(self) -> str:
+        with self._lock:
+            return self._summary
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._messages)
+
+    def _overflow(self) -> int:
+        """ Number of oldest messages that fall outside the largest window """
+        budget = max(self.budgets.values())
+        used = estimate_tokens(self._summary) + MESSAGE_OVERHEAD_TOKENS if self._summary else 0
+        kept = 0
+        for message in reversed(self._messages):
+            used += message.tokens
+            if used > budget and kept:
+                break
+            kept += 1
+        return len(self._messages) - kept
+
+    def _maybe_fold(self):
+        with self._lock:
+            if self._summarizing or self.summarize_fn is None:
+                return
+            count = self._overflow()
+            if count < self.fold_batch:
+                return
+            batch = self._messages[:count]
+            previous = self._summary
+            self._summarizing = True
+            self._idle = threading.Event()
+
+        if self.background:
+            threading.Thread(target=self._fold, args=(previous, batch), daemon=True).start()
+        else:
+            self._fold(previous, batch)
+
+    def _fold(self, previous: str, batch: List[Message]):
+        try:
+            summary = self.summarize_fn(previous, [m.as_dict() for m in batch]).strip()
+        except Exception:
+            summary = None
+
+        with self._lock:
+            if summary:
+                # only appends happen meanwhile, so the batch is still at the front
+                del self._messages[:len(batch)]
+                self._summary = summary
+                self._summary_message = self._make_summary_message(summary)
+                self._folded += len(batch)
+                folded = self._folded
+            self._summarizing = False
+            idle, self._idle = self._idle, None
+        if summary and self.journal is not None:
+            self.journal.summarized(summary, folded)
+        idle.set()
+
+    def wait_for_summary(self, timeout: float = None) -> bool:
+        """ Block until no background summarization is running """
+        idle = self._idle
+        return True if idle is None else idle.wait(timeout)
@@ -0,0 +1,95 @@
+import os
+import json
+
+from chatbot.utils.scheduler import PRIORITY_INTERACTIVE, PRIORITY_ANSWER, PRIORITY_BACKGROUND, PRIORITY_NAMES
+
+
+class NodeLLMConfig:
+    """
+    Per-node Ollama request settings.
+
+    Attr:
+    - keep_alive: how long Ollama keeps the model loaded after the request
+      (e.g. "30m", -1 = forever). Keeping it loaded avoids a cold reload
+      and keeps the prompt cache warm between turns.
+    - num_ctx: context window; must be the same on every call of a node or
+      Ollama reloads the model and drops its cache
+    - options: extra generation options (num_predict, temperature, ...)
+    - model: model for this node (None = the client's model)
+    - escalate_model: bigger model to retry with when this node's output
+      fails validation (None = no escalation)
+    - priority: LLMScheduler priority of this node's requests (lower is
+      served first; "interactive", "answer" or "background" in JSON)
+    """
+
+    def __init__(self, keep_alive=None, num_ctx: int = None, options: dict = None, model: str = None, escalate_model: str = None, priority: int = PRIORITY_ANSWER):
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self._options = dict(options or {})
+        self.model = model
+        self.escalate_model = escalate_model
+        self.priority = PRIORITY_NAMES.index(priority) if isinstance(priority, str) else priority
+
+    @property
+    def options(self) -> dict:
+        """ Ollama `options` payload for this node """
+        options = dict(self._options)
+        if self.num_ctx is not None:
+            options["num_ctx"] = self.num_ctx
+        return options
+
+
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+DEFAULT_NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", "4096"))
+
+
+def _env_model(node: str, kind: str = "MODEL"):
+    """ e.g. OLLAMA_PLANNER_MODEL=gemma3:1b, OLLAMA_PLANNER_ESCALATE_MODEL=gemma3:4b """
+    return os.environ.get(f"OLLAMA_{node.upper()}_{kind}") or None
+
+
+# planning / react steps are short JSON, latency-critical -> small model, greedy decoding;
+# answers are where quality matters -> point OLLAMA_ANSWER_MODEL at a bigger model
+NODE_CONFIGS = {
+    "planner": NodeLLMConfig(DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, {"num_predict": 256, "temperature": 0},
+                             model=_env_model("planner"), escalate_model=_env_model("planner", "ESCALATE_MODEL"), priority=PRIORITY_INTERACTIVE),
+    "react": NodeLLMConfig(DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, {"num_predict": 256, "temperature": 0}, model=_env_model("react"), priority=PRIORITY_INTERACTIVE),
+    "answer": NodeLLMConfig(DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, model=_env_model("answer")),
+    "unified": NodeLLMConfig(DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, model=_env_model("unified")),
+    "summarizer": NodeLLMConfig(DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, {"num_predict": 200}, model=_env_model("summarizer"), priority=PRIORITY_BACKGROUND),
+    "default": NodeLLMConfig(DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX),
+}
+
+
+def load_node_configs(path: str):
+    """
+    Override NODE_CONFIGS from a JSON routing file, e.g.
+
+        {
+          "planner": {"model": "gemma3:1b", "escalate_model": "gemma3:4b", "options": {"num_predict": 200}},
+          "answer": {"model": "gemma3:12b", "options": {"temperature": 0.7}, "num_ctx": 8192, "priority": "answer"}
+        }
+
+    Keys left out keep their current value; options are merged.
+    """
+    with open(path, encoding="utf-8") as f:
+        routes = json.load(f)
+
+    for node, route in routes.items():
+        current = NODE_CONFIGS.get(node, NODE_CONFIGS["default"])
+        NODE_CONFIGS[node] = NodeLLMConfig(
+            keep_alive=route.get("keep_alive", current.keep_alive),
+            num_ctx=route.get("num_ctx", current.num_ctx),
+            options={**current._options, **route.get("options", {})},
+            model=route.get("model", current.model),
+            escalate_model=route.get("escalate_model", current.escalate_model),
+            priority=route.get("priority", current.priority),
+        )
+
+
+if os.environ.get("OLLAMA_NODE_CONFIG"):
+    load_node_configs(os.environ["OLLAMA_NODE_CONFIG"])
+
+
+def get_node_config(node: str) -> NodeLLMConfig:
+    return NODE_CONFIGS.get(node, NODE_CONFIGS["default"])
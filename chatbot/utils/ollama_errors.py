@@ -1,5 +1,18 @@
+from .resilience import CircuitOpenError, DeadlineExceeded
+from .scheduler import Overloaded
+
+
 def format_ollama_error(exc: Exception) -> str:
     """Formats Gemini API errors into user-friendly messages."""
+    if isinstance(exc, CircuitOpenError):
+        return "The AI service is unavailable right now. Please try again in a moment."
+
+    if isinstance(exc, Overloaded):
+        return "I'm handling a lot of conversations right now. Please try again in a moment."
+
+    if isinstance(exc, DeadlineExceeded):
+        return "That took too long to answer. Please try again."
+
     msg = (str(exc) or "").lower()
 
     if "resource_exhausted" in msg or "429" in msg or "quota" in msg:
@@ -0,0 +1,221 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+def normalize_message(message: str) -> str:
+    """ Lowercase, collapse whitespace and drop trailing punctuation """
+    message = re.sub(r"\s+", " ", message.lower()).strip()
+    return message.rstrip("?!. ")
+
+
+def catalog_version(tools: Dict[str, str]) -> str:
+    """ Short hash of the tool catalog, changes whenever a tool is added/edited """
+    blob = json.dumps(tools, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def plan_uses_known_tools(plan: dict, tools: Dict[str, str]) -> bool:
+    """ True if every tool named in the plan still exists in the catalog """
+    action = plan.get("action")
+    if action == "answer_direct":
+        return True
+    if action == "use_tool":
+        return plan.get("tool") in tools
+    if action == "use_tools":
+        steps = plan.get("steps")
+        return isinstance(steps, list) and bool(steps) and all(
+            isinstance(step, dict) and step.get("tool") in tools for step in steps
+        )
+    return False
+
+
+class SqlitePlanStore:
+    """
+    On-disk backend so cached plans survive restarts.
+
+    One row per key: (key, plan_json, expires_at). Expired rows are
+    ignored on load and removed lazily.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self, limit: int):
+        """ Most recently expiring live entries, oldest first (LRU order) """
+        with self._lock:
+            self._conn.execute("DELETE FROM plans WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT key, plan, expires_at FROM plans ORDER BY expires_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return list(reversed(rows))
+
+    def put(self, key: str, plan_json: str, expires_at: float):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?)", (key, plan_json, expires_at))
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class PlanCache:
+    """
+    Bounded LRU + TTL cache of planner outputs.
+
+    Key = hash(tool catalog version, normalized user message, optional digest
+    of the last `history_turns` history messages). Adding or changing a tool
+    changes the catalog version, so old plans simply stop matching. With a
+    ToolRegistry as `tools` the version is read at lookup time (and cached
+    by the registry until it changes), so tools registered at runtime count.
+
+    The planner sees the whole conversation, so by default (history_turns
+    None) only turns without earlier history are cached: "and tomorrow?"
+    must not reuse a plan made for a different conversation.
+
+    Plans are stored as JSON so every get() returns a fresh dict, and are
+    re-validated on the way out: a plan naming a tool that no longer exists
+    is dropped instead of being executed.
+
+    Attr:
+    - tools: ToolRegistry (live catalog) or a fixed {tool name: description} dict
+    - max_entries: LRU capacity
+    - ttl: seconds a plan stays valid
+    - history_turns: previous messages that take part in the key; None = only
+      cache turns with no earlier history, 0 = ignore history entirely
+    - store: optional SqlitePlanStore for persistence
+    """
+
+    def __init__(
+            self,
+            tools,
+            max_entries: int = 512,
+            ttl: float = 3600.0,
+            history_turns: int = None,
+            store: SqlitePlanStore = None,
+            validate_fn: Callable[[dict, Dict[str, str]], bool] = plan_uses_known_tools,
+    ):
+        self.tools = tools
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.history_turns = history_turns
+        self.store = store
+        self.validate_fn = validate_fn
+        self._fixed_catalog = None if self._live else catalog_version(tools)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # key -> (plan_json, expires_at)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalid": 0, "bypassed": 0}
+
+        if store is not None:
+            for key, plan_json, expires_at in store.load(max_entries):
+                self._entries[key] = (plan_json, expires_at)
+
+    @property
+    def _live(self) -> bool:
+        return callable(getattr(self.tools, "descriptions", None))
+
+    def _tool_table(self) -> Dict[str, str]:
+        """ {tool name: description} as of now """
+        return self.tools.descriptions() if self._live else self.tools
+
+    @property
+    def catalog(self) -> str:
+        if not self._live:
+            return self._fixed_catalog
+        return self.tools.derived("plan_cache_catalog", lambda reg: catalog_version(reg.descriptions()))
+
+    def make_key(self, user_message: str, conversation_history: list = None) -> str:
+        parts = [self.catalog, normalize_message(user_message)]
+
+        if self.history_turns and conversation_history:
+            # history includes the current user message as last item
+            recent = conversation_history[:-1][-self.history_turns:]
+            parts.append(json.dumps(recent, sort_keys=True))
+
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def applies(self, conversation_history: list = None) -> bool:
+        """ False when the plan may depend on earlier history the key doesn't cover """
+        # history includes the current user message as last item
+        return self.history_turns is not None or not conversation_history or len(conversation_history) <= 1
+
+    def get(self, user_message: str, conversation_history: list = None) -> Optional[dict]:
+        if not self.applies(conversation_history):
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return None
+        key = self.make_key(user_message, conversation_history)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            plan_json, expires_at = entry
+            plan = json.loads(plan_json)
+
+            if expires_at <= time.time():
+                reason = "expired"
+            elif not self.validate_fn(plan, self._tool_table()):
+                reason = "invalid"
+            else:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return plan
+
+            # stale or no longer valid -> drop it, never execute it
+            del self._entries[key]
+            self._stats[reason] += 1
+            self._stats["misses"] += 1
+
+        if self.store is not None:
+            self.store.delete(key)
+        return None
+
+    def put(self, user_message: str, plan: dict, conversation_history: list = None):
+        if not self.applies(conversation_history) or not self.validate_fn(plan, self._tool_table()):
+            return
+
+        key = self.make_key(user_message, conversation_history)
+        plan_json = json.dumps(plan)
+        expires_at = time.time() + self.ttl
+        evicted = []
+
+        with self._lock:
+            self._entries[key] = (plan_json, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+                self._stats["evictions"] += 1
+
+        if self.store is not None:
+            self.store.put(key, plan_json, expires_at)
+            for old_key in evicted:
+                self.store.delete(old_key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]          # bypassed turns aren't lookups
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
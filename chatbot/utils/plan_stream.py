@@ -0,0 +1,139 @@
+import json
+import re
+from typing import List, Tuple
+
+_KEY_RE = re.compile(r'^\s*"((?:[^"\\]|\\.)*)"\s*:\s*$', re.S)
+
+
+def _slice(buf: str, start, end):
+    # start is None once that value was already reported
+    return None if start is None else buf[start:end]
+
+
+class PlanStreamParser:
+    """
+    Incremental scanner for planner JSON arriving token by token.
+
+    Reports pieces of the plan as soon as they are syntactically complete,
+    without waiting for the closing brace:
+    - ("field", key, value) for each finished top-level member
+      ("action", "tool", "args", ...)
+    - ("step", i, step) for each finished object inside "steps"
+
+    Only complete JSON values are ever json.loads()'d, so a truncated or
+    invalid stream just stops producing events; the caller still parses
+    and validates the full text at the end.
+
+        parser = PlanStreamParser()
+        for chunk in stream:
+            for event in parser.feed(chunk): ...
+
+    end is None until the top-level object closed, then the offset in raw
+    just past its closing brace (anything after it can be dropped).
+    """
+
+    def __init__(self):
+        self.text = []                  # chunks so far
+        self._buf = ""
+        self._pos = 0                   # next char of _buf to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False           # first "{" seen (skips code fences / preamble)
+        self._member_start = None       # start of the current top-level member
+        self._in_steps = False          # scanning inside the "steps" array
+        self._element_start = None      # start of the current steps element
+        self._steps = 0
+        self.fields = {}
+        self.end = None
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        self.text.append(chunk)
+        self._buf += chunk
+        events = []
+
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                if self._started:
+                    self._in_string = True
+            elif ch in "{[":
+                if not self._started:
+                    if ch == "{":
+                        self._started = True
+                        self._depth = 1
+                        self._member_start = i + 1
+                    continue
+                if self._depth == 1 and ch == "[" and self._key(buf[self._member_start:i]) == "steps":
+                    self._in_steps = True
+                    self._element_start = i + 1
+                self._depth += 1
+            elif ch in "}]" and self._started:
+                if self._in_steps and self._depth == 3 and ch == "}":
+                    # step object closed: report it now, not at the next "," / "]"
+                    self._element(_slice(buf, self._element_start, i + 1), events)
+                    self._element_start = None
+                elif self._in_steps and self._depth == 2 and ch == "]":
+                    self._element(_slice(buf, self._element_start, i), events)
+                    self._in_steps = False
+                self._depth -= 1
+                if self._depth == 1:
+                    # object / array value closed (e.g. "args"), same idea
+                    self._member(_slice(buf, self._member_start, i + 1), events)
+                    self._member_start = None
+                elif self._depth == 0:
+                    self._member(_slice(buf, self._member_start, i), events)
+                    self._started = False       # plan closed, ignore trailing text
+                    if self.end is None:
+                        self.end = i + 1
+            elif ch == "," and self._started:
+                if self._depth == 1:
+                    self._member(_slice(buf, self._member_start, i), events)
+                    self._member_start = i + 1
+                elif self._in_steps and self._depth == 2:
+                    self._element(_slice(buf, self._element_start, i), events)
+                    self._element_start = i + 1
+
+        self._pos = len(buf)
+        return events
+
+    @property
+    def raw(self) -> str:
+        return "".join(self.text)
+
+    @staticmethod
+    def _key(prefix: str):
+        match = _KEY_RE.match(prefix)
+        return match.group(1) if match else None
+
+    def _member(self, text: str, events: list):
+        if text is None or not text.strip():
+            return
+        try:
+            member = json.loads("{" + text + "}")
+        except json.JSONDecodeError:
+            return
+        for key, value in member.items():
+            self.fields[key] = value
+            events.append(("field", key, value))
+
+    def _element(self, text: str, events: list):
+        if text is None or not text.strip():
+            return
+        try:
+            step = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        if isinstance(step, dict):
+            events.append(("step", self._steps, step))
+        self._steps += 1
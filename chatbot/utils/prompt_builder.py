@@ -0,0 +1,92 @@
+import json
+from typing import List
+
+
+class ChatMessage(dict):
+    """
+    Chat message dict that remembers its own JSON encoding.
+
+    History messages, system prompts and summaries are built once and then
+    shared by every node on every turn, so their bytes are encoded once
+    too; encode_messages() only has to json.dumps() what is new. Treat
+    instances as immutable: mutating one would leave a stale encoding.
+    """
+
+    __slots__ = ("encoded",)
+
+    def __init__(self, role: str, content: str):
+        super().__init__(role=role, content=content)
+        self.encoded = None
+
+
+def encode_message(message: dict) -> bytes:
+    encoded = getattr(message, "encoded", None)
+    if encoded is None:
+        encoded = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        if isinstance(message, ChatMessage):
+            message.encoded = encoded
+    return encoded
+
+
+def encode_messages(messages: List[dict]) -> bytes:
+    """ JSON array of messages; cached messages cost a memcpy, only new ones are encoded """
+    return b"[" + b", ".join([encode_message(m) for m in messages]) + b"]"
+
+
+class PromptLayout:
+    """
+    Assembles chat messages so consecutive turns share a byte-stable prefix.
+
+    Layout:
+        [system prompt]            built once, identical every call
+        [older history ...]        messages exactly as stored in history
+        [current user message]     verbatim, same as it will appear in history next turn
+        [volatile tail]            optional: tool output, observations, cues
+
+    Ollama reuses its KV cache for the longest common prefix with the
+    previous prompt. Keeping the per-call parts only at the very end means
+    the next turn's prompt extends this one instead of diverging early
+    (e.g. at a user message that was wrapped with tool output).
+
+    History messages are passed through by reference (no per-turn dict
+    copies), and the system prompt is one shared ChatMessage.
+    """
+
+    def __init__(self, system_prompt: str, tail_role: str = "system"):
+        self.system_prompt = system_prompt
+        self.tail_role = tail_role
+        self._system_message = ChatMessage("system", system_prompt)
+
+    def build(self, user_message: str, conversation_history: list = None, tail: str = None) -> List[dict]:
+        """
+        Args:
+            user_message: current user message (sent verbatim)
+            conversation_history: history whose last item is the current user message
+            tail: volatile per-call text appended after the user message
+
+        Returns:
+            list of message dicts
+        """
+        messages = [self._system_message]
+
+        # add all previous messages except last user message
+        if conversation_history:
+            messages.extend(conversation_history[:-1])
+
+        # reuse the stored message when it is the current one, its bytes are cached
+        last = conversation_history[-1] if conversation_history else None
+        if isinstance(last, ChatMessage) and last.get("role") == "user" and last.get("content") == user_message:
+            messages.append(last)
+        else:
+            messages.append(ChatMessage("user", user_message))
+
+        if tail:
+            messages.append(ChatMessage(self.tail_role, tail))
+        return messages
+
+    @staticmethod
+    def stable_prefix(messages: List[dict], tail: str = None) -> List[dict]:
+        """ Messages that should be reused verbatim by the next turn (everything but the tail) """
+        if tail and messages and messages[-1].get("content") == tail:
+            return messages[:-1]
+        return messages
@@ -0,0 +1,401 @@
+"""
+Retry, deadline and circuit-breaker helpers for LLM and tool calls.
+
+- RetryPolicy: attempts + full-jitter exponential backoff + which errors retry
+- Deadline / deadline_scope(): one time budget per turn, shared by every
+  planner / tool / answer call made inside the scope (thread pools started
+  with contextvars.copy_context() and asyncio.to_thread inherit it)
+- CircuitBreaker / get_breaker(): per-backend breaker that fails fast while
+  Ollama is down instead of letting every worker sleep through retries
+- retry_call / aretry_call / retry_stream / aretry_stream: run a call under
+  all of the above (sync and asyncio versions)
+"""
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from typing import Any, Awaitable, Callable, Iterator, AsyncIterator
+
+import aiohttp
+import requests
+
+# HTTP statuses worth another attempt (overload / gateway / transient server errors)
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(ConnectionError):
+    """ Raised without touching the network while a backend's breaker is open """
+
+
+class DeadlineExceeded(TimeoutError):
+    """ The turn's time budget ran out before (or between) attempts """
+
+
+def _status_of(exc: BaseException):
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    True for failures another attempt may fix: connection errors, timeouts
+    and retryable HTTP statuses. Client errors (400, 404 ...), open
+    breakers and exhausted deadlines are final.
+    """
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(exc, (
+        ConnectionError,
+        TimeoutError,
+        requests.ConnectionError,
+        requests.Timeout,
+        aiohttp.ClientConnectionError,
+        aiohttp.ServerTimeoutError,
+    ))
+
+
+class RetryPolicy:
+    """
+    How often and how long to retry.
+
+    Attr:
+    - max_attempts: total attempts including the first
+    - base_delay / max_delay: backoff cap grows base_delay * multiplier^n up to max_delay
+    - retry_on: exc -> bool, which failures are retried
+    """
+
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            base_delay: float = 0.25,
+            max_delay: float = 4.0,
+            retry_on: Callable[[BaseException], bool] = is_retryable,
+            multiplier: float = 2.0,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.multiplier = multiplier
+
+    def backoff(self, attempt: int) -> float:
+        """ Full jitter: uniform(0, cap) so retrying clients don't move in lockstep """
+        cap = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class Deadline:
+    """ Absolute point in time a turn must finish by """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def cap(self, timeout: float) -> float:
+        """ timeout shortened to what is left of the budget """
+        return min(timeout, self.remaining())
+
+
+_current_deadline = contextvars.ContextVar("turn_deadline", default=None)
+
+
+def current_deadline():
+    """ Deadline of the running turn, or None """
+    return _current_deadline.get()
+
+
+class deadline_scope:
+    """
+    `with deadline_scope(30):` - every call inside shares a 30 s budget.
+
+    Nested scopes never extend an outer, tighter deadline. seconds=None
+    leaves the current deadline untouched.
+    """
+
+    def __init__(self, seconds: float = None):
+        self.seconds = seconds
+        self._token = None
+
+    def __enter__(self):
+        outer = _current_deadline.get()
+        if self.seconds is None:
+            return outer
+        deadline = Deadline(self.seconds)
+        if outer is not None and outer.expires_at < deadline.expires_at:
+            deadline = outer
+        self._token = _current_deadline.set(deadline)
+        return deadline
+
+    def __exit__(self, *exc):
+        if self._token is not None:
+            try:
+                _current_deadline.reset(self._token)
+            except ValueError:
+                pass        # generator finalised from another context, nothing to restore
+        return False
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; while open
+    calls fail immediately with CircuitOpenError. After `reset_timeout`
+    seconds one probe call is let through (half-open): success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, name: str = "backend", failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return self._state
+
+    def before_call(self):
+        """ Raises CircuitOpenError if the call must not go out """
+        with self._lock:
+            if self._state == "closed":
+                return
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._stats["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["opened"] += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """ Call finished with a non-backend error (e.g. 400): neither success nor failure """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["consecutive_failures"] = self._failures
+        stats["state"] = self.state
+        return stats
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """ Shared breaker per backend (keyed by e.g. host:port) """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def _settle(breaker: CircuitBreaker, exc: BaseException, policy: RetryPolicy) -> bool:
+    """ Update the breaker for a failed attempt, returns whether it is retryable """
+    retryable = policy.retry_on(exc)
+    if breaker is not None:
+        if retryable:
+            breaker.record_failure()
+        else:
+            breaker.release()
+    return retryable
+
+
+def _next_delay(policy: RetryPolicy, attempt: int, deadline: Deadline, exc: BaseException) -> float:
+    """ Backoff before the next attempt; raises if there is no attempt or budget left """
+    if attempt >= policy.max_attempts:
+        raise exc
+    delay = policy.backoff(attempt)
+    if deadline is not None and delay >= deadline.remaining():
+        raise DeadlineExceeded(f"turn deadline exceeded while retrying: {exc}") from exc
+    return delay
+
+
+def _check_deadline(deadline: Deadline):
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded("turn deadline exceeded")
+
+
+def retry_call(func: Callable[[], Any], policy: RetryPolicy, breaker: CircuitBreaker = None, on_retry: Callable = None) -> Any:
+    """
+    Run func() with retries, backoff, the current turn deadline and an
+    optional circuit breaker.
+
+    Args:
+        func: zero-arg callable doing one attempt
+        policy: RetryPolicy
+        breaker: optional CircuitBreaker of the backend func talks to
+        on_retry: optional callback(attempt, exc, delay) before sleeping
+
+    Raises:
+        the last error, CircuitOpenError or DeadlineExceeded
+    """
+    deadline = current_deadline()
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_deadline(deadline)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            if not _settle(breaker, e, policy):
+                raise
+            delay = _next_delay(policy, attempt, deadline, e)
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+            continue
+        except BaseException:
+            # cancelled / interrupted: don't leave a half-open probe claimed
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+async def aretry_call(func: Callable[[], Awaitable], policy: RetryPolicy, breaker: CircuitBreaker = None, on_retry: Callable = None) -> Any:
+    """ asyncio twin of retry_call; backoff awaits instead of blocking a thread """
+    deadline = current_deadline()
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_deadline(deadline)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await func()
+        except Exception as e:
+            if not _settle(breaker, e, policy):
+                raise
+            delay = _next_delay(policy, attempt, deadline, e)
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # cancelled / interrupted: don't leave a half-open probe claimed
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+def retry_stream(func: Callable[[], Iterator], policy: RetryPolicy, breaker: CircuitBreaker = None) -> Iterator:
+    """
+    retry_call for streams: an attempt is retried only if it failed before
+    its first chunk; once anything was yielded the error propagates.
+    """
+    deadline = current_deadline()
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_deadline(deadline)
+        if breaker is not None:
+            breaker.before_call()
+        started = False
+        try:
+            for chunk in func():
+                if not started:
+                    started = True
+                    if breaker is not None:
+                        breaker.record_success()
+                yield chunk
+        except Exception as e:
+            if started:
+                raise
+            if not _settle(breaker, e, policy):
+                raise
+            time.sleep(_next_delay(policy, attempt, deadline, e))
+            continue
+        except BaseException:
+            # consumer closed the stream / task cancelled before the first chunk
+            if not started and breaker is not None:
+                breaker.release()
+            raise
+        if not started and breaker is not None:
+            breaker.record_success()
+        return
+
+
+async def aretry_stream(func: Callable[[], AsyncIterator], policy: RetryPolicy, breaker: CircuitBreaker = None) -> AsyncIterator:
+    """ asyncio twin of retry_stream """
+    deadline = current_deadline()
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_deadline(deadline)
+        if breaker is not None:
+            breaker.before_call()
+        started = False
+        try:
+            async for chunk in func():
+                if not started:
+                    started = True
+                    if breaker is not None:
+                        breaker.record_success()
+                yield chunk
+        except Exception as e:
+            if started:
+                raise
+            if not _settle(breaker, e, policy):
+                raise
+            await asyncio.sleep(_next_delay(policy, attempt, deadline, e))
+            continue
+        except BaseException:
+            # consumer closed the stream / task cancelled before the first chunk
+            if not started and breaker is not None:
+                breaker.release()
+            raise
+        if not started and breaker is not None:
+            breaker.record_success()
+        return
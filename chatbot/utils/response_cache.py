@@ -0,0 +1,342 @@
+"""
+Cache of streamed LLM answers, with identical in-flight requests sharing
+one upstream stream.
+
+    cache = ResponseCache(ttl=3600, similarity=0.9)
+    for chunk in call_llm_stream(messages=messages, cache=cache): ...
+
+- exact hits: key = model + options + canonical messages (role + content,
+  whitespace collapsed)
+- near-duplicates (similarity set): the last user message is compared by
+  shingle cosine against cached answers that share everything else in the
+  prompt (system prompt, other messages, model, options)
+- coalescing: the first request for a key starts a pump that reads the
+  upstream stream into a shared buffer; it and every identical request
+  arriving meanwhile replay that buffer as it grows. A reader that goes
+  away doesn't disturb the others; when all of them are gone the upstream
+  stream is closed and nothing is cached.
+
+Hits replay the stored chunks in order, so consumers see the same chunk
+stream they would get from Ollama. Only complete, error-free answers are
+stored.
+"""
+import re
+import math
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Callable, Iterator, List
+
+
+def shingle_embedding(text: str, size: int = 3) -> Counter:
+    """ Character shingle counts of the normalized text (no model needed) """
+    text = f"  {re.sub(r'[^a-z0-9 ]', '', text.lower()).strip()}  "
+    return Counter(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def _canonical(message: dict) -> list:
+    return [message.get("role"), re.sub(r"\s+", " ", message.get("content") or "").strip()]
+
+
+def _digest(*parts) -> str:
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _Abandoned(Exception):
+    """ Every reader left before the upstream stream finished """
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Flight:
+    """ One upstream stream being read, and the chunks it produced so far """
+
+    __slots__ = ("chunks", "done", "error", "readers", "cond", "_async_waiters")
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.readers = 0                # guarded by the cache lock
+        self.cond = threading.Condition()
+        self._async_waiters = []        # (loop, future) of async readers waiting for more
+
+    def _notify(self):
+        # caller holds cond
+        self.cond.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._async_waiters = []
+
+    def append(self, chunk: str):
+        with self.cond:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, error: BaseException = None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    def replay(self) -> Iterator[str]:
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                new, done, error = self.chunks[i:], self.done, self.error
+            i += len(new)
+            yield from new
+            if done and i >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def areplay(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        i = 0
+        while True:
+            future = None
+            with self.cond:
+                new, done, error = self.chunks[i:], self.done, self.error
+                if not new and not done:
+                    future = loop.create_future()
+                    self._async_waiters.append((loop, future))
+            if future is not None:
+                await future
+                continue
+            i += len(new)
+            for chunk in new:
+                yield chunk
+            if done and i >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of streamed answers with in-flight fan-out.
+
+    Attr:
+    - max_entries: LRU capacity
+    - ttl: seconds an answer stays valid
+    - similarity: cosine threshold for near-duplicate questions (None = exact only)
+    - embed_fn: text -> Counter-like sparse vector (default: character shingles)
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, similarity: float = None, embed_fn: Callable = shingle_embedding):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed_fn = embed_fn
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # key -> (chunks, expires_at, context, vector)
+        self._contexts = {}                 # context -> set of keys (near-duplicate candidates)
+        self._in_flight = {}                # key -> _Flight
+        self._pumps = set()                 # running async pumps (the loop only keeps weak references)
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0, "abandoned": 0}
+
+    def make_keys(self, messages: List[dict], model: str = None, options: dict = None):
+        """
+        Returns:
+            (exact key, context key, question) where context covers
+            everything but the last user message
+        """
+        canonical = [_canonical(m) for m in messages]
+        last_user = max((i for i, m in enumerate(canonical) if m[0] == "user"), default=None)
+        question = canonical[last_user][1] if last_user is not None else ""
+        context = [m if i != last_user else ["user", None] for i, m in enumerate(canonical)]
+        return _digest(model, options, canonical), _digest(model, options, context), question
+
+    def stream(self, messages: List[dict], model: str, options: dict, compute_fn: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        Cached answer for messages, else the shared upstream stream.
+
+        Args:
+            compute_fn: starts the upstream stream (called at most once per key at a time)
+        """
+        cached, flight, keys = self._lookup(messages, model, options)
+        if cached is not None:
+            yield from cached
+            return
+        if keys is not None:
+            context = contextvars.copy_context()        # turn deadline, session, trace parent
+            threading.Thread(target=context.run, args=(self._pump, keys, flight, compute_fn), name="response-pump", daemon=True).start()
+        try:
+            yield from flight.replay()
+        finally:
+            self._leave(flight)
+
+    async def astream(self, messages: List[dict], model: str, options: dict, compute_fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """ Async twin of stream(), compute_fn returns an async iterator """
+        cached, flight, keys = self._lookup(messages, model, options)
+        if cached is not None:
+            for chunk in cached:
+                yield chunk
+            return
+        if keys is not None:
+            pump = asyncio.get_running_loop().create_task(self._apump(keys, flight, compute_fn))
+            self._pumps.add(pump)
+            pump.add_done_callback(self._pumps.discard)
+        try:
+            async for chunk in flight.areplay():
+                yield chunk
+        finally:
+            self._leave(flight)
+
+    # ---- lookup / bookkeeping ----
+
+    def _lookup(self, messages: List[dict], model: str, options: dict):
+        """ (cached chunks, None, None) / (None, flight to join, None) / (None, new flight, keys) for the leader """
+        key, context, question = self.make_keys(messages, model, options)
+        vector = self.embed_fn(question) if self.similarity is not None else None
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._drop(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0], None, None
+
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                flight.readers += 1
+                self._stats["coalesced"] += 1
+                return None, flight, None
+
+            if vector is not None:
+                similar = self._most_similar(context, vector, now)
+                if similar is not None:
+                    self._entries.move_to_end(similar)
+                    self._stats["similar_hits"] += 1
+                    return self._entries[similar][0], None, None
+
+            self._stats["misses"] += 1
+            flight = self._in_flight[key] = _Flight()
+            flight.readers = 1
+            return None, flight, (key, context, vector)
+
+    def _most_similar(self, context: str, vector: Counter, now: float):
+        # caller holds the lock
+        best_key, best_score = None, self.similarity
+        for key in self._contexts.get(context, ()):
+            chunks, expires_at, _, cached_vector = self._entries[key]
+            if expires_at <= now or cached_vector is None:
+                continue
+            score = _cosine(vector, cached_vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _leave(self, flight: _Flight):
+        with self._lock:
+            flight.readers -= 1
+
+    def _still_read(self, key: str, flight: _Flight) -> bool:
+        """ False (and the flight is retired) once every reader has left """
+        with self._lock:
+            if flight.readers > 0:
+                return True
+            self._in_flight.pop(key, None)
+            self._stats["abandoned"] += 1
+            return False
+
+    def _settle(self, keys: tuple, flight: _Flight, error: BaseException = None):
+        key, context, vector = keys
+        with self._lock:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+            if error is None and flight.chunks:
+                self._drop(key)
+                self._entries[key] = (tuple(flight.chunks), time.monotonic() + self.ttl, context, vector)
+                self._contexts.setdefault(context, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._drop(next(iter(self._entries)))
+                    self._stats["evictions"] += 1
+        flight.finish(error)
+
+    def _drop(self, key: str):
+        # caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._contexts.get(entry[2])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._contexts[entry[2]]
+
+    # ---- pumps ----
+
+    def _pump(self, keys: tuple, flight: _Flight, compute_fn: Callable[[], Iterator[str]]):
+        upstream = None
+        try:
+            upstream = compute_fn()
+            for chunk in upstream:
+                flight.append(chunk)
+                if not self._still_read(keys[0], flight):
+                    flight.finish(_Abandoned())
+                    return
+        except Exception as e:
+            self._settle(keys, flight, e)
+            return
+        finally:
+            if upstream is not None and hasattr(upstream, "close"):
+                upstream.close()
+        self._settle(keys, flight)
+
+    async def _apump(self, keys: tuple, flight: _Flight, compute_fn: Callable[[], AsyncIterator[str]]):
+        upstream = None
+        try:
+            upstream = compute_fn()
+            async for chunk in upstream:
+                flight.append(chunk)
+                if not self._still_read(keys[0], flight):
+                    flight.finish(_Abandoned())
+                    return
+        except Exception as e:
+            self._settle(keys, flight, e)
+            return
+        except asyncio.CancelledError:
+            # loop shutting down: release the readers, cache nothing
+            self._settle(keys, flight, _Abandoned())
+            raise
+        finally:
+            if upstream is not None and hasattr(upstream, "aclose"):
+                await upstream.aclose()
+        self._settle(keys, flight)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._contexts.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["in_flight"] = len(self._in_flight)
+        lookups = stats["hits"] + stats["similar_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["similar_hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
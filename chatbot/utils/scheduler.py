@@ -0,0 +1,333 @@
+"""
+Admission control for LLM requests: a bounded number in flight per
+backend, the rest queued by priority and served fairly across sessions.
+
+    pool = get_default_pool()
+    pool.scheduler = LLMScheduler(limit_per_backend=4, max_wait=5.0)
+
+Every request first takes a slot on the backend it was routed to (see
+LLMClient); until one is free it waits in a queue:
+1. lower priority value first: short planner / ReAct decisions
+   (PRIORITY_INTERACTIVE) go ahead of answer streams, which go ahead of
+   background summaries; a request queued longer than `aging` seconds is
+   served like an interactive one, so nothing starves
+2. within a priority, round-robin over sessions (current_session()), so
+   one chatty conversation can't fill the queue for everybody else
+3. shedding: a request whose predicted wait is over `max_wait` fails at
+   once with Overloaded, and one still queued after `max_wait` (or past
+   the turn deadline) gives up; callers turn that into a fast "busy"
+   answer instead of a slow read timeout
+
+Sync threads and asyncio tasks share the same queues.
+"""
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+from chatbot.utils.backend_pool import Backend, current_session
+from chatbot.utils.resilience import DeadlineExceeded, current_deadline
+from chatbot.utils.tracing import register_metrics, unregister_metrics
+
+PRIORITY_INTERACTIVE = 0    # planner / router / ReAct: short, a turn is blocked on it
+PRIORITY_ANSWER = 1         # answer streams: long, the user already sees progress
+PRIORITY_BACKGROUND = 2     # history summaries: nobody waits on them
+PRIORITY_NAMES = ("interactive", "answer", "background")
+
+
+class Overloaded(Exception):
+    """ The backend's queue is too long, the request was shed instead of waiting """
+
+
+class _Waiter:
+    __slots__ = ("priority", "session", "enqueued", "granted", "event", "loop", "future")
+
+    def __init__(self, priority: int, session):
+        self.priority = priority
+        self.session = session
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.event = None           # sync callers block on this
+        self.loop = None            # async callers await this future on their loop
+        self.future = None
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Lane:
+    """ One backend's slots and queues """
+
+    __slots__ = ("backend", "active", "queues", "depth", "avg_service_s")
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.active = 0
+        self.queues = [OrderedDict() for _ in PRIORITY_NAMES]      # per priority: session -> deque of waiters
+        self.depth = [0] * len(PRIORITY_NAMES)
+        self.avg_service_s = 0.0                                    # EWMA of how long a slot is held
+
+
+class _Slot:
+    """ `with scheduler.slot(backend, priority):` / `async with ...` around one request """
+
+    __slots__ = ("scheduler", "backend", "priority", "span", "_started")
+
+    def __init__(self, scheduler: "LLMScheduler", backend: Backend, priority: int, span=None):
+        self.scheduler = scheduler
+        self.backend = backend
+        self.priority = priority
+        self.span = span
+        self._started = None
+
+    def _admitted(self, waited: float):
+        self._started = time.monotonic()
+        if self.span is not None:
+            self.span.set(queue_wait_s=round(waited, 4), priority=PRIORITY_NAMES[self.priority])
+
+    def __enter__(self):
+        self._admitted(self.scheduler.acquire(self.backend, self.priority))
+        return self
+
+    def __exit__(self, *exc):
+        self.scheduler.release(self.backend, time.monotonic() - self._started)
+        return False
+
+    async def __aenter__(self):
+        self._admitted(await self.scheduler.aacquire(self.backend, self.priority))
+        return self
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release(self.backend, time.monotonic() - self._started)
+        return False
+
+
+class LLMScheduler:
+    """
+    Per-backend concurrency limit with priority + per-session fair queueing.
+
+    Attr:
+    - limit_per_backend: requests in flight per Ollama backend (match
+      OLLAMA_NUM_PARALLEL; more just queue inside Ollama, unfairly)
+    - max_wait: seconds a request may queue before it is shed
+    - aging: seconds after which a queued request is served as interactive
+    """
+
+    def __init__(self, limit_per_backend: int = 4, max_wait: float = 10.0, aging: float = 5.0):
+        if limit_per_backend < 1:
+            raise ValueError("limit_per_backend must be at least 1")
+        self.limit_per_backend = limit_per_backend
+        self.max_wait = max_wait
+        self.aging = aging
+
+        self._lock = threading.Lock()
+        self._lanes = {}            # Backend -> _Lane
+        self._stats = {
+            name: {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+            for name in PRIORITY_NAMES
+        }
+        register_metrics(self.metrics)         # held weakly, dropped with the scheduler
+
+    def slot(self, backend: Backend, priority: int = PRIORITY_ANSWER, span=None) -> _Slot:
+        """ Context manager (sync or async) holding one of backend's slots; span gets queue_wait_s """
+        return _Slot(self, backend, priority, span)
+
+    # ---- admission ----
+
+    def acquire(self, backend: Backend, priority: int = PRIORITY_ANSWER) -> float:
+        """
+        Block until backend has a free slot for this request.
+
+        Returns:
+            seconds spent queued
+
+        Raises:
+            Overloaded if shed, DeadlineExceeded if the turn ran out of time first
+        """
+        waiter = _Waiter(priority, current_session())
+        waiter.event = threading.Event()
+        if self._enqueue(backend, priority, waiter) is None:
+            return 0.0
+        timeout, deadline_first = self._wait_timeout()
+        if not waiter.event.wait(timeout):
+            self._give_up(backend, waiter, deadline_first)
+        return self._granted(waiter)
+
+    async def aacquire(self, backend: Backend, priority: int = PRIORITY_ANSWER) -> float:
+        """ Async twin of acquire(): waits without blocking the event loop """
+        waiter = _Waiter(priority, current_session())
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        if self._enqueue(backend, priority, waiter) is None:
+            return 0.0
+        timeout, deadline_first = self._wait_timeout()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            self._give_up(backend, waiter, deadline_first)
+        except asyncio.CancelledError:
+            if not self._abandon(backend, waiter):
+                self.release(backend)       # granted as we were cancelled, nobody will use it
+            backend.breaker.release()       # nor the half-open probe pick() may have reserved for us
+            raise
+        return self._granted(waiter)
+
+    def _enqueue(self, backend: Backend, priority: int, waiter: _Waiter):
+        """ Take a slot right away (returns None) or queue waiter (returns it) """
+        priority = min(max(priority, 0), len(PRIORITY_NAMES) - 1)
+        waiter.priority = priority
+        stats = self._stats[PRIORITY_NAMES[priority]]
+        with self._lock:
+            lane = self._lanes.get(backend)
+            if lane is None:
+                lane = self._lanes[backend] = _Lane(backend)
+            if lane.active < self.limit_per_backend and not any(lane.depth):
+                lane.active += 1
+                stats["admitted"] += 1
+                return None
+
+            # requests served before this one, spread over the slots
+            ahead = sum(lane.depth[: priority + 1]) + 1
+            predicted = ahead * lane.avg_service_s / self.limit_per_backend
+            if self.max_wait is not None and predicted > self.max_wait:
+                stats["shed"] += 1
+                backend.breaker.release()       # pick() may have reserved a half-open probe for us
+                raise Overloaded(f"{backend.base_url} is busy (about {predicted:.1f}s queue wait)")
+
+            lane.queues[priority].setdefault(waiter.session, deque()).append(waiter)
+            lane.depth[priority] += 1
+            backend.queued = sum(lane.depth)
+            stats["queued"] += 1
+            return waiter
+
+    def _wait_timeout(self):
+        """ (seconds to wait, whether the turn deadline is the tighter bound) """
+        deadline = current_deadline()
+        if deadline is not None and (self.max_wait is None or deadline.remaining() < self.max_wait):
+            return deadline.remaining(), True
+        return self.max_wait, False
+
+    def _granted(self, waiter: _Waiter) -> float:
+        waited = time.monotonic() - waiter.enqueued
+        stats = self._stats[PRIORITY_NAMES[waiter.priority]]
+        with self._lock:
+            stats["admitted"] += 1
+            stats["wait_total_s"] += waited
+            stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+        return waited
+
+    def _give_up(self, backend: Backend, waiter: _Waiter, deadline_first: bool):
+        """ Wait timed out: leave the queue and raise, unless a slot arrived just now """
+        if not self._abandon(backend, waiter):
+            return
+        with self._lock:
+            self._stats[PRIORITY_NAMES[waiter.priority]]["timed_out"] += 1
+        backend.breaker.release()
+        if deadline_first:
+            raise DeadlineExceeded("turn deadline passed while queued for an LLM slot")
+        raise Overloaded(f"{backend.base_url} is busy (queued {self.max_wait:.1f}s)")
+
+    def _abandon(self, backend: Backend, waiter: _Waiter) -> bool:
+        """ Drop a waiter that stopped waiting; returns False if it had already been granted a slot """
+        with self._lock:
+            lane = self._lanes[backend]
+            if not waiter.granted:
+                queue = lane.queues[waiter.priority]
+                waiters = queue.get(waiter.session)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del queue[waiter.session]
+                    lane.depth[waiter.priority] -= 1
+                    backend.queued = sum(lane.depth)
+                return True
+        return False
+
+    # ---- release / dispatch ----
+
+    def release(self, backend: Backend, held_s: float = None):
+        """ Free a slot (held_s feeds the wait prediction) and hand it to the next waiter """
+        woken = None
+        with self._lock:
+            lane = self._lanes[backend]
+            lane.active -= 1
+            if held_s is not None:
+                lane.avg_service_s = held_s if not lane.avg_service_s else 0.8 * lane.avg_service_s + 0.2 * held_s
+            if lane.active < self.limit_per_backend:
+                woken = self._next(lane)
+                if woken is not None:
+                    lane.active += 1
+                    woken.granted = True
+            backend.queued = sum(lane.depth)
+        if woken is not None:
+            woken.wake()
+
+    def _next(self, lane: _Lane):
+        # caller holds the lock; heads of each priority's round-robin, aged ones count as interactive
+        now = time.monotonic()
+        best = None
+        for priority, queue in enumerate(lane.queues):
+            if not queue:
+                continue
+            head = next(iter(queue.values()))[0]
+            rank = (priority if now - head.enqueued < self.aging else -1, head.enqueued)
+            if best is None or rank < best[0]:
+                best = (rank, priority)
+        if best is None:
+            return None
+
+        queue = lane.queues[best[1]]
+        session, waiters = queue.popitem(last=False)
+        waiter = waiters.popleft()
+        if waiters:
+            queue[session] = waiters        # back of the line: next session's turn
+        lane.depth[best[1]] -= 1
+        return waiter
+
+    def close(self):
+        """ Stop exporting this scheduler's metrics (e.g. when replacing pool.scheduler) """
+        unregister_metrics(self.metrics)
+
+    # ---- metrics ----
+
+    def stats(self) -> dict:
+        """ Per-priority counters and wait times, per-backend slots in use and queue depth """
+        with self._lock:
+            priorities = {}
+            for name, stats in self._stats.items():
+                priorities[name] = dict(stats)
+                waits = stats["admitted"]
+                priorities[name]["wait_avg_s"] = round(stats["wait_total_s"] / waits, 4) if waits else 0.0
+            backends = [
+                {
+                    "url": lane.backend.url,
+                    "active": lane.active,
+                    "limit": self.limit_per_backend,
+                    "queued": dict(zip(PRIORITY_NAMES, lane.depth)),
+                    "avg_service_s": round(lane.avg_service_s, 4),
+                }
+                for lane in self._lanes.values()
+            ]
+        return {"priorities": priorities, "backends": backends}
+
+    def metrics(self) -> list:
+        """ Prometheus samples: (metric, type, labels, value) """
+        samples = []
+        with self._lock:
+            for lane in self._lanes.values():
+                samples.append(("chatbot_llm_slots_active", "gauge", {"backend": lane.backend.base_url}, lane.active))
+                for name, depth in zip(PRIORITY_NAMES, lane.depth):
+                    samples.append(("chatbot_llm_queue_depth", "gauge", {"backend": lane.backend.base_url, "priority": name}, depth))
+            for name, stats in self._stats.items():
+                samples.append(("chatbot_llm_admitted_total", "counter", {"priority": name}, stats["admitted"]))
+                samples.append(("chatbot_llm_shed_total", "counter", {"priority": name}, stats["shed"] + stats["timed_out"]))
+                samples.append(("chatbot_llm_queue_wait_seconds_total", "counter", {"priority": name}, round(stats["wait_total_s"], 6)))
+        return samples
@@ -0,0 +1,256 @@
+"""
+Conversation sessions kept warm in memory, optionally persisted.
+
+    store = SessionStore(backend=SqliteSessionBackend("sessions.db"))
+    session = store.get("abc")          # created, or resumed from disk
+    session.memory.add("user", "hi")    # appended to the log as well
+
+- SessionStore: LRU of Session records with idle eviction. An evicted (or
+  never seen since restart) session is reloaded from the backend on its
+  next get(), so only conversations in use cost memory; quiet sessions
+  still in memory drop their cached prompt views.
+- SqliteSessionBackend: append-only message log plus one row per session
+  for the running summary; resuming reads only the messages after the
+  last summary.
+"""
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .memory import ConversationMemory
+
+
+class SqliteSessionBackend:
+    """
+    On-disk session log.
+
+    messages: (session_id, seq, role, content), one row per message, never
+    updated. sessions: (session_id, summary, folded, updated_at), where
+    folded is the seq of the first message not covered by the summary.
+    Runs in WAL mode without fsync per commit, so an append is a few
+    microseconds and readers never block the writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', folded INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def append(self, session_id: str, seq: int, role: str, content: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", (session_id, seq, role, content))
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (session_id, time.time()),
+            )
+            self._conn.commit()
+
+    def save_summary(self, session_id: str, summary: str, folded: int):
+        """ Summary now covers messages [0, folded); those rows are no longer needed """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, folded = excluded.folded, updated_at = excluded.updated_at",
+                (session_id, summary, folded, time.time()),
+            )
+            self._conn.execute("DELETE FROM messages WHERE session_id = ? AND seq < ?", (session_id, folded))
+            self._conn.commit()
+
+    def load(self, session_id: str) -> Optional[Tuple[str, int, List[tuple]]]:
+        """
+        Returns:
+            (summary, folded, [(role, content), ...] after the summary), or None if unknown
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT summary, folded FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            summary, folded = row
+            messages = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq", (session_id, folded)
+            ).fetchall()
+        return summary, folded, messages
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class _Journal:
+    """ Forwards one memory's appends / summaries to the backend """
+
+    __slots__ = ("backend", "session_id")
+
+    def __init__(self, backend: SqliteSessionBackend, session_id: str):
+        self.backend = backend
+        self.session_id = session_id
+
+    def append(self, seq: int, role: str, content: str):
+        self.backend.append(self.session_id, seq, role, content)
+
+    def summarized(self, summary: str, folded: int):
+        self.backend.save_summary(self.session_id, summary, folded)
+
+
+class Session:
+    """
+    One warm conversation.
+
+    Attr:
+    - session_id: client-visible id
+    - memory: ConversationMemory with the turns so far
+    - active_turns: turns currently running (sessions in use are never evicted)
+    - last_used: time.monotonic() of the last get()
+    """
+
+    __slots__ = ("session_id", "memory", "active_turns", "last_used")
+
+    def __init__(self, session_id: str, memory: ConversationMemory):
+        self.session_id = session_id
+        self.memory = memory
+        self.active_turns = 0
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """
+    In-memory LRU of sessions with idle eviction and lazy resume.
+
+    Attr:
+    - backend: SqliteSessionBackend or None (memory only, evicted = gone)
+    - max_sessions: warm sessions kept before the least recently used is evicted
+    - idle_ttl: seconds without a get() after which a session is evicted
+    - compact_after: seconds without a get() after which evict_idle() frees
+      a session's cached prompt views (see ConversationMemory.compact)
+    - memory_factory: (journal) -> ConversationMemory for new / resumed sessions
+    """
+
+    def __init__(
+            self,
+            backend: SqliteSessionBackend = None,
+            max_sessions: int = 100_000,
+            idle_ttl: float = 1800.0,
+            memory_factory: Callable[..., ConversationMemory] = None,
+            compact_after: float = 60.0,
+    ):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.compact_after = compact_after
+        self.memory_factory = memory_factory or (lambda journal: ConversationMemory(journal=journal))
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()      # session id -> Session, least recently used first
+        self._stats = {"created": 0, "resumed": 0, "evicted_idle": 0, "evicted_lru": 0, "compacted": 0}
+
+    def get(self, session_id: str, create: bool = True) -> Optional[Session]:
+        """
+        Warm session, else resumed from the backend, else a new one
+        (or None with create=False).
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = time.monotonic()
+                return session
+
+        # backend read outside the lock, other sessions keep going meanwhile
+        state = self.backend.load(session_id) if self.backend is not None else None
+        if state is None and not create:
+            return None
+
+        journal = _Journal(self.backend, session_id) if self.backend is not None else None
+        memory = self.memory_factory(journal)
+        if state is not None:
+            memory.restore(*state)
+
+        with self._lock:
+            existing = self._sessions.get(session_id)
+            if existing is not None:
+                # someone resumed it concurrently, keep theirs
+                self._sessions.move_to_end(session_id)
+                return existing
+            session = self._sessions[session_id] = Session(session_id, memory)
+            self._stats["resumed" if state is not None else "created"] += 1
+            self._evict()
+        return session
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __iter__(self) -> Iterator[Session]:
+        with self._lock:
+            return iter(list(self._sessions.values()))
+
+    def delete(self, session_id: str):
+        """ Forget a session, including its persisted history """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+
+    def evict_idle(self) -> int:
+        """
+        Drop sessions idle for longer than idle_ttl and compact the ones idle
+        for longer than compact_after.
+
+        Returns:
+            number of sessions dropped
+        """
+        with self._lock:
+            before = self._stats["evicted_idle"]
+            self._evict()
+            cutoff = time.monotonic() - self.compact_after
+            quiet = [session for session in self._sessions.values() if session.last_used <= cutoff and not session.active_turns]
+            evicted = self._stats["evicted_idle"] - before
+
+        # memory locks are taken outside the store lock, get() isn't held up
+        compacted = sum(1 for session in quiet if session.memory.compact())
+        with self._lock:
+            self._stats["compacted"] += compacted
+        return evicted
+
+    def _evict(self):
+        # caller holds the lock; oldest first, so stop at the first recent one
+        cutoff = time.monotonic() - self.idle_ttl
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            over = len(self._sessions) > self.max_sessions
+            if not over and session.last_used > cutoff:
+                break
+            if session.active_turns:
+                continue
+            del self._sessions[session_id]
+            self._stats["evicted_lru" if over else "evicted_idle"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["warm"] = len(self._sessions)
+        return stats
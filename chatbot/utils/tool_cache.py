@@ -0,0 +1,116 @@
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable
+
+
+def default_key_fn(args: dict) -> str:
+    """ Canonical JSON of the args, so {"a": 1, "b": 2} and {"b": 2, "a": 1} share an entry """
+    return json.dumps(args or {}, sort_keys=True, default=str)
+
+
+class ToolResultCache:
+    """
+    LRU + per-tool TTL cache of tool results with request coalescing.
+
+    Each tool opts in by declaring cache_ttl (seconds) and optionally
+    cache_key_fn(args) -> str; tools without cache_ttl (get_time,
+    random_number, ...) always run. Identical calls made while one is
+    already running wait for that execution instead of starting their own,
+    across sessions and across steps of the same plan.
+
+    Only successful results are cached; an exception is passed to every
+    coalesced caller and nothing is stored.
+
+    Attr:
+    - max_entries: LRU capacity across all tools
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # (tool, key) -> (result, expires_at)
+        self._in_flight = {}                # (tool, key) -> Future
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evictions": 0, "expired": 0}
+
+    def call(self, tool, args: dict, compute_fn: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for tool(args) or compute it once.
+
+        Args:
+            tool: Tool with cache_ttl / cache_key_fn attributes
+            args: tool arguments
+            compute_fn: runs the tool, called at most once per key at a time
+
+        Returns:
+            the tool result (a private copy, callers may mutate it)
+        """
+        if tool.cache_ttl is None:
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return compute_fn()
+
+        key = (tool.name, (tool.cache_key_fn or default_key_fn)(args))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(result)
+                del self._entries[key]
+                self._stats["expired"] += 1
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                future = self._in_flight[key] = Future()
+                self._stats["misses"] += 1
+                leader = True
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = compute_fn()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._entries[key] = (result, time.monotonic() + tool.cache_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        future.set_result(result)
+        return copy.deepcopy(result)
+
+    def invalidate(self, tool_name: str = None):
+        """ Drop cached results of one tool, or of every tool """
+        with self._lock:
+            if tool_name is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == tool_name]:
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["in_flight"] = len(self._in_flight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
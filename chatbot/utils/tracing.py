@@ -0,0 +1,537 @@
+"""
+Lightweight per-turn tracing: spans for nodes, LLM requests and tools.
+
+Nothing is recorded until at least one exporter is added; with no exporter
+every span is a shared no-op object, so the instrumented code pays one
+attribute check per call.
+
+    from chatbot.utils.tracing import tracer, RingBufferExporter
+    ring = RingBufferExporter()
+    tracer.add_exporter(ring)
+    ...
+    ring.spans()        # finished spans, newest last
+
+Or from a spec string (CLI --trace / CHATBOT_TRACE env var):
+    configure_tracing("ring,jsonl=traces.jsonl,prometheus=9464")
+
+Span kinds used in the bot:
+- "turn": one user turn through ChatPipeline
+- "node": one node process()/aprocess() call
+- "llm": one /api/chat request (prompt bytes, TTFT, eval counts, tokens/sec)
+- "tool": one tool execution
+"""
+import os
+import json
+import logging
+import time
+import uuid
+import weakref
+import inspect
+import threading
+import functools
+import contextvars
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# span currently running in this thread / task (parent of new spans)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# references to callables returning [(metric, type, labels, value), ...] for
+# state that isn't a span (queue depths, ...)
+_metric_sources = []
+_metric_sources_lock = threading.Lock()
+
+
+def register_metrics(source):
+    """
+    Add a sample source rendered by every PrometheusExporter.
+
+    Bound methods are held weakly, so an object registering its own method
+    stops being exported (and can be collected) once nothing else uses it.
+    """
+    ref = weakref.WeakMethod(source) if inspect.ismethod(source) else (lambda: source)
+    with _metric_sources_lock:
+        _metric_sources.append(ref)
+
+
+def unregister_metrics(source):
+    with _metric_sources_lock:
+        _metric_sources[:] = [ref for ref in _metric_sources if ref() is not None and ref() != source]
+
+
+def _live_metric_sources() -> list:
+    with _metric_sources_lock:
+        sources = [ref() for ref in _metric_sources]
+        _metric_sources[:] = [ref for ref, source in zip(_metric_sources, sources) if source is not None]
+    return [source for source in sources if source is not None]
+
+
+class Span:
+    """
+    One timed operation.
+
+    Attr:
+    - name / kind: what ran, e.g. ("node.planner", "node")
+    - trace_id: shared by every span of one turn
+    - span_id / parent_id: tree structure
+    - start: wall clock start (epoch seconds)
+    - duration_s: set when the span ends
+    - attrs: free-form attributes (prompt_bytes, ttft_s, tool, ...)
+    - error: error message if the operation failed
+    """
+
+    __slots__ = ("tracer", "name", "kind", "trace_id", "span_id", "parent_id", "start", "duration_s", "attrs", "error", "_started")
+
+    def __init__(self, tracer, name: str, kind: str, parent, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.duration_s = None
+        self.attrs = attrs
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def elapsed(self) -> float:
+        """ Seconds since the span started """
+        return time.perf_counter() - self._started
+
+    def end(self, error=None):
+        if self.duration_s is not None:
+            return
+        self.duration_s = time.perf_counter() - self._started
+        if error is not None:
+            self.error = str(error) or type(error).__name__
+        self.tracer._export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_s * 1000, 3) if self.duration_s is not None else None,
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """ Returned while tracing is disabled, every method does nothing """
+
+    __slots__ = ()
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def elapsed(self) -> float:
+        return 0.0
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _ActiveSpan:
+    """ Context manager that makes a span current for its block """
+
+    __slots__ = ("span", "_token")
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.span.end(exc)
+        return False
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporters.
+
+    Exporters are any object with export(span); the list is replaced (not
+    mutated) on change so the hot path can read it without a lock.
+    """
+
+    def __init__(self):
+        self.exporters = ()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter):
+        with self._lock:
+            self.exporters = self.exporters + (exporter,)
+        return exporter
+
+    def remove_exporter(self, exporter):
+        with self._lock:
+            self.exporters = tuple(e for e in self.exporters if e is not exporter)
+
+    def clear(self):
+        with self._lock:
+            self.exporters = ()
+
+    def start(self, name: str, kind: str = "internal", **attrs):
+        """
+        Start a span as a child of the current one without making it current.
+
+        Use for leaf work that spans generator yields (e.g. an LLM stream);
+        the caller must call span.end().
+        """
+        if not self.exporters:
+            return NOOP_SPAN
+        return Span(self, name, kind, _current_span.get(), attrs)
+
+    def span(self, name: str, kind: str = "internal", **attrs):
+        """ `with tracer.span(...) as span:` - child of the current span, current inside the block """
+        if not self.exporters:
+            return NOOP_SPAN
+        return _ActiveSpan(Span(self, name, kind, _current_span.get(), attrs))
+
+    def _export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logger.warning("tracing exporter %s failed", type(exporter).__name__, exc_info=True)
+
+
+# process-wide tracer used by all instrumented code
+tracer = Tracer()
+
+
+def current_span():
+    """ Span running in this thread / task, or None """
+    return _current_span.get()
+
+
+def traced(name: str, kind: str = "node"):
+    """
+    Decorator recording one span per call.
+
+    Works for plain functions, coroutines, generators and async generators
+    (node process() methods are all four). For generators the span covers
+    the whole stream and records `first_chunk_s`; it is only made current
+    while the generator body runs, so the caller's code between chunks is
+    not attributed to it.
+    """
+
+    def decorate(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                if not tracer.exporters:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                    return
+
+                span = tracer.start(name, kind)
+                agen = func(*args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        token = _current_span.set(span)
+                        try:
+                            item = await agen.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            _current_span.reset(token)
+                        if "first_chunk_s" not in span.attrs:
+                            span.set(first_chunk_s=round(span.elapsed(), 4))
+                        yield item
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    await agen.aclose()
+                    span.end(error)
+
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                if not tracer.exporters:
+                    yield from func(*args, **kwargs)
+                    return
+
+                span = tracer.start(name, kind)
+                gen = func(*args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        token = _current_span.set(span)
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            break
+                        finally:
+                            _current_span.reset(token)
+                        if "first_chunk_s" not in span.attrs:
+                            span.set(first_chunk_s=round(span.elapsed(), 4))
+                        yield item
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    gen.close()
+                    span.end(error)
+
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.exporters:
+                    return await func(*args, **kwargs)
+                with tracer.span(name, kind):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.exporters:
+                return func(*args, **kwargs)
+            with tracer.span(name, kind):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def eval_stats(data: dict) -> dict:
+    """
+    Pull generation stats out of Ollama's final response / stream chunk.
+
+    Durations come in nanoseconds; tokens_per_sec is eval_count over
+    eval_duration (decode speed, excludes prompt processing).
+    """
+    stats = {}
+    for key in ("prompt_eval_count", "eval_count", "done_reason"):
+        if key in data:
+            stats[key] = data[key]
+    for key in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration"):
+        if key in data:
+            stats[key.replace("_duration", "_s")] = round(data[key] / 1e9, 4)
+    if data.get("eval_count") and data.get("eval_duration"):
+        stats["tokens_per_sec"] = round(data["eval_count"] / (data["eval_duration"] / 1e9), 2)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# exporters
+# ---------------------------------------------------------------------------
+
+class RingBufferExporter:
+    """ Keeps the last `capacity` finished spans in memory """
+
+    def __init__(self, capacity: int = 2048):
+        self._spans = deque(maxlen=capacity)
+
+    def export(self, span: Span):
+        self._spans.append(span)        # deque.append is thread-safe
+
+    def spans(self, trace_id: str = None, kind: str = None) -> List[Span]:
+        spans = list(self._spans)
+        if trace_id is not None:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        if kind is not None:
+            spans = [s for s in spans if s.kind == kind]
+        return spans
+
+    def clear(self):
+        self._spans.clear()
+
+
+class JsonlExporter:
+    """ Appends one JSON object per finished span to a file """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusExporter:
+    """
+    Aggregates spans into Prometheus text-format metrics.
+
+    Metrics:
+    - chatbot_span_duration_seconds{kind,name}: histogram
+    - chatbot_span_errors_total{kind,name}
+    - chatbot_llm_ttft_seconds{name}: histogram of LLM time to first token
+    - chatbot_llm_tokens_total{name,type}: prompt / completion tokens
+    - chatbot_llm_queue_wait_seconds{priority}: histogram of time spent
+      waiting for an LLM slot (with an LLMScheduler)
+    - plus whatever register_metrics() sources report (queue depth, ...)
+
+    render() gives the text; serve(port) exposes it on /metrics.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}        # (kind, name) -> [bucket counts..., count, sum]
+        self._ttft = {}             # name -> same layout
+        self._errors = {}           # (kind, name) -> count
+        self._tokens = {}           # (name, type) -> count
+        self._queue_wait = {}       # priority -> histogram row
+        self._server = None
+
+    def _observe(self, table: dict, key, value: float):
+        row = table.get(key)
+        if row is None:
+            row = table[key] = [0] * len(self.BUCKETS) + [0, 0.0]
+        for i, bound in enumerate(self.BUCKETS):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += 1
+        row[-1] += value
+
+    def export(self, span: Span):
+        key = (span.kind, span.name)
+        with self._lock:
+            self._observe(self._durations, key, span.duration_s)
+            if span.error is not None:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if span.kind == "llm":
+                if "ttft_s" in span.attrs:
+                    self._observe(self._ttft, span.name, span.attrs["ttft_s"])
+                if "queue_wait_s" in span.attrs:
+                    self._observe(self._queue_wait, span.attrs.get("priority", ""), span.attrs["queue_wait_s"])
+                for attr, token_type in (("prompt_eval_count", "prompt"), ("eval_count", "completion")):
+                    if attr in span.attrs:
+                        token_key = (span.name, token_type)
+                        self._tokens[token_key] = self._tokens.get(token_key, 0) + span.attrs[attr]
+
+    @staticmethod
+    def _labels(**labels) -> str:
+        return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+    def _histogram(self, lines: list, metric: str, table: dict, label_fn):
+        lines.append(f"# TYPE {metric} histogram")
+        for key, row in sorted(table.items()):
+            labels = label_fn(key)
+            for i, bound in enumerate(self.BUCKETS):
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {row[i]}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {row[-2]}')
+            lines.append(f"{metric}_count{{{labels}}} {row[-2]}")
+            lines.append(f"{metric}_sum{{{labels}}} {row[-1]:.6f}")
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            self._histogram(lines, "chatbot_span_duration_seconds", self._durations, lambda k: self._labels(kind=k[0], name=k[1]))
+            lines.append("# TYPE chatbot_span_errors_total counter")
+            for (kind, name), count in sorted(self._errors.items()):
+                lines.append(f"chatbot_span_errors_total{{{self._labels(kind=kind, name=name)}}} {count}")
+            self._histogram(lines, "chatbot_llm_ttft_seconds", self._ttft, lambda k: self._labels(name=k))
+            lines.append("# TYPE chatbot_llm_tokens_total counter")
+            for (name, token_type), count in sorted(self._tokens.items()):
+                lines.append(f"chatbot_llm_tokens_total{{{self._labels(name=name, type=token_type)}}} {count}")
+            self._histogram(lines, "chatbot_llm_queue_wait_seconds", self._queue_wait, lambda k: self._labels(priority=k))
+
+        families = {}       # metric -> [type line, samples...], a family's lines must stay together
+        for source in _live_metric_sources():
+            for metric, metric_type, labels, value in source():
+                family = families.setdefault(metric, [f"# TYPE {metric} {metric_type}"])
+                family.append(f"{metric}{{{self._labels(**labels)}}} {value}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """ Serve render() on http://host:port/metrics from a background thread """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server
+
+
+def configure_tracing(spec: str = None) -> list:
+    """
+    Add exporters from a comma separated spec (defaults to $CHATBOT_TRACE).
+
+    Items:
+    - ring or ring=<capacity>
+    - jsonl=<path>
+    - prometheus or prometheus=<port> (port starts the /metrics endpoint)
+
+    Returns:
+        the exporters that were added
+    """
+    spec = spec if spec is not None else os.environ.get("CHATBOT_TRACE", "")
+    added = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, value = item.partition("=")
+        if kind == "ring":
+            exporter = RingBufferExporter(int(value) if value else 2048)
+        elif kind == "jsonl":
+            exporter = JsonlExporter(value or "traces.jsonl")
+        elif kind == "prometheus":
+            exporter = PrometheusExporter()
+            if value:
+                exporter.serve(int(value))
+        else:
+            raise ValueError(f"Unknown trace exporter: {kind}")
+        added.append(tracer.add_exporter(exporter))
+    return added
@@ -1,49 +1,100 @@
+import uuid
+import argparse
+from chatbot.pipeline import ChatPipeline
 from chatbot.nodes.planner_node import PlannerNode
-from chatbot.nodes.tool_runner_node import ToolRunnerNode
 from chatbot.nodes.answer_node import AnswerNode
-from chatbot.nodes.chain_executor_node import ChainExecutorNode
+from chatbot.nodes.router_node import RouterNode, SimilarityIndex
+from chatbot.nodes.chain_executor_node import ChainExecutorNode, DEFAULT_STEP_TIMEOUT
+from chatbot.utils.plan_cache import PlanCache, SqlitePlanStore
+from chatbot.utils.response_cache import ResponseCache
+from chatbot.utils.session_store import SessionStore, SqliteSessionBackend
+from chatbot.utils.tracing import configure_tracing
+from chatbot.tools import registry
+from chatbot.utils.llm_client import get_default_pool
+from chatbot.utils.scheduler import LLMScheduler
+from chatbot.utils.node_config import load_node_configs
 
 
 def main():
-    planner = PlannerNode()                    
-    runner = ToolRunnerNode()
-    answerer = AnswerNode()   
-    chain_executor = ChainExecutorNode()    # create one node instance to handle convo
+    parser = argparse.ArgumentParser(description="Ollama Chatbot")
+    parser.add_argument("--unified", action="store_true", help="plan and answer in one streamed LLM call")
+    parser.add_argument("--fast-path", action="store_true", help="route obvious intents without calling the LLM planner")
+    parser.add_argument("--plan-cache", action="store_true", help="reuse plans for repeated questions")
+    parser.add_argument("--plan-cache-db", default=None, help="sqlite file so the plan cache survives restarts")
+    parser.add_argument("--stream-plan", action="store_true", help="start tools while the plan is still streaming")
+    parser.add_argument("--prefetch", action="store_true", help="also prefetch side-effect-free tools guessed from the message (implies --stream-plan)")
+    parser.add_argument("--turn-timeout", type=float, default=120.0, help="seconds budget per turn shared by all LLM/tool calls")
+    parser.add_argument("--answer-budget", type=float, default=None, help="answer as soon as the first tool result is in, waiting at most this many seconds for it (late results follow)")
+    parser.add_argument("--step-timeout", type=float, default=DEFAULT_STEP_TIMEOUT, help="seconds a tool call may run unless the tool sets its own timeout")
+    parser.add_argument("--session-db", default=None, help="sqlite file so conversations survive restarts")
+    parser.add_argument("--resume", default=None, help="session id to continue (needs --session-db)")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="LLM requests in flight per Ollama backend, the rest queue by priority / session (default: no limit)")
+    parser.add_argument("--llm-max-wait", type=float, default=10.0, help="seconds an LLM request may queue before it gets a busy answer (with --llm-concurrency)")
+    parser.add_argument("--response-cache", action="store_true", help="cache answers to tool-free first questions (greetings, FAQs) and share identical in-flight ones")
+    parser.add_argument("--response-cache-similarity", type=float, default=None, help="also reuse answers for near-duplicate questions above this shingle similarity, e.g. 0.9 (implies --response-cache)")
+    parser.add_argument("--node-config", default=None, help="JSON file mapping nodes to models/options (see node_config.py)")
+    parser.add_argument("--trace", default=None, help="trace exporters, e.g. ring,jsonl=traces.jsonl,prometheus=9464 (default: $CHATBOT_TRACE)")
+    args = parser.parse_args()
 
-    conversation_history = []   # track convo history
+    configure_tracing(args.trace)     # no exporters -> tracing stays off
+    if args.node_config:
+        load_node_configs(args.node_config)     # before any node reads its config
+    if args.llm_concurrency:
+        get_default_pool().scheduler = LLMScheduler(args.llm_concurrency, max_wait=args.llm_max_wait)
+
+    router = RouterNode(similarity_index=SimilarityIndex()) if args.fast_path else None
+    plan_cache = None
+    if args.plan_cache or args.plan_cache_db:
+        store = SqlitePlanStore(args.plan_cache_db) if args.plan_cache_db else None
+        plan_cache = PlanCache(registry, store=store)
+    speculator = RouterNode(similarity_index=SimilarityIndex()) if args.prefetch else None
+    planner = PlannerNode(router=router, plan_cache=plan_cache, speculator=speculator)
+    response_cache = None
+    if args.response_cache or args.response_cache_similarity is not None:
+        response_cache = ResponseCache(similarity=args.response_cache_similarity)
+    pipeline = ChatPipeline(
+        planner=planner,
+        chain_executor=ChainExecutorNode(step_timeout=args.step_timeout),
+        answerer=AnswerNode(response_cache=response_cache),
+        debug=True,
+        unified=args.unified,
+        turn_timeout=args.turn_timeout,
+        stream_plan=args.stream_plan or args.prefetch,
+        answer_budget=args.answer_budget,
+    )    # planner -> chain executor -> answerer
+
+    sessions = SessionStore(backend=SqliteSessionBackend(args.session_db) if args.session_db else None)
+    session_id = args.resume or uuid.uuid4().hex        # also keeps this chat on one Ollama backend (KV cache)
+    conversation_history = sessions.get(session_id).memory    # token-budgeted convo history + running summary
 
     print("Ollama Chatbot (type 'quit' to exit)")
+    if args.session_db:
+        print(f"[debug] Session {session_id} ({len(conversation_history)} messages), resume with --resume {session_id}")
     while True:
         user_message = input("You: ").strip()
 
-        conversation_history.append({
-            "role": "user",
-            "content": user_message
-        })
-
         if user_message.lower() in {"quit", "exit"}:
+            print("[debug] Planner stats:", planner.stats())
+            if router is not None:
+                print("[debug] Router stats:", router.stats())
+            if plan_cache is not None:
+                print("[debug] Plan cache stats:", plan_cache.stats())
+            print("[debug] Executor stats:", pipeline.chain_executor.stats())
+            if response_cache is not None:
+                print("[debug] Response cache stats:", response_cache.stats())
+            if registry.cache is not None:
+                print("[debug] Tool cache stats:", registry.cache.stats())
+            llm_pool = pipeline.answerer.client.pool
+            if len(llm_pool.backends) > 1 or llm_pool.scheduler is not None:
+                print("[debug] Backend pool stats:", llm_pool.stats())
             print("Exiting. Goodbye!")
             break
 
-        # Planning phase
-        plan = planner.process(user_message, conversation_history)
-        print("[debug] Plan:", plan)
-
-        tool_output = None
-
-        # Tool execution phase
-        if plan.get("action") in ["use_tool", "use_tools"]:
-            # Use ChainExecutorNode for both single and multi-tool execution
-            execution_result = chain_executor.process(plan)
-            print("[debug] Execution result:", execution_result)
-            tool_output = execution_result
-        elif plan.get("action") == "answer_direct":
-            print("[debug] No tools used, proceeding to answer generation.")
-        else:
-            print(f"[debug] Unknown action: {plan.get('action')}")
-
-        # Answer generation phase
-        final_reply = answerer.process(user_message, tool_output, conversation_history)
+        # journaled, so only real turns (not the quit command) are added
+        conversation_history.add("user", user_message)
+
+        # plan, run tools, stream the answer
+        final_reply = pipeline.run_turn(user_message, conversation_history, session_id=session_id)
         print("Bot:", end = "", flush = True)
         full_response = ""
         for chunk in final_reply:
@@ -53,10 +104,7 @@ def main():
         print("-" * 40)
 
         # Add bot response to conversation history
-        conversation_history.append({
-            "role": "assistant",
-            "content": full_response
-        })
+        conversation_history.add("assistant", full_response)
     
 
 if __name__ == "__main__":
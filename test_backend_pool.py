@@ -0,0 +1,88 @@
+import socket
+from chatbot.utils.backend_pool import BackendPool, session_scope
+from chatbot.utils.fake_ollama import FakeOllamaConfig, start_fake_ollama
+from chatbot.utils.llm_client import LLMClient
+from chatbot.utils.resilience import RetryPolicy
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+
+
+def _pool(*names, **kwargs) -> BackendPool:
+    # own hosts per test: breakers are shared per host:port
+    return BackendPool([f"http://{name}.pool.test:11434/api/chat" for name in names], health_checks=False, **kwargs)
+
+
+def _dead_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/api/chat"
+
+
+def test_least_outstanding_wins():
+    pool = _pool("lo-a", "lo-b", "lo-c")
+    a, b, c = pool.backends
+    a.outstanding, b.outstanding, c.outstanding = 3, 1, 2
+    assert pool.pick() is b
+    b.queued = 5
+    assert pool.pick() is c
+
+
+def test_sessions_stick_until_their_backend_is_much_busier():
+    pool = _pool("aff-a", "aff-b", affinity_slack=2)
+    a, b = pool.backends
+    a.outstanding = 1
+    with session_scope("s1"):
+        assert pool.pick() is b
+        b.outstanding = 3           # busier, but within the slack
+        assert pool.pick() is b
+        b.outstanding = 4           # too busy: move, and remember the new one
+        assert pool.pick() is a
+        b.outstanding = 0
+        assert pool.pick() is a
+    assert pool.stats()["sticky_sessions"] == 1
+
+
+def test_model_preference_and_unhealthy_backends():
+    pool = _pool("model-a", "model-b")
+    a, b = pool.backends
+    a.models, b.models = {"small:latest"}, {"big:latest"}
+    assert pool.pick("big") is b
+    assert pool.pick("small") is a
+
+    a.models = b.models = None
+    b.healthy = False
+    assert all(pool.pick() is a for _ in range(5))
+
+
+def test_failover_to_another_backend_mid_turn():
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, token_delay=0.0))
+    try:
+        pool = BackendPool([_dead_url(), server.url], health_checks=False)
+        dead, live = pool.backends
+        dead.outstanding = -1       # make sure the dead one is tried first
+        client = LLMClient(pool=pool, retry_policy=FAST)
+        assert client.chat([{"role": "user", "content": "hi"}])
+        assert dead.stats["failures"] == 1 and live.stats["requests"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_probes_eject_and_readmit():
+    server = start_fake_ollama(FakeOllamaConfig())
+    try:
+        pool = BackendPool([server.url], health_checks=False, probe_timeout=0.5)
+        backend, = pool.backends
+        with session_scope("s1"):
+            pool.pick()
+        assert pool.probe(backend) and backend.models == {"fake:latest"}
+
+        backend.base_url = _dead_url().rsplit("/api/chat", 1)[0]
+        assert not pool.probe(backend)
+        assert backend.stats["ejections"] == 1
+        assert pool.stats()["sticky_sessions"] == 0      # its KV cache is gone
+
+        backend.base_url = server.url.rsplit("/api/chat", 1)[0]
+        assert pool.probe(backend) and backend.healthy
+    finally:
+        server.shutdown()
@@ -0,0 +1,41 @@
+import pytest
+from benchmarks.bench_pipeline import compare, percentile, run_async, run_sync, bench_responder
+from chatbot.utils.backend_pool import BackendPool
+from chatbot.utils.fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+
+@pytest.fixture
+def pool():
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, token_delay=0.0, responder=bench_responder))
+    pool = BackendPool([server.url])
+    yield pool
+    pool.stop_health_checks()
+    server.shutdown()
+
+
+@pytest.mark.parametrize("run", [run_sync, run_async])
+@pytest.mark.parametrize("mode", ["pipeline", "unified", "react"])
+def test_every_mode_reports_clean_results(pool, run, mode):
+    result = run(mode, pool, sessions=2, turns=3)
+    assert result["turns"] == 6 and result["llm_errors"] == 0
+    assert result["llm_calls_per_turn"] >= 1 and result["request_bytes_per_turn"] > 0
+    assert 0 < result["ttft_ms"]["p50"] <= result["latency_ms"]["p99"]
+    if mode == "react":
+        assert result["react"]["fallbacks"] == 0
+
+
+def test_percentile_and_regression_check():
+    assert percentile([], 50) == 0.0
+    assert percentile([5, 1, 3], 50) == 3 and percentile([5, 1, 3], 99) == 5
+
+    def report(p50):
+        metrics = {"p50": p50, "p95": p50}
+        return {"results": {"pipeline": {"latency_ms": metrics, "ttft_ms": metrics}}}
+
+    assert compare(report(110), report(100), 0.2) == []
+    assert compare(report(130), report(100), 0.2) == [
+        "pipeline latency_ms p50: 100 -> 130 ms",
+        "pipeline latency_ms p95: 100 -> 130 ms",
+        "pipeline ttft_ms p50: 100 -> 130 ms",
+        "pipeline ttft_ms p95: 100 -> 130 ms",
+    ]
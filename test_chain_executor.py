@@ -0,0 +1,183 @@
+import time
+import threading
+from chatbot.nodes.answer_node import AnswerNode
+from chatbot.nodes.chain_executor_node import ChainExecutorNode
+from chatbot.pipeline import ChatPipeline
+from chatbot.tools import registry
+
+
+def _register(name, func, **kwargs):
+    registry.tool(f"Test tool {name}.", name=name, **kwargs)(func)
+
+
+def test_hung_tool_times_out_every_turn_without_starving_workers():
+    release = threading.Event()
+    _register("test_hang", lambda: release.wait(30), timeout=0.1)
+    _register("test_echo", lambda text="hi": text)
+    executor = ChainExecutorNode(max_workers=4)
+    try:
+        # more hung turns than there are workers: each must still time out on schedule
+        for _ in range(6):
+            started = time.perf_counter()
+            output = executor.process({"action": "use_tool", "tool": "test_hang", "args": {}})
+            assert time.perf_counter() - started < 1.0
+            assert "Timed out" in output["results"][0]["error"]
+
+        started = time.perf_counter()
+        output = executor.process({"action": "use_tool", "tool": "test_echo", "args": {"text": "still here"}})
+        assert output["results"][0]["result"] == "still here"
+        assert time.perf_counter() - started < 1.0
+        assert executor.stats()["timeouts"] == 6
+    finally:
+        release.set()
+        registry.unregister("test_hang")
+        registry.unregister("test_echo")
+
+
+def test_dag_runs_dependents_after_their_dependencies():
+    events = []
+    lock = threading.Lock()
+
+    def record(label: str):
+        with lock:
+            events.append(("start", label))
+        time.sleep(0.1)
+        with lock:
+            events.append(("end", label))
+        return label
+
+    _register("test_record", record)
+    executor = ChainExecutorNode()
+    try:
+        started = time.perf_counter()
+        output = executor.process({"action": "use_tools", "steps": [
+            {"tool": "test_record", "args": {"label": "a"}},
+            {"tool": "test_record", "args": {"label": "b"}},
+            {"tool": "test_record", "args": {"label": "c"}, "depends_on": [1, 2]},
+        ]})
+        elapsed = time.perf_counter() - started
+
+        assert [r["result"] for r in output["results"]] == ["a", "b", "c"]
+        assert events.index(("start", "c")) > max(events.index(("end", "a")), events.index(("end", "b")))
+        # a and b overlap, c waits for both: two rounds, not three
+        assert elapsed < 0.28
+    finally:
+        registry.unregister("test_record")
+
+
+def test_dag_failure_skips_dependents_only():
+    def broken():
+        raise ValueError("boom")
+
+    _register("test_broken", broken)
+    _register("test_echo", lambda text="hi": text)
+    executor = ChainExecutorNode()
+    try:
+        output = executor.process({"action": "use_tools", "steps": [
+            {"tool": "test_broken", "args": {}},
+            {"tool": "test_echo", "args": {"text": "x"}, "depends_on": 1},
+            {"tool": "test_echo", "args": {"text": "y"}, "depends_on": [2]},
+            {"tool": "test_echo", "args": {"text": "z"}},
+        ]})
+        results = output["results"]
+
+        assert "boom" in results[0]["error"]
+        assert results[1]["error"] == "Skipped: dependency [1] failed"
+        assert results[2]["error"] == "Skipped: dependency [2] failed"
+        assert results[3]["result"] == "z"
+        assert output["successful_steps"] == "1 / 4"
+    finally:
+        registry.unregister("test_broken")
+        registry.unregister("test_echo")
+
+
+def test_dag_hung_steps_do_not_block_later_plans():
+    release = threading.Event()
+    _register("test_hang", lambda: release.wait(30), timeout=0.1)
+    _register("test_echo", lambda text="hi": text)
+    executor = ChainExecutorNode(max_workers=2)
+    try:
+        for _ in range(5):
+            started = time.perf_counter()
+            output = executor.process({"action": "use_tools", "steps": [
+                {"tool": "test_hang", "args": {}},
+                {"tool": "test_hang", "args": {}},
+                {"tool": "test_echo", "args": {"text": "ok"}},
+            ]})
+            assert time.perf_counter() - started < 1.0
+            assert ["Timed out" in r.get("error", "") for r in output["results"]] == [True, True, False]
+            assert output["results"][2]["result"] == "ok"
+    finally:
+        release.set()
+        registry.unregister("test_hang")
+        registry.unregister("test_echo")
+
+
+class _Planner:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def process(self, user_message, history):
+        return self.plan
+
+
+class _Answerer:
+    """ Records what each answer call was given instead of calling an LLM """
+
+    def __init__(self):
+        self.calls = []
+
+    def process(self, user_message, tool_output, history):
+        self.calls.append(("answer", tool_output))
+        yield "answer"
+
+    def process_followup(self, user_message, tool_output, answer, late, history):
+        self.calls.append(("followup", late))
+        yield "more"
+
+
+def test_progressive_answer_starts_on_the_first_result():
+    release = threading.Event()
+    _register("test_slow", lambda: release.wait(2) and "late")
+    _register("test_echo", lambda text="hi": text)
+    answerer = _Answerer()
+    pipeline = ChatPipeline(
+        planner=_Planner({"action": "use_tools", "steps": [
+            {"tool": "test_echo", "args": {"text": "fast"}},
+            {"tool": "test_slow", "args": {}},
+        ]}),
+        answerer=answerer,
+        answer_budget=5.0,
+    )
+    try:
+        started = time.perf_counter()
+        chunks = pipeline.run_turn("hi", [])
+        assert next(chunks) == "answer"
+        # well before the budget: the fast result was enough to start
+        assert time.perf_counter() - started < 1.0
+        release.set()
+        assert list(chunks) == ["\n\n", "more"]
+
+        (_, first), (_, late) = answerer.calls
+        assert first["results"][0]["result"] == "fast" and first["results"][1]["pending"]
+        assert late["results"][0]["result"] == "late"
+    finally:
+        release.set()
+        registry.unregister("test_slow")
+        registry.unregister("test_echo")
+
+
+def test_answer_prompt_leaves_out_timings():
+    _register("test_echo", lambda text="hi": text)
+    try:
+        for plan in [
+            {"action": "use_tool", "tool": "test_echo", "args": {}},
+            {"action": "use_tools", "steps": [{"tool": "test_echo", "args": {}}, {"tool": "test_echo", "args": {}}]},
+        ]:
+            tool_output = ChainExecutorNode().process(plan)
+            assert "duration_ms" in tool_output["results"][0]
+            prompt = AnswerNode()._build_messages("hi", tool_output, [])[-1]["content"]
+            assert "duration_ms" not in prompt and "elapsed_ms" not in prompt
+            assert '"result": "hi"' in prompt
+    finally:
+        registry.unregister("test_echo")
@@ -0,0 +1,65 @@
+import json
+import time
+import threading
+import requests
+from chatbot.utils.fake_ollama import FakeOllamaConfig, start_fake_ollama, tokenize
+
+
+def _chat(server, content="hi", stream=False, **payload):
+    return requests.post(server.url, json={"model": "m", "messages": [{"role": "user", "content": content}], "stream": stream, **payload}, timeout=5)
+
+
+def test_streamed_and_plain_replies():
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, token_delay=0.0, rules=[(r"\bweather\b", "It is sunny today.")]))
+    try:
+        body = _chat(server, "how is the weather?").json()
+        assert body["message"]["content"] == "It is sunny today." and body["done"]
+        assert body["eval_count"] == len(tokenize("It is sunny today."))
+
+        response = _chat(server, "what's the weather", stream=True)
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+        assert "".join(line["message"]["content"] for line in lines) == "It is sunny today."
+        assert [line["done"] for line in lines] == [False] * (len(lines) - 1) + [True]
+        assert "prompt_eval_count" in lines[-1]
+
+        # structured-output requests get the plan, the rest the answer text
+        assert json.loads(_chat(server, "hello", format={"type": "object"}).json()["message"]["content"]) == {"action": "answer_direct"}
+        assert requests.get(server.url.replace("/api/chat", "/api/tags"), timeout=5).json()["models"]
+    finally:
+        server.shutdown()
+
+
+def test_injected_errors_are_reproducible():
+    def statuses(seed):
+        server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, error_rate=0.5, error_statuses=(429, 500), seed=seed))
+        try:
+            return [_chat(server).status_code for _ in range(20)], server.stats["errors_injected"]
+        finally:
+            server.shutdown()
+
+    first, injected = statuses(7)
+    assert statuses(7) == (first, injected)
+    assert set(first) <= {200, 429, 500} and 0 < injected < 20 and first.count(200) == 20 - injected
+
+
+def test_concurrency_limit_queues_and_full_queue_is_rejected():
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.2, token_delay=0.0, max_concurrency=1, max_queue=1))
+    results = []
+    try:
+        def call():
+            results.append(_chat(server).status_code)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+            time.sleep(0.03)
+        for thread in threads:
+            thread.join(5)
+
+        # one generating, one queued behind it, the third turned away
+        assert sorted(results) == [200, 200, 503]
+        assert time.perf_counter() - started >= 0.4
+        assert server.stats["rejected"] == 1
+    finally:
+        server.shutdown()
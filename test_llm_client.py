@@ -0,0 +1,84 @@
+import json
+import asyncio
+from chatbot.utils.call_llm import call_llm, call_llm_stream
+from chatbot.utils.fake_ollama import FakeOllamaConfig, start_fake_ollama
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient
+from chatbot.utils.resilience import RetryPolicy
+
+
+def _start(**config):
+    """ Fake server that also counts accepted TCP connections """
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, token_delay=0.0, rules=[(r".", "Hello there friend.")], **config))
+    server.connections = 0
+    accept = server.process_request
+
+    def counting(request, client_address):
+        server.connections += 1
+        accept(request, client_address)
+
+    server.process_request = counting
+    return server
+
+
+def test_sync_calls_reuse_one_connection():
+    server = _start()
+    client = LLMClient(url=server.url)
+    try:
+        for _ in range(5):
+            assert call_llm(prompt="hi", client=client) == "Hello there friend."
+        assert "".join(call_llm_stream(prompt="hi", client=client)) == "Hello there friend."
+        assert server.connections == 1
+
+        stats = client.latency_stats()
+        assert stats["requests"] == 6 and stats["errors"] == 0 and stats["avg_latency_s"] > 0
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_async_calls_reuse_one_connection():
+    server = _start()
+
+    async def main():
+        client = AsyncLLMClient(url=server.url)
+        try:
+            replies = [await client.chat([{"role": "user", "content": "hi"}]) for _ in range(5)]
+            chunks = [chunk async for chunk in client.chat_stream([{"role": "user", "content": "hi"}])]
+            return replies, "".join(chunks)
+        finally:
+            await client.close()
+
+    try:
+        replies, streamed = asyncio.run(main())
+        assert replies == ["Hello there friend."] * 5 and streamed == "Hello there friend."
+        assert server.connections == 1
+    finally:
+        server.shutdown()
+
+
+def test_request_body_carries_options_and_format():
+    seen = []
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, responder=lambda payload: seen.append(payload) or "{}"))
+    client = LLMClient(url=server.url, model="m1")
+    try:
+        client.chat([{"role": "user", "content": "hi"}], format={"type": "object"}, options={"num_predict": 8}, keep_alive="30m")
+        payload, = seen
+        assert (payload["model"], payload["stream"], payload["keep_alive"]) == ("m1", False, "30m")
+        assert payload["format"] == {"type": "object"} and payload["options"] == {"num_predict": 8}
+        assert client.latency_stats()["request_bytes"] > len(json.dumps(payload["messages"]))
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_transient_errors_are_retried_and_counted():
+    server = _start(error_rate=1.0, error_statuses=(503,), seed=1)
+    client = LLMClient(url=server.url, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0))
+    try:
+        reply = call_llm(prompt="hi", client=client)
+        assert reply == "Something went wrong while accessing the AI service, please try again later."
+        assert server.stats["errors_injected"] == 3
+        assert client.latency_stats()["errors"] == 3
+    finally:
+        client.close()
+        server.shutdown()
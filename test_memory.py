@@ -0,0 +1,71 @@
+import threading
+from chatbot.utils.memory import ConversationMemory, estimate_tokens, message_tokens
+
+
+def _fill(memory, turns, words=20):
+    for i in range(turns):
+        memory.add("user", f"question {i} " + "word " * words)
+        memory.add("assistant", f"answer {i} " + "word " * words)
+
+
+def test_estimate_tokens_is_local_and_monotonic():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a b c d e") == 5           # never fewer tokens than words
+    assert estimate_tokens("x" * 400) == 100
+    assert message_tokens({"role": "user", "content": "x" * 40}) > estimate_tokens("x" * 40)
+
+
+def test_each_consumer_gets_its_own_budget():
+    memory = ConversationMemory(budgets={"planner": 100, "default": 400}, summarize_fn=None)
+    _fill(memory, 10)
+    memory.add("user", "current question")
+
+    planner, answer = memory.messages_for("planner"), memory.messages_for("answer")
+    assert planner[-1]["content"] == answer[-1]["content"] == "current question"
+    assert len(planner) < len(answer) < len(memory)
+    assert sum(message_tokens(m) for m in planner) <= 100
+    assert sum(message_tokens(m) for m in answer) <= 400
+
+
+def test_current_message_is_kept_even_over_budget():
+    memory = ConversationMemory(budgets={"default": 10}, summarize_fn=None)
+    memory.add("user", "word " * 100)
+    assert len(memory.messages_for()) == 1
+
+
+def test_old_turns_fold_into_the_summary_in_the_background():
+    release = threading.Event()
+    calls = []
+
+    def summarize(previous, messages):
+        release.wait(5)
+        calls.append((previous, len(messages)))
+        return f"summary of {len(messages)} more"
+
+    memory = ConversationMemory(budgets={"default": 200}, summarize_fn=summarize)
+    _fill(memory, 6)
+    assert memory.summary == ""                     # add() did not wait for the summarizer
+    assert not memory.wait_for_summary(timeout=0.05)
+
+    release.set()
+    assert memory.wait_for_summary(timeout=5)
+    folded = calls[0][1]
+    assert calls[0][0] == "" and folded >= memory.fold_batch
+    assert len(memory) == 12 - folded
+    window = memory.messages_for()
+    assert window[0]["role"] == "system" and memory.summary in window[0]["content"]
+
+    # the next fold builds on the previous summary
+    _fill(memory, 4)
+    memory.wait_for_summary(timeout=5)
+    assert calls[1][0] == f"summary of {folded} more"
+
+
+def test_failed_summary_keeps_the_messages():
+    def summarize(previous, messages):
+        raise ConnectionError("down")
+
+    memory = ConversationMemory(budgets={"default": 200}, summarize_fn=summarize, background=False)
+    _fill(memory, 6)
+    assert memory.summary == "" and len(memory) == 12
+    assert memory.messages_for()[-1]["content"].startswith("answer 5")
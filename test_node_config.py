@@ -0,0 +1,71 @@
+import json
+import requests
+from chatbot.nodes.planner_node import PlannerNode
+from chatbot.utils import node_config
+from chatbot.utils.node_config import NodeLLMConfig, get_node_config, load_node_configs
+from chatbot.utils.scheduler import PRIORITY_ANSWER, PRIORITY_INTERACTIVE
+
+GOOD_PLAN = {"action": "use_tool", "tool": "get_time", "args": {}}
+
+
+class _Client:
+    """ Planner client answering per model; an Exception reply is raised """
+
+    def __init__(self, replies: dict):
+        self.replies = replies
+        self.calls = []
+
+    def chat(self, messages, model=None, **kwargs):
+        self.calls.append((model, kwargs["options"]))
+        reply = self.replies[model]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def _planner(replies: dict) -> PlannerNode:
+    planner = PlannerNode(client=_Client(replies))
+    planner.config = NodeLLMConfig(options={"num_predict": 64}, model="small", escalate_model="big", priority=PRIORITY_INTERACTIVE)
+    return planner
+
+
+def test_routing_file_overrides_and_merges(tmp_path, monkeypatch):
+    monkeypatch.setattr(node_config, "NODE_CONFIGS", dict(node_config.NODE_CONFIGS))
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({
+        "planner": {"model": "tiny", "options": {"temperature": 0.2}},
+        "answer": {"model": "large", "num_ctx": 8192, "priority": "answer"},
+    }))
+    load_node_configs(str(path))
+
+    planner = get_node_config("planner")
+    assert planner.model == "tiny"
+    assert planner.options["temperature"] == 0.2 and planner.options["num_predict"] == 256     # merged
+    assert planner.priority == PRIORITY_INTERACTIVE
+
+    answer = get_node_config("answer")
+    assert (answer.model, answer.options["num_ctx"], answer.priority) == ("large", 8192, PRIORITY_ANSWER)
+    assert get_node_config("nonexistent") is get_node_config("default")
+
+
+def test_planner_uses_its_own_model_and_options():
+    planner = _planner({"small": json.dumps(GOOD_PLAN)})
+    assert planner.process("what time is it?", []) == GOOD_PLAN
+    assert planner.client.calls == [("small", {"num_predict": 64})]
+    assert planner.stats()["escalations"] == 0
+
+
+def test_unusable_plan_escalates_to_the_bigger_model():
+    planner = _planner({"small": "sure, I'll check the time", "big": json.dumps(GOOD_PLAN)})
+    assert planner.process("what time is it?", []) == GOOD_PLAN
+    assert [model for model, _ in planner.client.calls] == ["small", "big"]
+    assert planner.stats()["escalations"] == 1
+
+
+def test_failed_llm_call_does_not_escalate():
+    planner = _planner({"small": requests.ConnectionError("refused"), "big": json.dumps(GOOD_PLAN)})
+    plan = planner.process("what time is it?", [])
+    assert plan["action"] == "answer_direct"
+    assert [model for model, _ in planner.client.calls] == ["small"]
+    stats = planner.stats()
+    assert (stats["llm_errors"], stats["escalations"]) == (1, 0)
@@ -0,0 +1,70 @@
+import json
+import time
+import asyncio
+from chatbot.nodes.answer_node import AnswerNode
+from chatbot.nodes.planner_node import PlannerNode
+from chatbot.pipeline import ChatPipeline
+from chatbot.utils.fake_ollama import FakeOllamaConfig, start_fake_ollama
+from chatbot.utils.llm_client import LLMClient, AsyncLLMClient
+
+ANSWER = "It is a quarter past three."
+
+
+def _responder(payload: dict) -> str:
+    # planner requests carry the plan schema as `format`
+    if payload.get("format") is None:
+        return ANSWER
+    last_user = next(m["content"] for m in reversed(payload["messages"]) if m["role"] == "user")
+    if "time" in last_user:
+        return json.dumps({"action": "use_tool", "tool": "get_time", "args": {}})
+    return json.dumps({"action": "answer_direct"})
+
+
+def _pipeline(server):
+    client = LLMClient(url=server.url)
+    async_client = AsyncLLMClient(url=server.url)
+    pipeline = ChatPipeline(
+        planner=PlannerNode(client=client, async_client=async_client),
+        answerer=AnswerNode(client=client, async_client=async_client),
+    )
+    return pipeline, client, async_client
+
+
+def test_sessions_share_one_event_loop():
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.2, token_delay=0.0, responder=_responder, max_concurrency=16))
+    pipeline, client, async_client = _pipeline(server)
+
+    async def session(i: int) -> str:
+        chunks = []
+        async for chunk in pipeline.arun_turn("what time is it?", [{"role": "user", "content": "what time is it?"}], session_id=f"s{i}"):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    async def main():
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(session(i) for i in range(8)))
+        elapsed = time.perf_counter() - started
+        await async_client.close()
+        return answers, elapsed
+
+    try:
+        answers, elapsed = asyncio.run(main())
+        assert answers == [ANSWER] * 8
+        # 8 sessions x (plan + answer) at 0.2s each would take >3s one after another
+        assert elapsed < 1.5
+        assert server.stats["requests"] == 16
+        assert pipeline.planner.stats()["fallbacks"] == 0
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_sync_run_turn_still_works():
+    server = start_fake_ollama(FakeOllamaConfig(ttft=0.0, token_delay=0.0, responder=_responder))
+    pipeline, client, _ = _pipeline(server)
+    try:
+        history = [{"role": "user", "content": "hello"}]
+        assert "".join(pipeline.run_turn("hello", history)) == ANSWER
+    finally:
+        client.close()
+        server.shutdown()
@@ -0,0 +1,88 @@
+import time
+from chatbot.tools.tool_executor import ToolRegistry
+from chatbot.utils.plan_cache import PlanCache, SqlitePlanStore
+
+WEATHER_PLAN = {"action": "use_tool", "tool": "weather", "args": {"location": "Oslo"}}
+
+
+def _registry() -> ToolRegistry:
+    registry = ToolRegistry()
+    registry.tool("Weather for a location.", name="weather")(lambda location: "Sunny")
+    return registry
+
+
+def test_hits_on_normalized_message_and_returns_copies():
+    cache = PlanCache(_registry())
+    cache.put("Weather in Oslo?", WEATHER_PLAN)
+
+    plan = cache.get("  weather   in oslo ")
+    assert plan == WEATHER_PLAN
+    plan["args"]["location"] = "changed"
+    assert cache.get("weather in oslo") == WEATHER_PLAN
+    assert cache.stats()["hits"] == 2
+
+
+def test_turns_with_history_bypass_the_cache():
+    cache = PlanCache(_registry())
+    history = [{"role": "user", "content": "weather in oslo"}, {"role": "assistant", "content": "Sunny"}, {"role": "user", "content": "and tomorrow?"}]
+    cache.put("and tomorrow?", WEATHER_PLAN, history)
+    assert cache.get("and tomorrow?", history) is None
+    assert cache.stats()["bypassed"] == 1 and cache.stats()["size"] == 0
+
+    keyed = PlanCache(_registry(), history_turns=2)
+    keyed.put("and tomorrow?", WEATHER_PLAN, history)
+    assert keyed.get("and tomorrow?", history) == WEATHER_PLAN
+    other = [{"role": "user", "content": "weather in rome"}, {"role": "assistant", "content": "Rainy"}, {"role": "user", "content": "and tomorrow?"}]
+    assert keyed.get("and tomorrow?", other) is None
+
+
+def test_new_tool_changes_the_key_and_removed_tool_invalidates():
+    registry = _registry()
+    cache = PlanCache(registry)
+    cache.put("weather in oslo", WEATHER_PLAN)
+    before = cache.catalog
+
+    registry.tool("Current time.", name="time")(lambda: "now")
+    assert cache.catalog != before
+    # the planner may now pick the new tool: the old plan no longer matches
+    assert cache.get("weather in oslo") is None
+
+    cache.put("weather in oslo", WEATHER_PLAN)
+    assert cache.get("weather in oslo") == WEATHER_PLAN
+    registry.unregister("weather")
+    assert cache.get("weather in oslo") is None
+
+    # a plan for a tool that is gone is never stored
+    cache.put("rain in oslo", WEATHER_PLAN)
+    assert cache.get("rain in oslo") is None
+
+
+def test_stale_plan_is_dropped_on_validation():
+    cache = PlanCache(_registry())
+    cache.put("weather in oslo", WEATHER_PLAN)
+    cache.validate_fn = lambda plan, tools: False
+    assert cache.get("weather in oslo") is None
+    assert cache.stats()["invalid"] == 1 and cache.stats()["size"] == 0
+
+
+def test_ttl_and_lru_bounds():
+    cache = PlanCache(_registry(), max_entries=2, ttl=0.1)
+    for city in ["oslo", "rome", "paris"]:
+        cache.put(f"weather in {city}", WEATHER_PLAN)
+    assert cache.get("weather in oslo") is None
+    assert cache.stats()["evictions"] == 1
+
+    time.sleep(0.15)
+    assert cache.get("weather in paris") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_plans_survive_a_restart(tmp_path):
+    path = str(tmp_path / "plans.db")
+    cache = PlanCache(_registry(), store=SqlitePlanStore(path))
+    cache.put("weather in oslo", WEATHER_PLAN)
+    cache.store.close()
+
+    cache = PlanCache(_registry(), store=SqlitePlanStore(path))
+    assert cache.get("weather in oslo") == WEATHER_PLAN
+    cache.store.close()
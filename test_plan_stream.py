@@ -0,0 +1,137 @@
+import json
+import threading
+import pytest
+from chatbot.nodes.chain_executor_node import ChainExecutorNode
+from chatbot.nodes.planner_node import PlannerNode, parse_plan_strict
+from chatbot.utils.plan_stream import PlanStreamParser
+from chatbot.tools import registry
+
+
+def _events(text: str, chunk_size: int = 1) -> list:
+    parser = PlanStreamParser()
+    events = []
+    for i in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[i:i + chunk_size]))
+    assert parser.raw == text
+    return events
+
+
+def _steps(events: list) -> list:
+    return [value for kind, _, value in events if kind == "step"]
+
+
+def _fields(events: list) -> dict:
+    return {key: value for kind, key, value in events if kind == "field"}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_braces_and_escapes_inside_strings(chunk_size):
+    tricky = 'a}"b{,] \\\\ [x'
+    plan = {"action": "use_tools", "steps": [
+        {"tool": "fake_weather", "args": {"location": tricky}},
+        {"tool": "get_time", "args": {}},
+    ]}
+    events = _events(json.dumps(plan), chunk_size)
+
+    assert _steps(events) == plan["steps"]
+    assert _fields(events) == plan
+
+
+def test_code_fence_and_preamble_are_skipped():
+    text = 'Sure! ```json\n{"action": "use_tool", "tool": "get_time", "args": {}}\n```'
+    events = _events(text)
+
+    assert _fields(events) == {"action": "use_tool", "tool": "get_time", "args": {}}
+    assert parse_plan_strict(text.split("Sure! ", 1)[1])["tool"] == "get_time"
+
+
+def test_fields_out_of_order():
+    steps = [{"tool": "get_time", "args": {}}, {"tool": "random_number", "args": {}}]
+    events = _events(json.dumps({"steps": steps, "action": "use_tools"}))
+
+    # steps are reported while "action" hasn't been seen yet
+    assert [kind for kind, _, _ in events] == ["step", "step", "field", "field"]
+    assert _steps(events) == steps
+    assert _fields(events)["action"] == "use_tools"
+
+    events = _events('{"args": {"location": "Oslo"}, "tool": "fake_weather", "action": "use_tool"}')
+    assert _fields(events) == {"args": {"location": "Oslo"}, "tool": "fake_weather", "action": "use_tool"}
+
+
+def test_truncated_stream_reports_only_complete_pieces():
+    full = json.dumps({"action": "use_tools", "steps": [
+        {"tool": "get_time", "args": {}},
+        {"tool": "fake_weather", "args": {"location": "Tok"}},
+    ]})
+    text = full[:full.index("Tok") + 3]
+    events = _events(text)
+
+    assert _steps(events) == [{"tool": "get_time", "args": {}}]
+    assert _fields(events) == {"action": "use_tools"}
+    with pytest.raises(json.JSONDecodeError):
+        parse_plan_strict(text)
+
+
+def test_discarded_guess_is_not_used_for_a_different_call():
+    calls = []
+    lock = threading.Lock()
+
+    def lookup(query: str):
+        with lock:
+            calls.append(query)
+        return query.upper()
+
+    registry.tool("Test lookup.", name="test_lookup", side_effect_free=True)(lookup)
+    registry.tool("Test write.", name="test_write")(lambda text="": text)
+    executor = ChainExecutorNode()
+    try:
+        prefetch = executor.prefetcher()
+        assert prefetch.submit({"tool": "test_lookup", "args": {"query": "guess"}}, speculative=True)
+        # tools with side effects are never guessed
+        assert not prefetch.submit({"tool": "test_write", "args": {}}, speculative=True)
+
+        output = executor.process({"action": "use_tool", "tool": "test_lookup", "args": {"query": "real"}}, prefetch)
+        prefetch.discard()
+
+        assert output["results"][0]["result"] == "REAL"
+        stats = executor.stats()
+        assert (stats["speculative"], stats["used"], stats["wasted"]) == (1, 0, 1)
+        assert "real" in calls
+
+        # a guess the plan confirms is used instead of running the tool again
+        prefetch = executor.prefetcher()
+        prefetch.submit({"tool": "test_lookup", "args": {"query": "again"}}, speculative=True)
+        assert prefetch.submit({"tool": "test_lookup", "args": {"query": "again"}})
+        output = executor.process({"action": "use_tool", "tool": "test_lookup", "args": {"query": "again"}}, prefetch)
+        prefetch.discard()
+
+        assert output["results"][0]["result"] == "AGAIN"
+        assert calls.count("again") == 1
+        assert executor.stats()["confirmed"] == 1
+    finally:
+        registry.unregister("test_lookup")
+        registry.unregister("test_write")
+
+
+class _StreamingClient:
+    """ Planner client streaming a canned plan in small pieces """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def chat_stream(self, messages, **kwargs):
+        for i in range(0, len(self.text), 5):
+            yield self.text[i:i + 5]
+
+
+def test_streaming_planner_dispatches_steps_and_keeps_stdout_quiet(capsys):
+    plan = {"action": "use_tools", "steps": [{"tool": "get_time", "args": {}}, {"tool": "random_number", "args": {}}]}
+    planner = PlannerNode(client=_StreamingClient(json.dumps(plan)))
+    executor = ChainExecutorNode()
+    prefetch = executor.prefetcher()
+    try:
+        assert planner.process_streaming("time and a number?", [], prefetch) == plan
+        assert executor.stats()["streamed"] == 2
+    finally:
+        prefetch.discard()
+    assert "DEBUG" not in capsys.readouterr().out
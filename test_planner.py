@@ -0,0 +1,80 @@
+import json
+import pytest
+from chatbot.nodes.planner_node import PlannerNode, parse_plan_strict, plan_schema
+from chatbot.nodes.react_node import ReactNode
+from chatbot.tools import registry
+from chatbot.utils.json_schema import schema_errors
+
+
+class _Client:
+    """ Scripted replies; records the keyword arguments of each request """
+
+    model = "test"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def chat(self, messages, **kwargs):
+        self.requests.append(kwargs)
+        return self.replies.pop(0)
+
+
+def test_planner_sends_the_registry_schema_and_a_decode_cap():
+    client = _Client('{"action": "use_tool", "tool": "fake_weather", "args": {"location": "Tokyo"}}')
+    planner = PlannerNode(client=client)
+    plan = planner.process("weather in tokyo?", [])
+
+    assert plan["tool"] == "fake_weather" and plan["args"] == {"location": "Tokyo"}
+    request, = client.requests
+    assert request["format"] == plan_schema()
+    assert request["options"]["num_predict"] <= 256
+    assert planner.stats()["fallbacks"] == 0
+
+
+@pytest.mark.parametrize("raw", [
+    '{"action": "use_tool", "tool": "no_such_tool", "args": {}}',
+    '{"action": "use_tool", "tool": "fake_weather", "args": {"city": "Tokyo"}}',
+    '{"action": "use_tools", "steps": []}',
+    '{"action": "dance"}',
+])
+def test_invalid_plans_are_rejected(raw):
+    with pytest.raises(ValueError):
+        parse_plan_strict(raw)
+
+
+def test_code_fenced_plan_is_accepted():
+    plan = parse_plan_strict('```json\n{"action": "use_tools", "steps": [{"tool": "get_time", "args": {}}]}\n```')
+    assert plan["steps"] == [{"tool": "get_time", "args": {}}]
+
+
+def test_unusable_output_is_counted_and_falls_back():
+    planner = PlannerNode(client=_Client("sure, let me check", '{"action": "use_tool", "tool": "nope"}'))
+    assert planner.process("a", [])["action"] == "answer_direct"
+    assert planner.process("b", [])["action"] == "answer_direct"
+    stats = planner.stats()
+    assert (stats["parse_failures"], stats["validation_failures"], stats["fallbacks"]) == (1, 1, 2)
+
+
+def test_any_of_errors_point_at_the_closest_shape():
+    errors = schema_errors({"action": "use_tool", "tool": "fake_weather", "args": {"location": 3}}, plan_schema())
+    assert "matches none of" in errors[0]
+    assert any("$.args.location: expected string" in e for e in errors[1:])
+
+
+def test_react_keeps_nested_args_intact():
+    seen = []
+
+    def search(query: str, filters: dict):
+        seen.append(filters)
+        return "found"
+
+    registry.tool("Search with filters.", name="test_search")(search)
+    try:
+        filters = {"range": {"from": 1, "to": 5}, "tags": ["a"]}
+        decision = {"action": "use_tool", "tool": "test_search", "args": {"query": "x", "filters": filters}}
+        react = ReactNode(client=_Client(json.dumps(decision), '{"action": "finish", "answer": "ok"}'))
+        assert react.process("q", [])["answer"] == "ok"
+        assert seen == [filters]
+    finally:
+        registry.unregister("test_search")
@@ -0,0 +1,101 @@
+import json
+from chatbot.nodes.planner_node import PlannerNode, parse_plan_strict, plan_schema
+from chatbot.nodes.answer_node import AnswerNode, ANSWER_LAYOUT
+from chatbot.nodes.react_node import ReactNode, ReactTurn, decision_schema
+from chatbot.nodes.unified_node import UnifiedNode
+from chatbot.tools import registry
+from chatbot.utils.memory import ConversationMemory
+from chatbot.utils.prompt_builder import encode_messages
+
+
+def _bytes(messages):
+    return json.dumps(messages, ensure_ascii=False).encode("utf-8")
+
+
+def _two_turns():
+    turn1 = [{"role": "user", "content": "what time is it?"}]
+    turn2 = turn1 + [
+        {"role": "assistant", "content": "It is 3:15 PM."},
+        {"role": "user", "content": "and the weather in Tokyo?"},
+    ]
+    return turn1, turn2
+
+
+def test_planner_prefix_is_stable_across_turns():
+    planner = PlannerNode()
+    turn1, turn2 = _two_turns()
+
+    first = planner._build_messages(turn1[-1]["content"], turn1)
+    second = planner._build_messages(turn2[-1]["content"], turn2)
+
+    # everything sent last turn is a byte-identical prefix of this turn
+    assert _bytes(second[:len(first)]) == _bytes(first)
+
+
+def test_answer_prefix_is_stable_across_turns():
+    answerer = AnswerNode()
+    turn1, turn2 = _two_turns()
+
+    first = answerer._build_messages(turn1[-1]["content"], {"results": [{"result": {"time": "15:15"}}]}, turn1)
+    second = answerer._build_messages(turn2[-1]["content"], {"results": [{"result": {"forecast": "Sunny"}}]}, turn2)
+
+    # only the trailing tool block may differ
+    assert _bytes(second[:len(first) - 1]) == _bytes(first[:-1])
+    assert first[-1]["content"].startswith("Tool output")
+
+
+def test_react_prefix_is_stable_across_iterations():
+    react = ReactNode()
+    react._run_calls = lambda calls: [f"Tool {call['tool']} returned {{'time': '15:15'}}" for call in calls]
+    turn = ReactTurn("what time is it?")
+
+    first = list(turn.messages)
+    raw = '{"action": "use_tool", "tool": "get_time", "args": {}}'
+    react._handle_decision(json.loads(raw), raw, turn)
+    second = turn.messages
+
+    # the whole previous prompt (not just the system prompt) is reused verbatim
+    assert _bytes(second[:len(first)]) == _bytes(first)
+    assert second[len(first)]["content"] == raw
+
+
+def test_late_registered_tool_reaches_prompts_and_schemas():
+    planner = PlannerNode()
+    before = planner._build_messages("hi", [])
+    assert _bytes(planner._build_messages("hi", [])) == _bytes(before)
+
+    registry.tool("Looks up a stock price.", name="test_stock_price")(lambda symbol: 42.0)
+    try:
+        for messages in (planner._build_messages("hi", []), ReactTurn("hi").messages, UnifiedNode()._build_messages("hi", [])):
+            assert "test_stock_price" in messages[0]["content"]
+
+        # the tool's own args schema is enforced
+        parse_plan_strict('{"action": "use_tool", "tool": "test_stock_price", "args": {"symbol": "ACME"}}')
+        try:
+            parse_plan_strict('{"action": "use_tool", "tool": "test_stock_price", "args": {}}')
+            assert False, "missing required arg was accepted"
+        except ValueError as e:
+            assert "symbol" in str(e)
+        assert "test_stock_price" in json.dumps(decision_schema())
+    finally:
+        registry.unregister("test_stock_price")
+    assert "test_stock_price" not in json.dumps(plan_schema())
+
+if __name__ == "__main__":
+    test_planner_prefix_is_stable_across_turns()
+    test_answer_prefix_is_stable_across_turns()
+    test_react_prefix_is_stable_across_iterations()
+    print("prompt prefixes are stable")
+
+
+def test_history_messages_are_shared_and_encoded_once():
+    memory = ConversationMemory(summarize_fn=None)
+    memory.add("user", 'quote " and ünïcode')
+    memory.add("assistant", "ok")
+
+    planner_view, answer_view = memory.messages_for("planner"), memory.messages_for("answer")
+    assert planner_view[0] is answer_view[0]
+
+    messages = ANSWER_LAYOUT.build('quote " and ünïcode', answer_view)
+    assert encode_messages(messages) == _bytes(messages)
+    assert answer_view[0].encoded == _bytes(answer_view[0])
@@ -0,0 +1,112 @@
+import json
+import time
+import threading
+from chatbot.nodes.react_node import FINISH_SCHEMA, ReactNode
+from chatbot.tools import registry
+
+
+class _Client:
+    """ Scripted decisions; records each request's messages and format """
+
+    model = "test"
+
+    def __init__(self, *decisions):
+        self.decisions = [d if isinstance(d, str) else json.dumps(d) for d in decisions]
+        self.requests = []
+
+    def chat(self, messages, format=None, **kwargs):
+        self.requests.append((list(messages), format))
+        return self.decisions.pop(0)
+
+
+def _lookup(query: str):
+    return query.upper()
+
+
+def _use(query: str) -> dict:
+    return {"action": "use_tool", "tool": "test_lookup", "args": {"query": query}}
+
+
+def _finish(answer: str) -> dict:
+    return {"action": "finish", "answer": answer}
+
+
+def setup_module():
+    registry.tool("Test lookup.", name="test_lookup")(_lookup)
+
+
+def teardown_module():
+    registry.unregister("test_lookup")
+
+
+def test_tool_then_finish_extends_the_same_prompt():
+    client = _Client(_use("tokyo"), _finish("It is TOKYO."))
+    react = ReactNode(client=client)
+    assert react.process("weather in tokyo?", []) == {"action": "finish", "answer": "It is TOKYO."}
+
+    (first, _), (second, _) = client.requests
+    assert second[:len(first)] == first         # only appended to: the cached prefix is reused
+    assert second[len(first)]["content"] == json.dumps(_use("tokyo"))
+    assert "Tool test_lookup returned TOKYO" in second[-1]["content"]
+    assert react.stats()["llm_calls"] == 2 and react.stats()["tool_calls"] == 1
+
+
+def test_repeated_call_forces_the_final_answer():
+    client = _Client(_use("a"), _use("a"), _finish("done"))
+    react = ReactNode(client=client)
+    assert react.process("q", [])["answer"] == "done"
+    assert [fmt is FINISH_SCHEMA for _, fmt in client.requests] == [False, False, True]
+    stats = react.stats()
+    assert (stats["tool_calls"], stats["repeats"], stats["forced_finish"]) == (1, 1, 1)
+
+
+def test_last_iteration_may_only_finish():
+    client = _Client(*[_use(str(i)) for i in range(ReactNode.max_iter - 1)], _finish("enough"))
+    react = ReactNode(client=client)
+    assert react.process("q", [])["answer"] == "enough"
+    assert client.requests[-1][1] is FINISH_SCHEMA
+    assert len(client.requests) == ReactNode.max_iter
+
+
+def test_several_tools_run_concurrently():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(query: str):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+        return query
+
+    registry.tool("Slow lookup.", name="test_slow")(slow)
+    try:
+        steps = [{"tool": "test_slow", "args": {"query": q}} for q in "abc"]
+        react = ReactNode(client=_Client({"action": "use_tools", "steps": steps}, _finish("ok")))
+        started = time.perf_counter()
+        assert react.process("q", [])["answer"] == "ok"
+        assert peak[0] == 3 and time.perf_counter() - started < 0.25
+    finally:
+        registry.unregister("test_slow")
+
+
+def test_bad_decisions_fall_back_to_an_answer():
+    react = ReactNode(client=_Client("not json"))
+    assert react.process("q", [])["action"] == "finish"
+    react = ReactNode(client=_Client({"action": "use_tool", "tool": "no_such_tool"}))
+    assert react.process("q", [])["action"] == "finish"
+    assert react.stats()["validation_failures"] == 1
+
+
+def test_time_budget_stops_the_loop():
+    class Slow(_Client):
+        def chat(self, messages, format=None, **kwargs):
+            time.sleep(0.1)
+            return super().chat(messages, format, **kwargs)
+
+    client = Slow(*[_use(str(i)) for i in range(5)])
+    react = ReactNode(client=client, time_budget=0.15)
+    assert "couldn't form a complete answer" in react.process("q", [])["answer"]
+    assert len(client.requests) == 2 and react.stats()["out_of_time"] == 1
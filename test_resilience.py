@@ -0,0 +1,179 @@
+import time
+import asyncio
+import logging
+import pytest
+import requests
+from chatbot.utils.error_handler import RetryConfig, retry_with_backoff
+from chatbot.utils.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, RetryPolicy,
+    deadline_scope, is_retryable, retry_call, aretry_call, retry_stream,
+)
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status}", response=response)
+
+
+class _Flaky:
+    """ Fails with `errors` in order, then returns "ok" """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.1)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.12)
+    assert breaker.state == "half_open"
+    breaker.before_call()                   # the single probe goes out
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()               # everyone else still fails fast
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    assert breaker.stats()["opened"] == 1
+
+
+def test_failed_probe_reopens_and_released_probe_frees_the_slot():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.release()                       # e.g. a 400: says nothing about the backend
+    breaker.before_call()                   # so the next caller may probe
+
+
+def test_retryable_errors():
+    assert is_retryable(requests.ConnectionError())
+    assert is_retryable(_http_error(503))
+    assert is_retryable(_http_error(429))
+    assert not is_retryable(_http_error(400))
+    assert not is_retryable(CircuitOpenError())
+    assert not is_retryable(DeadlineExceeded())
+    assert not is_retryable(ValueError())
+
+
+def test_retry_call_retries_transient_errors_only():
+    breaker = CircuitBreaker("test", failure_threshold=5)
+    flaky = _Flaky(requests.ConnectionError(), _http_error(502))
+    retries = []
+    assert retry_call(flaky, FAST, breaker, on_retry=lambda attempt, e, delay: retries.append(attempt)) == "ok"
+    assert flaky.calls == 3 and retries == [1, 2]
+    assert breaker.stats()["consecutive_failures"] == 0
+
+    final = _Flaky(_http_error(400))
+    with pytest.raises(requests.HTTPError):
+        retry_call(final, FAST, breaker)
+    assert final.calls == 1
+    assert breaker.state == "closed"
+
+    exhausted = _Flaky(*[requests.ConnectionError()] * 3)
+    with pytest.raises(requests.ConnectionError):
+        retry_call(exhausted, FAST)
+    assert exhausted.calls == 3
+
+
+def test_open_breaker_fails_without_calling():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    flaky = _Flaky(*[requests.ConnectionError()] * 3)
+    # the breaker opens after the second failure, the third attempt never goes out
+    with pytest.raises(CircuitOpenError):
+        retry_call(flaky, FAST, breaker)
+    assert flaky.calls == 2
+    assert breaker.state == "open"
+
+    untouched = _Flaky()
+    with pytest.raises(CircuitOpenError):
+        retry_call(untouched, FAST, breaker)
+    assert untouched.calls == 0
+
+
+def test_deadline_stops_retries():
+    slow = RetryPolicy(max_attempts=5)
+    slow.backoff = lambda attempt: 1.0      # no jitter: always longer than the budget
+    flaky = _Flaky(*[requests.ConnectionError()] * 5)
+    started = time.monotonic()
+    with deadline_scope(0.2):
+        with pytest.raises(DeadlineExceeded):
+            retry_call(flaky, slow)
+    assert flaky.calls == 1
+    assert time.monotonic() - started < 0.5
+
+
+def test_aretry_call_matches_retry_call():
+    flaky = _Flaky(requests.ConnectionError())
+
+    async def attempt():
+        return flaky()
+
+    assert asyncio.run(aretry_call(attempt, FAST)) == "ok"
+    assert flaky.calls == 2
+
+
+def test_retry_stream_retries_only_before_the_first_chunk():
+    attempts = []
+
+    def failing_before_output():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise requests.ConnectionError()
+        yield "a"
+        yield "b"
+
+    assert list(retry_stream(failing_before_output, FAST)) == ["a", "b"]
+    assert len(attempts) == 2
+
+    attempts.clear()
+
+    def failing_mid_stream():
+        attempts.append(1)
+        yield "a"
+        raise requests.ConnectionError()
+
+    chunks = []
+    with pytest.raises(requests.ConnectionError):
+        for chunk in retry_stream(failing_mid_stream, FAST):
+            chunks.append(chunk)
+    # a partial answer is never replayed from the start
+    assert chunks == ["a"] and len(attempts) == 1
+
+
+def test_retry_with_backoff_logs_the_final_failure(caplog):
+    flaky = _Flaky(*[ValueError("bad input")] * 2)
+    config = RetryConfig(max_attempts=2, initial_delay=0.0, max_delay=0.0)
+    with caplog.at_level(logging.INFO, logger="chatbot.utils.error_handler"):
+        with pytest.raises(ValueError):
+            retry_with_backoff(flaky, config, tool_name="lookup")
+    assert flaky.calls == 2
+
+    messages = [(r.levelname, r.getMessage()) for r in caplog.records]
+    assert messages[0] == ("WARNING", "Tool 'lookup' failed on attempt 1: bad input")
+    assert messages[-2:] == [("WARNING", "Tool 'lookup' failed on attempt 2: bad input"), ("ERROR", "Tool 'lookup' failed after 2 attempts.")]
+
+    caplog.clear()
+    assert retry_with_backoff(_Flaky(ValueError("once")), config, tool_name="lookup") == "ok"
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import threading
+from chatbot.utils.response_cache import ResponseCache
+
+
+def _messages(question: str) -> list:
+    return [{"role": "system", "content": "You are helpful."}, {"role": "user", "content": question}]
+
+
+class _Upstream:
+    """ compute_fn whose chunks are released one at a time by the test """
+
+    def __init__(self, chunks, error: Exception = None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+        self.gates = [threading.Event() for _ in chunks]
+
+    def __call__(self):
+        self.calls += 1
+        return self._stream()
+
+    def _stream(self):
+        for chunk, gate in zip(self.chunks, self.gates):
+            gate.wait(2)
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+def _reader(cache, question, upstream, out):
+    def read():
+        try:
+            out.append("".join(cache.stream(_messages(question), "m", {}, upstream)))
+        except Exception as e:
+            out.append(e)
+    thread = threading.Thread(target=read)
+    thread.start()
+    return thread
+
+
+def test_readers_joining_mid_stream_get_the_whole_answer_from_one_upstream():
+    cache = ResponseCache()
+    upstream = _Upstream(["Hello", " there", " friend"])
+    out = []
+
+    first = _reader(cache, "hi", upstream, out)
+    upstream.gates[0].set()
+    time.sleep(0.05)
+    second = _reader(cache, "hi", upstream, out)          # joins after the first chunk
+    upstream.gates[1].set()
+    time.sleep(0.05)
+    third = _reader(cache, "hi", upstream, out)           # joins after the second
+    upstream.gates[2].set()
+    for thread in (first, second, third):
+        thread.join(2)
+
+    assert out == ["Hello there friend"] * 3
+    assert upstream.calls == 1
+    assert cache.stats()["coalesced"] == 2
+
+    # and the finished answer is served from the cache
+    assert "".join(cache.stream(_messages("hi"), "m", {}, upstream)) == "Hello there friend"
+    assert upstream.calls == 1
+
+
+def test_upstream_error_reaches_every_reader_and_is_not_cached():
+    cache = ResponseCache()
+    upstream = _Upstream(["partial"], error=ConnectionError("backend went away"))
+    out = []
+
+    readers = [_reader(cache, "hi", upstream, out) for _ in range(3)]
+    time.sleep(0.05)
+    upstream.gates[0].set()
+    for thread in readers:
+        thread.join(2)
+
+    assert len(out) == 3 and all(isinstance(e, ConnectionError) for e in out)
+    assert upstream.calls == 1
+    assert cache.stats()["size"] == 0
+
+    retry = _Upstream(["fine"])
+    retry.gates[0].set()
+    assert "".join(cache.stream(_messages("hi"), "m", {}, retry)) == "fine"
+    assert retry.calls == 1
+
+
+def test_async_readers_share_the_stream_and_the_error():
+    cache = ResponseCache()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        yield "a"
+        await asyncio.sleep(0.05)
+        raise ConnectionError("boom")
+
+    async def read():
+        chunks = []
+        async for chunk in cache.astream(_messages("hi"), "m", {}, upstream):
+            chunks.append(chunk)
+        return chunks
+
+    async def main():
+        return await asyncio.gather(read(), read(), read(), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(r, ConnectionError) for r in results)
+
+
+def test_similar_questions_hit_only_above_the_threshold():
+    cache = ResponseCache(similarity=0.8)
+    upstream = _Upstream(["Paris."])
+    upstream.gates[0].set()
+    assert "".join(cache.stream(_messages("What is the capital of France?"), "m", {}, upstream)) == "Paris."
+
+    assert "".join(cache.stream(_messages("what's the capital of france"), "m", {}, upstream)) == "Paris."
+    assert upstream.calls == 1
+    assert cache.stats()["similar_hits"] == 1
+
+    other = _Upstream(["Berlin."])
+    other.gates[0].set()
+    assert "".join(cache.stream(_messages("What is the capital of Germany?"), "m", {}, other)) == "Berlin."
+    assert other.calls == 1
+
+    # same question under a different system prompt never matches
+    changed = [{"role": "system", "content": "You are terse."}, {"role": "user", "content": "What is the capital of France?"}]
+    third = _Upstream(["Paris"])
+    third.gates[0].set()
+    assert "".join(cache.stream(changed, "m", {}, third)) == "Paris"
+    assert third.calls == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(ttl=0.1)
+    upstream = _Upstream(["old"])
+    upstream.gates[0].set()
+    "".join(cache.stream(_messages("hi"), "m", {}, upstream))
+    "".join(cache.stream(_messages("hi"), "m", {}, upstream))
+    assert upstream.calls == 1
+
+    time.sleep(0.15)
+    fresh = _Upstream(["new"])
+    fresh.gates[0].set()
+    assert "".join(cache.stream(_messages("hi"), "m", {}, fresh)) == "new"
+    assert fresh.calls == 1
+    assert cache.stats()["expired"] == 1
+
+
+def test_options_and_model_are_part_of_the_key():
+    cache = ResponseCache()
+    upstream = _Upstream(["x"])
+    upstream.gates[0].set()
+    "".join(cache.stream(_messages("hi"), "m", {"temperature": 0.5}, upstream))
+    "".join(cache.stream(_messages("hi"), "m", {"temperature": 0.9}, upstream))
+    "".join(cache.stream(_messages("hi"), "other", {"temperature": 0.5}, upstream))
+    assert upstream.calls == 3
@@ -0,0 +1,153 @@
+import json
+import asyncio
+from aiohttp.test_utils import TestClient, TestServer
+from chatbot.pipeline import ChatPipeline
+from chatbot.routes.rest_routes import ChatServer
+from chatbot.utils.session_store import SessionStore
+
+
+class _Pipeline:
+    """ Stands in for ChatPipeline: streams the chunks it was given, optionally holding on a gate """
+
+    def __init__(self, chunks=("Hello", " there"), gate: asyncio.Event = None):
+        self.answerer = ChatPipeline().answerer
+        self.chunks = chunks
+        self.gate = gate
+        self.turns = []
+
+    async def arun_turn(self, user_message, conversation_history, session_id=None):
+        self.turns.append((session_id, user_message))
+        for chunk in self.chunks:
+            if self.gate is not None:
+                await self.gate.wait()
+            yield chunk
+
+
+def _run(server: ChatServer, scenario):
+    async def main():
+        client = TestClient(TestServer(server.make_app()))
+        await client.start_server()
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def _events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_health_reports_the_llm_pool_with_default_clients():
+    server = ChatServer(pipeline=ChatPipeline())
+
+    async def scenario(client):
+        response = await client.get("/health")
+        assert response.status == 200
+        return await response.json()
+
+    health = _run(server, scenario)
+    assert health["status"] == "ok"
+    assert "backends" in health["llm"]
+    assert health["sessions"]["warm"] == 0
+
+
+def test_streamed_and_json_turns_share_the_session():
+    pipeline = _Pipeline()
+    server = ChatServer(pipeline=pipeline, sessions=SessionStore())
+
+    async def scenario(client):
+        response = await client.post("/sessions/abc/messages", json={"message": " hi "})
+        assert response.headers["Content-Type"] == "text/event-stream"
+        events = _events(await response.text())
+
+        response = await client.post("/sessions/abc/messages", json={"message": "again", "stream": False})
+        reply = await response.json()
+
+        session = await (await client.get("/sessions/abc")).json()
+        return events, reply, session
+
+    events, reply, session = _run(server, scenario)
+    assert events[:2] == [("chunk", {"text": "Hello"}), ("chunk", {"text": " there"})]
+    assert events[2][0] == "done" and events[2][1]["reply"] == "Hello there"
+    assert reply["reply"] == "Hello there"
+    assert [m["content"] for m in session["messages"]] == ["hi", "Hello there", "again", "Hello there"]
+    assert pipeline.turns == [("abc", "hi"), ("abc", "again")]
+
+
+def test_bad_requests():
+    server = ChatServer(pipeline=_Pipeline())
+
+    async def scenario(client):
+        statuses = []
+        statuses.append((await client.post("/sessions/bad id!/messages", json={"message": "hi"})).status)
+        statuses.append((await client.post("/sessions/abc/messages", data="not json")).status)
+        statuses.append((await client.post("/sessions/abc/messages", json={"message": "  "})).status)
+        statuses.append((await client.get("/sessions/unknown")).status)
+        return statuses
+
+    assert _run(server, scenario) == [400, 400, 400, 404]
+
+
+def test_second_turn_in_a_busy_session_gets_429():
+    async def scenario(client):
+        gate = asyncio.Event()
+        server.pipeline.gate = gate
+        first = asyncio.create_task(client.post("/sessions/abc/messages", json={"message": "one", "stream": False}))
+        while not server._turns:
+            await asyncio.sleep(0.01)
+
+        busy = await client.post("/sessions/abc/messages", json={"message": "two"})
+        other = asyncio.create_task(client.post("/sessions/xyz/messages", json={"message": "three", "stream": False}))
+        await asyncio.sleep(0.05)
+        gate.set()
+        return busy.status, busy.headers.get("Retry-After"), await (await first).json(), (await other).status
+
+    server = ChatServer(pipeline=_Pipeline())
+    status, retry_after, first, other = _run(server, scenario)
+    assert (status, retry_after) == (429, "1")
+    assert first["reply"] == "Hello there"
+    assert other == 200
+    assert server._stats["rejected_busy"] == 1
+
+
+def test_drain_finishes_running_turns_and_rejects_new_ones():
+    async def scenario(client):
+        gate = asyncio.Event()
+        server.pipeline.gate = gate
+        running = asyncio.create_task(client.post("/sessions/abc/messages", json={"message": "one", "stream": False}))
+        while not server._turns:
+            await asyncio.sleep(0.01)
+
+        drain = asyncio.create_task(server.drain(timeout=2.0))
+        await asyncio.sleep(0.01)
+        rejected = await client.post("/sessions/xyz/messages", json={"message": "two"})
+        health = await (await client.get("/health")).json()
+        gate.set()
+        return await drain, rejected.status, health["status"], await (await running).json()
+
+    server = ChatServer(pipeline=_Pipeline())
+    cancelled, rejected, status, reply = _run(server, scenario)
+    assert (cancelled, rejected, status) == (0, 503, "draining")
+    assert reply["reply"] == "Hello there"
+
+
+def test_drain_timeout_cancels_stuck_turns():
+    async def scenario(client):
+        server.pipeline.gate = asyncio.Event()          # never set
+        running = asyncio.create_task(client.post("/sessions/abc/messages", json={"message": "one", "stream": False}))
+        while not server._turns:
+            await asyncio.sleep(0.01)
+        cancelled = await server.drain(timeout=0.1)
+        response = await running
+        return cancelled, response.status, await response.json()
+
+    server = ChatServer(pipeline=_Pipeline())
+    cancelled, status, body = _run(server, scenario)
+    assert cancelled == 1
+    assert status == 503 and "restarting" in body["error"]
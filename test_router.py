@@ -0,0 +1,35 @@
+from chatbot.nodes.router_node import RouterNode, SimilarityIndex
+
+
+def test_rules_route_without_the_planner():
+    router = RouterNode()
+    assert router.process("hello there!") == {"action": "answer_direct", "tool": None, "args": {}}
+    assert router.process("what time is it?") == {"action": "use_tool", "tool": "get_time", "args": {}}
+    assert router.process("weather in Tokyo and a random number") == {"action": "use_tools", "steps": [
+        {"tool": "random_number", "args": {}},
+        {"tool": "fake_weather", "args": {"location": "Tokyo"}},
+    ]}
+    # tool recognised but its args can't be extracted: the planner decides
+    assert router.process("what's the weather like?") is None
+    assert router.stats()["rule_hits"] == 3 and router.stats()["misses"] == 1
+
+
+def test_paraphrase_with_args_routes_through_similarity():
+    router = RouterNode(similarity_index=SimilarityIndex())
+    # misspelled, so the weather rule's keyword pattern misses
+    assert router.process("how is the weathr in paris") == {"action": "use_tool", "tool": "fake_weather", "args": {"location": "Paris"}}
+    assert router.stats()["similarity_hits"] == 1
+
+    # below the routing threshold, but still good enough to prefetch
+    assert router.process("how is the wether in oslo") is None
+    assert router.guess("how is the wether in oslo") == [{"tool": "fake_weather", "args": {"location": "Oslo"}}]
+
+    # similar, but no location to pass: neither routed nor guessed
+    assert router.process("how is the weathr") is None
+    assert router.guess("how is the weathr") == []
+
+
+def test_unknown_messages_fall_through():
+    router = RouterNode(similarity_index=SimilarityIndex())
+    assert router.process("write me a poem about autumn leaves") is None
+    assert router.guess("write me a poem about autumn leaves") == []
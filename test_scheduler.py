@@ -0,0 +1,148 @@
+import gc
+import time
+import asyncio
+import threading
+import pytest
+from chatbot.utils.backend_pool import Backend, session_scope
+from chatbot.utils.resilience import CircuitOpenError
+from chatbot.utils.scheduler import LLMScheduler, Overloaded, PRIORITY_INTERACTIVE, PRIORITY_ANSWER, PRIORITY_BACKGROUND
+from chatbot.utils.tracing import PrometheusExporter
+
+
+def _backend(name: str) -> Backend:
+    # own host per test: breakers are shared per host:port
+    return Backend(f"http://{name}.test:11434/api/chat")
+
+
+def _wait_for(condition, timeout: float = 2.0):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, "condition never became true"
+        time.sleep(0.005)
+
+
+def _reserve_probe(backend: Backend):
+    """ Open the backend's breaker and take its half-open probe, as pick() does """
+    breaker = backend.breaker
+    breaker.reset_timeout = 0.0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.before_call()
+
+
+def _probe_free(backend: Backend) -> bool:
+    try:
+        backend.breaker.before_call()
+    except CircuitOpenError:
+        return False
+    backend.breaker.release()
+    return True
+
+
+def test_admission_by_priority_then_round_robin_over_sessions():
+    backend = _backend("order")
+    scheduler = LLMScheduler(limit_per_backend=1, max_wait=None, aging=60)
+    scheduler.acquire(backend)
+    order = []
+
+    def request(label: str, session: str, priority: int):
+        with session_scope(session):
+            scheduler.acquire(backend, priority)
+        order.append(label)
+        scheduler.release(backend, 0.0)
+
+    threads = []
+    for label, session, priority in [
+        ("a1", "a", PRIORITY_ANSWER),
+        ("a2", "a", PRIORITY_ANSWER),
+        ("b1", "b", PRIORITY_ANSWER),
+        ("summary", "c", PRIORITY_BACKGROUND),
+        ("plan", "d", PRIORITY_INTERACTIVE),
+    ]:
+        queued = backend.queued
+        thread = threading.Thread(target=request, args=(label, session, priority))
+        thread.start()
+        threads.append(thread)
+        _wait_for(lambda: backend.queued == queued + 1)
+
+    scheduler.release(backend, 0.0)
+    for thread in threads:
+        thread.join(2)
+
+    # interactive first, then answers alternating sessions, background last
+    assert order == ["plan", "a1", "b1", "a2", "summary"]
+    assert backend.queued == 0
+
+
+def test_sheds_when_predicted_wait_is_over_max_wait():
+    backend = _backend("shed")
+    scheduler = LLMScheduler(limit_per_backend=1, max_wait=0.5)
+    scheduler.acquire(backend)
+    scheduler.release(backend, 1.0)         # requests take ~1s each
+    scheduler.acquire(backend)
+    _reserve_probe(backend)
+
+    started = time.monotonic()
+    with pytest.raises(Overloaded):
+        scheduler.acquire(backend)
+    assert time.monotonic() - started < 0.1
+    assert scheduler.stats()["priorities"]["answer"]["shed"] == 1
+    assert _probe_free(backend)
+    assert backend.queued == 0
+
+
+def test_gives_up_after_max_wait():
+    backend = _backend("timeout")
+    scheduler = LLMScheduler(limit_per_backend=1, max_wait=0.2)
+    scheduler.acquire(backend)
+    _reserve_probe(backend)
+
+    started = time.monotonic()
+    with pytest.raises(Overloaded):
+        scheduler.acquire(backend, PRIORITY_INTERACTIVE)
+    assert 0.15 < time.monotonic() - started < 1.0
+    assert scheduler.stats()["priorities"]["interactive"]["timed_out"] == 1
+    assert _probe_free(backend)
+    assert backend.queued == 0
+
+
+def test_async_cancel_leaves_queue_and_releases_breaker():
+    backend = _backend("cancel")
+    scheduler = LLMScheduler(limit_per_backend=1, max_wait=None)
+    scheduler.acquire(backend)
+
+    async def main():
+        _reserve_probe(backend)
+        task = asyncio.create_task(scheduler.aacquire(backend))
+        while backend.queued == 0:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert backend.queued == 0
+    assert _probe_free(backend)
+
+    # the cancelled waiter didn't take the slot: it is free once released
+    scheduler.release(backend, 0.0)
+    assert scheduler.stats()["backends"][0]["active"] == 0
+    assert scheduler.acquire(backend) == 0.0
+
+
+def test_metrics_stop_with_the_scheduler():
+    exporter = PrometheusExporter()
+    closed, dropped = _backend("metrics-closed"), _backend("metrics-dropped")
+
+    scheduler = LLMScheduler()
+    scheduler.acquire(closed)
+    assert "metrics-closed.test" in exporter.render()
+    scheduler.close()
+    assert "metrics-closed.test" not in exporter.render()
+
+    scheduler = LLMScheduler()
+    scheduler.acquire(dropped)
+    assert "metrics-dropped.test" in exporter.render()
+    del scheduler
+    gc.collect()
+    assert "metrics-dropped.test" not in exporter.render()
@@ -0,0 +1,91 @@
+from chatbot.utils.memory import ConversationMemory
+from chatbot.utils.session_store import SessionStore, SqliteSessionBackend
+
+
+def _contents(memory: ConversationMemory) -> list:
+    return [m["content"] for m in memory.messages_for()]
+
+
+def test_session_is_resumed_after_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(backend=SqliteSessionBackend(path))
+    memory = store.get("abc").memory
+    memory.add("user", "hi")
+    memory.add("assistant", "hello")
+    store.backend.close()
+
+    # a fresh process: nothing warm, everything comes from the journal
+    store = SessionStore(backend=SqliteSessionBackend(path))
+    assert "abc" not in store
+    assert store.get("unknown", create=False) is None
+
+    memory = store.get("abc").memory
+    assert _contents(memory) == ["hi", "hello"]
+    assert store.stats()["resumed"] == 1
+
+    # new messages continue the same log
+    memory.add("user", "again")
+    store.backend.close()
+    store = SessionStore(backend=SqliteSessionBackend(path))
+    assert _contents(store.get("abc").memory) == ["hi", "hello", "again"]
+    store.backend.close()
+
+
+def test_resume_reads_only_messages_after_the_summary(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    def memory_factory(journal):
+        return ConversationMemory(
+            budgets={"default": 40}, fold_batch=2, background=False, journal=journal,
+            summarize_fn=lambda previous, batch: f"{len(batch)} earlier messages",
+        )
+
+    store = SessionStore(backend=SqliteSessionBackend(path), memory_factory=memory_factory)
+    memory = store.get("abc").memory
+    for i in range(6):
+        memory.add("user", f"message number {i} " + "padding " * 5)
+    assert memory.summary
+    kept = len(memory)
+    store.backend.close()
+
+    backend = SqliteSessionBackend(path)
+    summary, folded, messages = backend.load("abc")
+    assert summary == memory.summary
+    assert folded == 6 - kept and len(messages) == kept
+
+    store = SessionStore(backend=backend, memory_factory=memory_factory)
+    resumed = store.get("abc").memory
+    assert resumed.summary == memory.summary
+    assert _contents(resumed) == _contents(memory)
+    backend.close()
+
+
+def test_evicted_session_is_reloaded_and_deleted_session_is_gone(tmp_path):
+    store = SessionStore(backend=SqliteSessionBackend(str(tmp_path / "sessions.db")), max_sessions=1)
+    store.get("a").memory.add("user", "from a")
+    store.get("b")
+    assert "a" not in store and store.stats()["evicted_lru"] == 1
+
+    assert _contents(store.get("a").memory) == ["from a"]
+    store.delete("a")
+    assert store.get("a", create=False) is None
+    store.backend.close()
+
+
+def test_quiet_sessions_drop_their_cached_views():
+    store = SessionStore(compact_after=0.0)
+    memory = store.get("abc").memory
+    memory.add("user", "hi")
+    memory.add("assistant", "hello")
+    first = memory.messages_for()
+    assert memory.messages_for()[0] is first[0]         # shared while the session is in use
+
+    store.evict_idle()
+    assert store.stats()["compacted"] == 1
+    assert all(message._view is None for message in memory._messages)
+
+    again = memory.messages_for()
+    assert again == first and again[0] is not first[0]
+    store.evict_idle()
+    store.evict_idle()
+    assert store.stats()["compacted"] == 2
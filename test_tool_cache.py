@@ -0,0 +1,73 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from chatbot.tools.tool_executor import ToolRegistry
+from chatbot.utils.error_handler import RetryConfig
+
+NO_RETRY = RetryConfig(max_attempts=1)
+
+
+def test_concurrent_identical_calls_run_once():
+    registry = ToolRegistry()
+    calls = []
+    gate = threading.Event()
+
+    @registry.tool("Slow lookup.", cache_ttl=60, cache_key_fn=lambda args: args["city"].strip().lower())
+    def weather(city: str):
+        calls.append(city)
+        gate.wait(2)
+        return {"city": city, "forecast": "Sunny"}
+
+    with ThreadPoolExecutor(max_workers=9) as pool:
+        futures = [pool.submit(registry.run, "weather", {"city": city}) for city in ["Tokyo", " tokyo", "TOKYO "] * 3]
+        time.sleep(0.1)
+        gate.set()
+        results = [future.result(2) for future in futures]
+
+    assert len(calls) == 1
+    assert all(r["result"]["forecast"] == "Sunny" for r in results)
+    stats = registry.cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 8
+
+    # every caller got its own copy
+    results[0]["result"]["forecast"] = "changed"
+    assert registry.run("weather", {"city": "tokyo"})["result"]["forecast"] == "Sunny"
+    assert len(calls) == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    registry = ToolRegistry()
+    calls = []
+    gate = threading.Event()
+
+    @registry.tool("Flaky lookup.", cache_ttl=60, retry_config=NO_RETRY)
+    def lookup(query: str):
+        calls.append(query)
+        gate.wait(2)
+        if len(calls) == 1:
+            raise ValueError("upstream down")
+        return query
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(registry.run, "lookup", {"query": "x"}) for _ in range(4)]
+        time.sleep(0.1)
+        gate.set()
+        results = [future.result(2) for future in futures]
+
+    assert len(calls) == 1
+    assert all("upstream down" in r["error"] for r in results)
+    assert registry.run("lookup", {"query": "x"}) == {"result": "x"}
+    assert len(calls) == 2
+
+
+def test_uncached_tools_always_run_and_reregistering_drops_results():
+    registry = ToolRegistry()
+    counter = []
+    registry.tool("Counter.")(lambda: counter.append(1) or len(counter))
+    registry.tool("Cached.", name="cached", cache_ttl=60)(lambda: "v1")
+
+    assert [registry.run("<lambda>")["result"] for _ in range(3)] == [1, 2, 3]
+
+    assert registry.run("cached")["result"] == "v1"
+    registry.tool("Cached.", name="cached", cache_ttl=60)(lambda: "v2")
+    assert registry.run("cached")["result"] == "v2"
@@ -0,0 +1,79 @@
+from chatbot.tools.tool_executor import Tool, ToolRegistry
+from chatbot.utils.error_handler import RetryConfig
+from chatbot.utils.json_schema import schema_errors
+
+FAST_RETRY = RetryConfig(max_attempts=3, initial_delay=0.0, max_delay=0.0, retry_exceptions=(ConnectionError,))
+
+
+def _weather(location: str, days: int = 1):
+    return f"sunny in {location} for {days} days"
+
+
+def test_arguments_are_validated_before_the_call():
+    tool = Tool("weather", "Weather.", _weather)
+    assert tool.validate({"location": "Oslo"}) == []
+    assert tool.validate({"location": "Oslo", "days": 2}) == []
+    assert tool.validate({}) == ["Missing required parameter: location"]
+    assert tool.validate({"location": 1, "units": "C"}) == ["Unexpected parameter: units", "Parameter 'location' should be str"]
+    assert tool.llm_desc == "Weather. Parameters: location (str, required), days (int, optional)"
+
+
+def test_run_never_raises():
+    registry = ToolRegistry(cache=None)
+    registry.tool("Weather.")(_weather)
+    assert registry.run("_weather", {"location": "Oslo"}) == {"result": "sunny in Oslo for 1 days"}
+    assert registry.run("_weather", {}) == {"error": "Tool execution failed: Missing required parameter: location"}
+    assert registry.run("nope") == {"error": "Unknown tool: nope"}
+
+
+def test_only_transient_failures_are_retried():
+    calls = {"flaky": 0, "broken": 0}
+
+    def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    def broken():
+        calls["broken"] += 1
+        raise KeyError("bug")
+
+    registry = ToolRegistry(cache=None)
+    registry.tool("Flaky.", retry_config=FAST_RETRY)(flaky)
+    registry.tool("Broken.", retry_config=FAST_RETRY)(broken)
+    assert registry.run("flaky") == {"result": "ok"}
+    assert "error" in registry.run("broken")
+    assert calls == {"flaky": 3, "broken": 1}
+
+
+def test_derived_views_are_rebuilt_only_when_the_catalog_changes():
+    registry = ToolRegistry(cache=None)
+    registry.tool("Weather.", name="weather")(_weather)
+    builds = []
+    view = registry.derived("names", lambda reg: builds.append(1) or reg.names())
+    assert registry.derived("names", lambda reg: builds.append(1) or reg.names()) is view
+    assert registry.prompt_block() is registry.prompt_block()
+
+    version = registry.version
+    registry.tool("Time.", name="time")(lambda: "now")
+    assert registry.version == version + 1
+    assert registry.derived("names", lambda reg: builds.append(1) or reg.names()) == ["weather", "time"]
+    assert len(builds) == 2
+    assert "- time: Time." in registry.prompt_block()
+
+    registry.unregister("time")
+    registry.unregister("time")         # unknown names don't bump the version
+    assert registry.version == version + 2 and "time" not in registry.prompt_block()
+
+
+def test_call_schemas_accept_only_real_calls():
+    registry = ToolRegistry(cache=None)
+    registry.tool("Weather.", name="weather")(_weather)
+    schema, = registry.call_schemas()
+    assert schema_errors({"tool": "weather", "args": {"location": "Oslo", "days": 2}}, schema) == []
+    assert schema_errors({"tool": "weather", "args": {"days": "2"}}, schema) == [
+        "$.args: missing required 'location'",
+        "$.args.days: expected integer, got str",
+    ]
+    assert schema_errors({"tool": "weather", "args": {"location": "Oslo", "x": 1}}, schema) == ["$.args: unexpected property 'x'"]
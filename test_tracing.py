@@ -0,0 +1,110 @@
+import json
+import asyncio
+import logging
+from chatbot.utils.tracing import (
+    JsonlExporter, PrometheusExporter, RingBufferExporter, current_span, eval_stats, traced, tracer,
+)
+
+
+def _with_exporters(*exporters):
+    for exporter in exporters:
+        tracer.add_exporter(exporter)
+    return exporters
+
+
+def _remove(*exporters):
+    for exporter in exporters:
+        tracer.remove_exporter(exporter)
+
+
+def test_nothing_is_recorded_without_exporters():
+    with tracer.span("idle") as span:
+        span.set(x=1)
+        assert current_span() is None
+
+
+def test_spans_nest_into_one_trace():
+    ring, = _with_exporters(RingBufferExporter())
+
+    @traced("node.inner")
+    def inner():
+        current_span().set(tool="x")
+        return "ok"
+
+    @traced("node.stream")
+    def stream():
+        yield inner()
+        yield "more"
+
+    try:
+        with tracer.span("turn", kind="turn"):
+            assert list(stream()) == ["ok", "more"]
+    finally:
+        _remove(ring)
+
+    inner_span, stream_span, turn = ring.spans()
+    assert (inner_span.name, stream_span.name, turn.name) == ("node.inner", "node.stream", "turn")
+    assert inner_span.parent_id == stream_span.span_id and stream_span.parent_id == turn.span_id
+    assert len({inner_span.trace_id, stream_span.trace_id, turn.trace_id}) == 1
+    assert inner_span.attrs["tool"] == "x"
+    assert "first_chunk_s" in stream_span.attrs
+
+
+def test_async_generator_errors_end_the_span():
+    ring, = _with_exporters(RingBufferExporter())
+
+    @traced("node.async")
+    async def failing():
+        yield "a"
+        raise ValueError("boom")
+
+    async def main():
+        chunks = []
+        try:
+            async for chunk in failing():
+                chunks.append(chunk)
+        except ValueError:
+            pass
+        return chunks
+
+    try:
+        assert asyncio.run(main()) == ["a"]
+    finally:
+        _remove(ring)
+    span, = ring.spans()
+    assert span.error == "boom"
+
+
+def test_failing_exporter_is_logged_and_others_still_export(caplog):
+    class Broken:
+        def export(self, span):
+            raise RuntimeError("disk full")
+
+    broken, ring = _with_exporters(Broken(), RingBufferExporter())
+    try:
+        with caplog.at_level(logging.WARNING, logger="chatbot.utils.tracing"):
+            with tracer.span("turn"):
+                pass
+    finally:
+        _remove(broken, ring)
+
+    assert len(ring.spans()) == 1
+    record, = caplog.records
+    assert "Broken" in record.getMessage() and record.exc_info[0] is RuntimeError
+
+
+def test_jsonl_and_prometheus_exporters(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    jsonl, prometheus = _with_exporters(JsonlExporter(str(path)), PrometheusExporter())
+    try:
+        with tracer.span("llm.chat", kind="llm") as span:
+            span.set(ttft_s=0.2, **eval_stats({"prompt_eval_count": 10, "eval_count": 5, "eval_duration": 10**9}))
+    finally:
+        _remove(jsonl, prometheus)
+        jsonl.close()
+
+    line = json.loads(path.read_text())
+    assert line["name"] == "llm.chat" and line["attrs"]["eval_count"] == 5
+    metrics = prometheus.render()
+    assert 'chatbot_span_duration_seconds_count{kind="llm",name="llm.chat"} 1' in metrics
+    assert 'chatbot_llm_tokens_total{name="llm.chat",type="completion"} 5' in metrics
@@ -0,0 +1,94 @@
+import json
+import asyncio
+import threading
+from chatbot.nodes.answer_node import AnswerNode
+from chatbot.nodes.unified_node import UnifiedNode
+
+
+class _Client:
+    """ Streams canned replies in small pieces and records how far each stream was read """
+
+    model = "test"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.sent = []
+
+    def chat_stream(self, messages, **kwargs):
+        text = self.replies.pop(0)
+        self.sent.append(0)
+        for i in range(0, len(text), 4):
+            self.sent[-1] += 1
+            yield text[i:i + 4]
+
+
+class _AsyncClient(_Client):
+    async def chat_stream(self, messages, **kwargs):
+        for chunk in _Client.chat_stream(self, messages, **kwargs):
+            yield chunk
+
+
+PLAN = {"action": "use_tool", "tool": "get_time", "args": {}}
+# the model keeps talking after its JSON: none of that should be read
+TOOL_REPLY = json.dumps(PLAN) + "\n\nI hope this helps! " * 20
+
+
+def _node(client, async_client=None):
+    return UnifiedNode(client=client, async_client=async_client, answerer=AnswerNode(client=client, async_client=async_client))
+
+
+def test_plain_answer_streams_through():
+    client = _Client("Hello! How can I help?")
+    plans = []
+    assert "".join(_node(client).process("hi", [], on_plan=plans.append)) == "Hello! How can I help?"
+    assert plans == [{"action": "answer_direct", "tool": None, "args": {}}]
+
+
+def test_tool_request_stops_reading_at_the_closing_brace():
+    client = _Client("```json\n" + TOOL_REPLY, "It is 3 PM.")
+    plans = []
+    assert "".join(_node(client).process("what time is it?", [], on_plan=plans.append)) == "It is 3 PM."
+    assert plans == [PLAN]
+    assert client.sent[0] * 4 < len("```json\n" + TOOL_REPLY) / 2
+
+
+def test_concurrent_turns_each_get_their_own_plan():
+    replies = {"time": json.dumps(PLAN), "hi": "Hello!"}
+    gate = threading.Barrier(2)
+
+    class Client(_Client):
+        def chat_stream(self, messages, **kwargs):
+            question = messages[-1]["content"]
+            if question in replies:
+                gate.wait(2)            # both turns are mid-stream together
+                yield replies[question]
+            else:
+                yield "done"
+
+    node = _node(Client())
+    results = {}
+
+    def turn(question):
+        plans = []
+        "".join(node.process(question, [], on_plan=plans.append))
+        results[question] = plans
+
+    threads = [threading.Thread(target=turn, args=(q,)) for q in replies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == {"time": [PLAN], "hi": [{"action": "answer_direct", "tool": None, "args": {}}]}
+
+
+def test_async_tool_request_stops_reading_at_the_closing_brace():
+    client = _AsyncClient(TOOL_REPLY, "It is 3 PM.")
+    plans = []
+
+    async def main():
+        return "".join([chunk async for chunk in _node(client, client).aprocess("what time is it?", [], on_plan=plans.append)])
+
+    assert asyncio.run(main()) == "It is 3 PM."
+    assert plans == [PLAN]
+    assert client.sent[0] * 4 < len(TOOL_REPLY) / 2